@@ -15,6 +15,9 @@ from app.config import settings
 from app.models import (
     Document, 
     TaxCalculation, 
+    ModelUsage,
+    IdempotencyKey,
+    PromptTemplate,
     User, 
     TaxSlab, 
     AllowanceType, 
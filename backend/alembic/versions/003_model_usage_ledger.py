@@ -0,0 +1,56 @@
+"""model usage ledger and token budget settings
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '003'
+down_revision = '002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Create model_usage table
+    op.create_table('model_usage',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('document_id', sa.Integer(), nullable=True),
+        sa.Column('purpose', sa.String(length=50), nullable=False),
+        sa.Column('model', sa.String(length=100), nullable=False),
+        sa.Column('input_mode', sa.String(length=20), nullable=False),
+        sa.Column('prompt_tokens', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('completion_tokens', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('total_tokens', sa.Integer(), nullable=True, server_default='0'),
+        sa.Column('cost_usd', sa.Float(), nullable=True, server_default='0'),
+        sa.Column('latency_ms', sa.Integer(), nullable=True),
+        sa.Column('success', sa.Boolean(), nullable=True, server_default='true'),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='SET NULL'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_model_usage_id'), 'model_usage', ['id'], unique=False)
+    op.create_index(op.f('ix_model_usage_created_at'), 'model_usage', ['created_at'], unique=False)
+
+    # Token budgets (0 = unlimited)
+    op.execute("""
+        INSERT INTO system_settings (setting_key, setting_value, setting_type, description)
+        VALUES
+        ('daily_token_budget', '0', 'number', 'Maximum model tokens per day (0 = unlimited)'),
+        ('monthly_token_budget', '0', 'number', 'Maximum model tokens per month (0 = unlimited)'),
+        ('budget_degrade_threshold', '0.8', 'number', 'Fraction of a budget after which extraction switches to cheaper modes')
+    """)
+
+
+def downgrade():
+    op.execute("""
+        DELETE FROM system_settings
+        WHERE setting_key IN ('daily_token_budget', 'monthly_token_budget', 'budget_degrade_threshold')
+    """)
+    op.drop_index(op.f('ix_model_usage_created_at'), table_name='model_usage')
+    op.drop_index(op.f('ix_model_usage_id'), table_name='model_usage')
+    op.drop_table('model_usage')
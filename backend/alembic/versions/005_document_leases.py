@@ -0,0 +1,29 @@
+"""processing leases on documents
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005'
+down_revision = '004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('documents', sa.Column('lease_owner', sa.String(length=100), nullable=True))
+    op.add_column('documents', sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('documents', sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'))
+    op.create_index(op.f('ix_documents_lease_expires_at'), 'documents', ['lease_expires_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_documents_lease_expires_at'), table_name='documents')
+    op.drop_column('documents', 'attempts')
+    op.drop_column('documents', 'lease_expires_at')
+    op.drop_column('documents', 'lease_owner')
@@ -0,0 +1,25 @@
+"""routing decision and baseline cost on model_usage
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '006'
+down_revision = '005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('model_usage', sa.Column('route', sa.String(length=20), nullable=True))
+    op.add_column('model_usage', sa.Column('baseline_cost_usd', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('model_usage', 'baseline_cost_usd')
+    op.drop_column('model_usage', 'route')
@@ -0,0 +1,40 @@
+"""versioned prompt templates
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '007'
+down_revision = '006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Create prompt_templates table (empty: built-in defaults apply until an admin adds a version)
+    op.create_table('prompt_templates',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('doc_type', sa.String(length=50), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('system_prompt', sa.Text(), nullable=False),
+        sa.Column('prompt', sa.Text(), nullable=False),
+        sa.Column('max_tokens', sa.Integer(), nullable=True),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('doc_type', 'version', name='uq_prompt_templates_doc_type_version')
+    )
+    op.create_index(op.f('ix_prompt_templates_id'), 'prompt_templates', ['id'], unique=False)
+    op.create_index(op.f('ix_prompt_templates_doc_type'), 'prompt_templates', ['doc_type'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_prompt_templates_doc_type'), table_name='prompt_templates')
+    op.drop_index(op.f('ix_prompt_templates_id'), table_name='prompt_templates')
+    op.drop_table('prompt_templates')
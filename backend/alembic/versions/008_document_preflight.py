@@ -0,0 +1,35 @@
+"""upload preflight metadata on documents
+
+Revision ID: 008
+Revises: 007
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '008'
+down_revision = '007'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('documents', sa.Column('file_digest', sa.String(length=64), nullable=True))
+    op.add_column('documents', sa.Column('page_count', sa.Integer(), nullable=True))
+    op.add_column('documents', sa.Column('has_text', sa.Boolean(), nullable=True))
+    op.add_column('documents', sa.Column('image_width', sa.Integer(), nullable=True))
+    op.add_column('documents', sa.Column('image_height', sa.Integer(), nullable=True))
+    op.add_column('documents', sa.Column('preflight_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_documents_file_digest'), 'documents', ['file_digest'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_documents_file_digest'), table_name='documents')
+    op.drop_column('documents', 'preflight_at')
+    op.drop_column('documents', 'image_height')
+    op.drop_column('documents', 'image_width')
+    op.drop_column('documents', 'has_text')
+    op.drop_column('documents', 'page_count')
+    op.drop_column('documents', 'file_digest')
@@ -0,0 +1,50 @@
+"""extraction version stamps and re-extraction jobs
+
+Revision ID: 009
+Revises: 008
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '009'
+down_revision = '008'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing extractions have no stamp, so the first re-extraction job treats them as stale
+    op.add_column('documents', sa.Column('extractor_version', sa.Integer(), nullable=True))
+    op.add_column('documents', sa.Column('prompt_version', sa.String(length=80), nullable=True))
+
+    op.create_table('reextraction_jobs',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('extractor_version', sa.Integer(), nullable=False),
+        sa.Column('total', sa.Integer(), nullable=False),
+        sa.Column('processed', sa.Integer(), nullable=False),
+        sa.Column('succeeded', sa.Integer(), nullable=False),
+        sa.Column('failed', sa.Integer(), nullable=False),
+        sa.Column('skipped', sa.Integer(), nullable=False),
+        sa.Column('last_document_id', sa.Integer(), nullable=False),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.Column('lease_owner', sa.String(length=100), nullable=True),
+        sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_reextraction_jobs_id'), 'reextraction_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_reextraction_jobs_status'), 'reextraction_jobs', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_reextraction_jobs_status'), table_name='reextraction_jobs')
+    op.drop_index(op.f('ix_reextraction_jobs_id'), table_name='reextraction_jobs')
+    op.drop_table('reextraction_jobs')
+    op.drop_column('documents', 'prompt_version')
+    op.drop_column('documents', 'extractor_version')
@@ -1,15 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Body
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Dict, Any
 from enum import Enum
+from functools import lru_cache
+from pydantic import TypeAdapter
 
-from app.database import get_db
-from app.models import TaxSlab, AllowanceType, DeductionType, SystemSettings, TaxCategory
+from app.database import get_db, get_read_db
+from app.services.tax_service import invalidate_reference_data
+from app.services.usage_service import get_usage_summary
+from app.services.prompt_service import PROMPT_DOC_TYPES, invalidate_prompts, next_version
+from app.services import reextraction_service
+from app.profiling import require_profiling_token, list_profiles, get_profile_path
+from app.models import TaxSlab, AllowanceType, DeductionType, SystemSettings, TaxCategory, PromptTemplate
 from app.schemas.admin import (
     TaxSlabCreate, TaxSlabResponse, TaxSlabUpdate,
     AllowanceTypeCreate, AllowanceTypeResponse,
     DeductionTypeCreate, DeductionTypeResponse,
-    SystemSettingCreate, SystemSettingResponse
+    SystemSettingCreate, SystemSettingResponse,
+    PromptTemplateCreate, PromptTemplateResponse,
+    ReextractionJobResponse
 )
 
 router = APIRouter()
@@ -20,12 +30,29 @@ class ResourceType(str, Enum):
     ALLOWANCES = "allowances"
     DEDUCTIONS = "deductions"
     SETTINGS = "settings"
+    USAGE = "usage"
+    PROMPTS = "prompts"
+    REEXTRACTION = "reextraction"
 
 class OperationType(str, Enum):
     CREATE = "create"
     UPDATE = "update"
     DELETE = "delete"
 
+@lru_cache(maxsize=None)
+def _list_adapter(schema):
+    """Cached TypeAdapter for a list of response schemas"""
+    return TypeAdapter(List[schema])
+
+
+def serialize_rows(schema, rows) -> List[dict]:
+    """
+    Validate ORM rows into a response schema and dump them to JSON-ready dicts
+    in a single pass, instead of calling from_orm on each row.
+    """
+    adapter = _list_adapter(schema)
+    return adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+
 # ==================== UNIFIED GET ENDPOINT ====================
 
 @router.get("")
@@ -33,7 +60,8 @@ async def get_admin_data(
     resource: ResourceType = Query(..., description="Type of resource to fetch"),
     category: Optional[TaxCategory] = Query(None, description="Filter by category"),
     tax_year: Optional[str] = Query(None, description="Filter by tax year"),
-    db: Session = Depends(get_db)
+    doc_type: Optional[str] = Query(None, description="Filter prompts by document type"),
+    db: Session = Depends(get_read_db)
 ):
     """
     Unified admin GET endpoint - Get any admin resource with dropdown filters
@@ -43,6 +71,9 @@ async def get_admin_data(
     - GET /api/admin?resource=allowances&category=salaried
     - GET /api/admin?resource=deductions
     - GET /api/admin?resource=settings
+    - GET /api/admin?resource=usage  (daily/monthly token and cost roll-ups)
+    - GET /api/admin?resource=prompts&doc_type=salary_slip  (all versions, newest first)
+    - GET /api/admin?resource=reextraction  (stale document count and progress of the latest job)
     """
     
     if resource == ResourceType.TAX_SLABS:
@@ -57,7 +88,7 @@ async def get_admin_data(
         return {
             "resource_type": "tax_slabs",
             "total": len(slabs),
-            "data": [TaxSlabResponse.from_orm(slab) for slab in slabs]
+            "data": serialize_rows(TaxSlabResponse, slabs)
         }
     
     elif resource == ResourceType.ALLOWANCES:
@@ -70,7 +101,7 @@ async def get_admin_data(
         return {
             "resource_type": "allowances",
             "total": len(allowances),
-            "data": [AllowanceTypeResponse.from_orm(a) for a in allowances]
+            "data": serialize_rows(AllowanceTypeResponse, allowances)
         }
     
     elif resource == ResourceType.DEDUCTIONS:
@@ -83,7 +114,7 @@ async def get_admin_data(
         return {
             "resource_type": "deductions",
             "total": len(deductions),
-            "data": [DeductionTypeResponse.from_orm(d) for d in deductions]
+            "data": serialize_rows(DeductionTypeResponse, deductions)
         }
     
     elif resource == ResourceType.SETTINGS:
@@ -91,7 +122,35 @@ async def get_admin_data(
         return {
             "resource_type": "settings",
             "total": len(settings),
-            "data": [SystemSettingResponse.from_orm(s) for s in settings]
+            "data": serialize_rows(SystemSettingResponse, settings)
+        }
+    
+    elif resource == ResourceType.USAGE:
+        return {
+            "resource_type": "usage",
+            "data": get_usage_summary(db)
+        }
+    
+    elif resource == ResourceType.PROMPTS:
+        query = db.query(PromptTemplate)
+        
+        if doc_type:
+            query = query.filter(PromptTemplate.doc_type == doc_type)
+        
+        prompts = query.order_by(PromptTemplate.doc_type, PromptTemplate.version.desc()).all()
+        return {
+            "resource_type": "prompts",
+            "total": len(prompts),
+            "data": serialize_rows(PromptTemplateResponse, prompts)
+        }
+    
+    elif resource == ResourceType.REEXTRACTION:
+        status_data = reextraction_service.get_status(db)
+        job = status_data["job"]
+        status_data["job"] = ReextractionJobResponse.from_orm(job) if job else None
+        return {
+            "resource_type": "reextraction",
+            "data": status_data
         }
 
 
@@ -111,6 +170,8 @@ async def create_admin_resource(
     - POST /api/admin?resource=allowances
     - POST /api/admin?resource=deductions
     - POST /api/admin?resource=settings
+    - POST /api/admin?resource=prompts  (adds the next version for its doc_type)
+    - POST /api/admin?resource=reextraction  (starts a job re-extracting stale documents; body {})
     
     Body: JSON with resource-specific fields
     """
@@ -121,6 +182,7 @@ async def create_admin_resource(
             db.add(slab)
             db.commit()
             db.refresh(slab)
+            invalidate_reference_data()
             return {
                 "success": True,
                 "message": "Tax slab created successfully",
@@ -171,7 +233,47 @@ async def create_admin_resource(
                 "resource_type": "settings",
                 "data": SystemSettingResponse.from_orm(setting)
             }
+
+        elif resource == ResourceType.USAGE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Usage is recorded automatically and is read-only"
+            )
+        
+        elif resource == ResourceType.PROMPTS:
+            template = PromptTemplateCreate(**data)
+            if template.doc_type not in PROMPT_DOC_TYPES:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"doc_type must be one of: {', '.join(PROMPT_DOC_TYPES)}"
+                )
+            
+            prompt = PromptTemplate(**template.model_dump(), version=next_version(db, template.doc_type))
+            db.add(prompt)
+            db.commit()
+            db.refresh(prompt)
+            invalidate_prompts()
+            return {
+                "success": True,
+                "message": f"Prompt version {prompt.version} created successfully",
+                "resource_type": "prompts",
+                "data": PromptTemplateResponse.from_orm(prompt)
+            }
+        
+        elif resource == ResourceType.REEXTRACTION:
+            try:
+                job = reextraction_service.start_job(db)
+            except reextraction_service.JobConflict as e:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+            return {
+                "success": True,
+                "message": f"Re-extraction job {job.id} started ({job.total} stale documents)",
+                "resource_type": "reextraction",
+                "data": ReextractionJobResponse.from_orm(job)
+            }
             
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -198,6 +300,7 @@ async def update_admin_resource(
     - PUT /api/admin?resource=allowances&resource_id=2
     - PUT /api/admin?resource=deductions&resource_id=3
     - PUT /api/admin?resource=settings&key=current_tax_year
+    - PUT /api/admin?resource=prompts&resource_id=4  (only is_active; versions are immutable)
     
     Body: JSON with fields to update
     """
@@ -216,6 +319,7 @@ async def update_admin_resource(
             
             db.commit()
             db.refresh(db_slab)
+            invalidate_reference_data()
             return {
                 "success": True,
                 "message": "Tax slab updated successfully",
@@ -282,6 +386,42 @@ async def update_admin_resource(
                 "resource_type": "settings",
                 "data": SystemSettingResponse.from_orm(db_setting)
             }
+
+        elif resource == ResourceType.USAGE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Usage is recorded automatically and is read-only"
+            )
+
+        elif resource == ResourceType.REEXTRACTION:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Re-extraction jobs are started with POST and cancelled with DELETE"
+            )
+        
+        elif resource == ResourceType.PROMPTS:
+            if not resource_id:
+                raise HTTPException(status_code=400, detail="resource_id is required")
+            if set(data) - {"is_active"}:
+                raise HTTPException(
+                    status_code=400,
+                    detail="Prompt versions cannot be edited; create a new version instead"
+                )
+            
+            db_prompt = db.query(PromptTemplate).filter(PromptTemplate.id == resource_id).first()
+            if not db_prompt:
+                raise HTTPException(status_code=404, detail="Prompt not found")
+            
+            db_prompt.is_active = bool(data.get("is_active", db_prompt.is_active))
+            db.commit()
+            db.refresh(db_prompt)
+            invalidate_prompts()
+            return {
+                "success": True,
+                "message": "Prompt updated successfully",
+                "resource_type": "prompts",
+                "data": PromptTemplateResponse.from_orm(db_prompt)
+            }
             
     except HTTPException:
         raise
@@ -308,6 +448,8 @@ async def delete_admin_resource(
     - DELETE /api/admin?resource=tax-slabs&resource_id=1
     - DELETE /api/admin?resource=allowances&resource_id=2
     - DELETE /api/admin?resource=deductions&resource_id=3
+    - DELETE /api/admin?resource=prompts&resource_id=4  (the previous active version takes over)
+    - DELETE /api/admin?resource=reextraction&resource_id=2  (cancels a running job)
     
     Note: This sets is_active = false, doesn't actually delete from database
     """
@@ -320,6 +462,7 @@ async def delete_admin_resource(
             
             db_slab.is_active = False
             db.commit()
+            invalidate_reference_data()
             return {
                 "success": True,
                 "message": "Tax slab deleted successfully",
@@ -357,6 +500,35 @@ async def delete_admin_resource(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Settings cannot be deleted, use PUT to update them"
             )
+
+        elif resource == ResourceType.USAGE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Usage is recorded automatically and is read-only"
+            )
+        
+        elif resource == ResourceType.PROMPTS:
+            db_prompt = db.query(PromptTemplate).filter(PromptTemplate.id == resource_id).first()
+            if not db_prompt:
+                raise HTTPException(status_code=404, detail="Prompt not found")
+            
+            db_prompt.is_active = False
+            db.commit()
+            invalidate_prompts()
+            return {
+                "success": True,
+                "message": "Prompt deleted successfully",
+                "resource_type": "prompts"
+            }
+        
+        elif resource == ResourceType.REEXTRACTION:
+            if not reextraction_service.cancel_job(db, resource_id):
+                raise HTTPException(status_code=404, detail="No running re-extraction job with this id")
+            return {
+                "success": True,
+                "message": "Re-extraction job cancelled",
+                "resource_type": "reextraction"
+            }
             
     except HTTPException:
         raise
@@ -367,15 +539,44 @@ async def delete_admin_resource(
             detail=f"Failed to delete {resource.value}: {str(e)}"
         )
 
+# ==================== REQUEST PROFILES ====================
+
+@router.get("/profiles", dependencies=[Depends(require_profiling_token)])
+async def get_request_profiles(limit: int = Query(50, le=500)):
+    """
+    List saved request profiles (newest first)
+    Requires the X-TaxEase-Profile header with the profiling token
+    """
+    profiles = list_profiles(limit)
+    return {
+        "resource_type": "profiles",
+        "total": len(profiles),
+        "data": profiles
+    }
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_profiling_token)])
+async def download_request_profile(profile_id: str):
+    """Download a speedscope profile (open it at https://www.speedscope.app)"""
+    path = get_profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/json", filename=path.name)
+
 ## ✅ **Summary of Changes**
 
-### **Now You Have Only 4 Endpoints Total:**
+### **4 Unified Endpoints for All Resources:**
 
 # 1. **GET /api/admin** - Get any resource with dropdown filters
 # 2. **POST /api/admin** - Create any resource with dropdown selection
 # 3. **PUT /api/admin** - Update any resource with dropdown selection
 # 4. **DELETE /api/admin** - Delete any resource with dropdown selection
 
+### **Plus Request Profiles (X-TaxEase-Profile header required):**
+
+# GET /api/admin/profiles - List saved request profiles
+# GET /api/admin/profiles/{profile_id} - Download one speedscope profile
+
 ### **All Operations Use Query Parameters:**
 
 # GET    /api/admin?resource=tax-slabs&category=salaried&tax_year=2025-26
@@ -1,19 +1,27 @@
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, UploadFile, File, Depends, Header, HTTPException, status
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 import os
 import uuid
 import json 
+import logging
+import math
 from pathlib import Path
 from datetime import datetime
 
-from app.database import get_db
+from app.database import get_db, get_read_db, mark_write
+from app.dependencies import model_admission
 from app.models import Document, DocumentStatus
-from app.schemas.document import DocumentResponse, DocumentList
+from app.schemas.document import DocumentResponse, DocumentList, FieldCorrectionRequest
 from app.config import settings
-from app.services.ai_service import extract_salary_data_from_document, search_in_documents
+from app.services import document_service, idempotency_service, preflight
+from app.services.ai_service import search_in_documents
+from app.services.metrics import stage, ANALYSIS_DEDUPLICATED
+from app.services.usage_service import record_model_calls
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = {'pdf', 'jpg', 'jpeg'}
 
@@ -21,13 +29,18 @@ def allowed_file(filename: str) -> bool:
     """Check if file extension is allowed"""
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+
 @router.post("/upload", response_model=DocumentResponse, status_code=status.HTTP_201_CREATED)
 async def upload_document(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     Upload a tax document (PDF or JPG only)
+    A retry with the same Idempotency-Key returns the first upload's document.
+    Page count, text layer and digest are filled in by a background preflight.
     """
     
     # Validate file
@@ -57,8 +70,32 @@ async def upload_document(
     # Reset file position after reading
     await file.seek(0)
     
+    if idempotency_key:
+        fingerprint = idempotency_service.request_hash(file.filename, content)
+        replay = idempotency_service.begin(db, "upload", idempotency_key, fingerprint)
+        if replay:
+            return JSONResponse(replay[1], status_code=replay[0])
+        try:
+            document = _save_upload(db, file.filename, content)
+        except BaseException:
+            idempotency_service.release(db, "upload", idempotency_key)
+            raise
+        body = DocumentResponse.model_validate(document).model_dump(mode="json")
+        idempotency_service.complete(db, "upload", idempotency_key, status.HTTP_201_CREATED, body)
+        background_tasks.add_task(preflight.run_preflight, document.id)
+        return document
+    
+    document = _save_upload(db, file.filename, content)
+    background_tasks.add_task(preflight.run_preflight, document.id)
+    return document
+
+
+def _save_upload(db: Session, filename: str, content: bytes) -> Document:
+    """Write the file to the upload folder and create its document record"""
+    file_size = len(content)
+    
     # Generate unique filename
-    file_extension = file.filename.rsplit('.', 1)[1].lower()
+    file_extension = filename.rsplit('.', 1)[1].lower()
     unique_filename = f"{uuid.uuid4()}.{file_extension}"
     
     # Create upload path
@@ -67,7 +104,7 @@ async def upload_document(
     
     # Save file
     try:
-        with open(file_path, "wb") as buffer:
+        with stage("upload_write"), open(file_path, "wb") as buffer:
             buffer.write(content)
     except Exception as e:
         raise HTTPException(
@@ -78,7 +115,7 @@ async def upload_document(
     # Create database record
     document = Document(
         filename=unique_filename,
-        original_filename=file.filename,
+        original_filename=filename,
         file_path=str(file_path),
         file_type=file_extension,
         file_size=file_size,
@@ -96,7 +133,7 @@ async def upload_document(
 async def get_documents(
     skip: int = 0,
     limit: int = 100,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get all uploaded documents
@@ -113,7 +150,7 @@ async def get_documents(
 @router.get("/{document_id}", response_model=DocumentResponse)
 async def get_document(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Get a specific document by ID
@@ -129,84 +166,65 @@ async def get_document(
     return document
 
 
-@router.post("/analyze/{document_id}")
+@router.post("/analyze/{document_id}", dependencies=[Depends(model_admission)])
 async def analyze_document(
     document_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
 ):
     """
     Analyze a document with AI to extract salary and tax data
+    Concurrent requests for the same document share a single extraction.
     """
-    document = db.query(Document).filter(Document.id == document_id).first()
-    
-    if not document:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Document not found"
-        )
-    
-    # Check if already processed
-    if document.status == DocumentStatus.COMPLETED:
-        import json
-        return {
-            "success": True,
-            "message": "Document already analyzed",
-            "document_id": document_id,
-            "extracted_data": json.loads(document.extracted_data) if document.extracted_data else None
-        }
-    
-    # Update status to processing
-    document.status = DocumentStatus.PROCESSING
-    db.commit()
-    
+    if idempotency_key:
+        replay = idempotency_service.begin(db, "analyze", idempotency_key, idempotency_service.request_hash(document_id))
+        if replay:
+            ANALYSIS_DEDUPLICATED.labels(source="idempotency_key").inc()
+            return JSONResponse(replay[1], status_code=replay[0])
+
     try:
-        # Extract data using AI
-        result = await extract_salary_data_from_document(
-            document.file_path,
-            document.file_type
-        )
-        
-        if result["success"]:
-            # Store extracted data as JSON string
-            import json
-            document.extracted_data = json.dumps(result["data"])
-            document.status = DocumentStatus.COMPLETED
-            document.processed_at = datetime.now()
-            
-            db.commit()
-            db.refresh(document)
-            
-            return {
-                "success": True,
-                "message": "Document analyzed successfully",
-                "document_id": document_id,
-                "extracted_data": result["data"],
-                "tokens_used": result.get("tokens_used", 0)
-            }
-        else:
-            document.status = DocumentStatus.FAILED
-            document.error_message = result.get("error", "Unknown error")
-            db.commit()
-            
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"AI analysis failed: {result.get('error', 'Unknown error')}"
-            )
-            
-    except Exception as e:
-        document.status = DocumentStatus.FAILED
-        document.error_message = str(e)
-        db.commit()
-        
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Analysis error: {str(e)}"
-        )
+        result = await document_service.analyze_document(document_id)
+    except document_service.AnalysisError as e:
+        if idempotency_key:
+            idempotency_service.release(db, "analyze", idempotency_key)
+        headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after is not None else None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+    except BaseException:
+        if idempotency_key:
+            idempotency_service.release(db, "analyze", idempotency_key)
+        raise
+
+    # The write happened in the shared analysis session; keep this client on the primary
+    mark_write(db)
+    if idempotency_key:
+        idempotency_service.complete(db, "analyze", idempotency_key, status.HTTP_200_OK, result)
+    return result
 
-@router.post("/search")
+@router.post("/analyze/{document_id}/fields", dependencies=[Depends(model_admission)])
+async def correct_document_fields(
+    document_id: int,
+    request: Optional[FieldCorrectionRequest] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Ask the model again for just some fields of an analyzed document
+    (by default the missing and low-confidence ones) and merge the answers
+    into its extracted data. Only the page region or text lines holding the
+    fields are sent, with a minimal schema.
+    """
+    try:
+        result = await document_service.correct_fields(document_id, request.fields if request else None)
+    except document_service.AnalysisError as e:
+        headers = {"Retry-After": str(math.ceil(e.retry_after))} if e.retry_after is not None else None
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers=headers)
+
+    mark_write(db)
+    return result
+
+@router.post("/search", dependencies=[Depends(model_admission)])
 async def search_documents(
     query: str,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
     Search across all uploaded documents for specific information
@@ -231,6 +249,7 @@ async def search_documents(
     
     try:
         result = await search_in_documents(query, document_texts)
+        record_model_calls(result.get("calls", []), "search")
         
         if result["success"]:
             return {
@@ -239,12 +258,20 @@ async def search_documents(
                 "answer": result["answer"],
                 "documents_searched": len(documents)
             }
+        elif result.get("retry_after") is not None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"AI service temporarily unavailable: {result['error']}",
+                headers={"Retry-After": str(math.ceil(result["retry_after"]))}
+            )
         else:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Search failed: {result.get('error', 'Unknown error')}"
             )
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -273,7 +300,7 @@ async def delete_document(
         if os.path.exists(document.file_path):
             os.remove(document.file_path)
     except Exception as e:
-        print(f"Error deleting file: {e}")
+        logger.warning("Error deleting file", extra={"document_id": document_id, "error": str(e)})
     
     # Delete from database
     db.delete(document)
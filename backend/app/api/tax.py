@@ -2,60 +2,45 @@ from fastapi import APIRouter, HTTPException, Depends
 from sqlalchemy.orm import Session
 from typing import Optional, Dict, Any
 import json
+import logging
 
-from app.database import get_db
+from app.database import get_db, get_read_db
 from app.models.document import Document
 from app.models.tax_data import TaxCalculation
-from app.models.admin import TaxSlab
+from app.services.tax_service import find_tax_slab, calculate_tax
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 @router.get("/slab", response_model=dict)
 async def get_tax_slab(
     income: float,
     category: str = "SALARIED",
     tax_year: str = "2025-26",
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """
-    Get tax slab for a given income from database
+    Get tax slab for a given income (served from the reference data cache)
     """
     try:
-        # Query tax slab from database using SQLAlchemy
-        query = db.query(TaxSlab).filter(
-            TaxSlab.category == category,
-            TaxSlab.tax_year == tax_year,
-            TaxSlab.is_active == True,
-            TaxSlab.min_income <= income
-        ).filter(
-            (TaxSlab.max_income >= income) | (TaxSlab.max_income.is_(None))
-        ).order_by(TaxSlab.min_income.desc())
-        
-        slab = query.first()
+        # Look up the slab in the cached reference data
+        slab = find_tax_slab(db, income, category, tax_year)
         
         if not slab:
             raise HTTPException(status_code=404, detail="Tax slab not found for this income")
         
         # Calculate tax based on FBR formula
-        excess_income = income - slab.min_income
-        variable_tax = excess_income * (slab.tax_rate / 100)
-        total_tax = slab.fixed_tax + variable_tax
+        total_tax = calculate_tax(slab, income)
         
         return {
-            "slab": {
-                "category": slab.category,
-                "tax_year": slab.tax_year,
-                "min_income": slab.min_income,
-                "max_income": slab.max_income,
-                "fixed_tax": slab.fixed_tax,
-                "tax_rate": slab.tax_rate,
-                "description": slab.description
-            },
+            "slab": dict(slab),
             "calculated_tax": round(total_tax, 0)
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Tax slab error: {e}")
+        logger.exception("Tax slab error")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/calculate/{document_id}")
@@ -100,7 +85,7 @@ async def calculate_and_save_tax(
         taxable_income = max(0, taxable_income)  # Ensure non-negative
         
         # Get tax slab and calculate tax
-        tax_slab_result = await get_tax_slab(taxable_income)
+        tax_slab_result = await get_tax_slab(taxable_income, db=db)
         calculated_tax = tax_slab_result["calculated_tax"]
         tax_due = calculated_tax - tax_already_paid
         
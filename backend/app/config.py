@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List, Optional
 import os
 from pathlib import Path
 
@@ -17,13 +17,112 @@ class Settings(BaseSettings):
     # Database (Supabase)
     DATABASE_URL: str  # Format: postgresql://postgres:[password]@[host]/[database]
     
+    # Read replica (optional) - GET endpoints read from here when set
+    DATABASE_REPLICA_URL: Optional[str] = None
+    # After a client writes, its reads stay on the primary for this long
+    REPLICA_STICKY_SECONDS: int = 30
+    
     # AI APIs
     OPENAI_API_KEY: str = ""
+    # Alternative OpenAI-compatible endpoint (e.g. the local mock in benchmarks/mock_llm.py)
+    OPENAI_BASE_URL: Optional[str] = None
+    # USD per million tokens: [input, output] - used for the usage ledger
+    MODEL_PRICES: Dict[str, List[float]] = {
+        "gpt-4o": [2.50, 10.00],
+        "gpt-4o-mini": [0.15, 0.60]
+    }
+    
+    # Tiered routing (services/routing.py): cheapest model first, escalate when its answer fails review
+    MODEL_ROUTE_TIERS: List[str] = ["gpt-4o-mini", "gpt-4o"]  # A single entry disables routing
+    MODEL_ROUTE_VISION: bool = False  # gpt-4o-mini bills images at many more tokens, so vision saves little
+    MODEL_ROUTE_TOLERANCE: float = 0.02  # Relative slack for the arithmetic checks
+    
+    # Document-type classifier (services/classifier.py): below this confidence the generic prompt is used
+    CLASSIFIER_MIN_CONFIDENCE: float = 0.6
+    # Page triage for scanned PDFs (services/page_triage.py)
+    PAGE_TRIAGE_DPI: int = 50  # Resolution of the scoring pass
+    PAGE_TRIAGE_MAX_PAGES: int = 40  # Pages scored; later pages are never sent
+    PAGE_TRIAGE_OCR: bool = False  # Add a keyword score from tesseract (needs pytesseract + tesseract)
+    PAGE_TRIAGE_OCR_DPI: int = 100
+    # Image preprocessing before vision calls (services/preprocess.py)
+    PREPROCESS_MIN_LINE_PX: float = 12  # Smallest text line height (px) the model still reads reliably
+    PREPROCESS_JPEG_QUALITY: int = 80
+    # Cache of rendered, preprocessed pages (services/render_cache.py)
+    RENDER_CACHE_ENABLED: bool = True
+    RENDER_CACHE_DIR: str = "cache/pages"
+    RENDER_CACHE_MAX_MB: int = 512  # Least recently used pages are evicted beyond this
+    # Chunked extraction of long bank statements (services/statements.py)
+    STATEMENT_CHUNK_PAGES: int = 3  # Pages per model call; longer statements are split
+    STATEMENT_CHUNK_CONCURRENCY: int = 8  # Chunk calls in flight at once (per worker, across requests)
+    STATEMENT_MAX_PAGES: int = 60  # Later pages of a statement are not read
+    
+    # Prompt templates are cached this long (admin changes apply immediately in the worker that made them)
+    PROMPT_CACHE_TTL: int = 60
+    
+    # Model call resilience (services/resilience.py), per worker process
+    MODEL_REQUEST_TIMEOUT: float = 90.0  # Seconds per attempt
+    MODEL_MAX_RETRIES: int = 3  # Retries of rate limits, timeouts and 5xx errors
+    MODEL_BACKOFF_BASE: float = 1.0  # First backoff ceiling in seconds (doubles per retry, full jitter)
+    MODEL_BACKOFF_MAX: float = 30.0
+    MODEL_BREAKER_FAILURES: int = 5  # Consecutive provider failures that open the circuit
+    MODEL_BREAKER_RESET_SECONDS: float = 30.0  # Fail fast this long before probing again
+    MODEL_RPM_LIMIT: float = 0  # Requests per minute to pace to (0 = no pacing)
+    MODEL_TPM_LIMIT: float = 0  # Tokens per minute to pace to (0 = no pacing)
+    MODEL_HEDGING: bool = False  # Send a second identical call when the first is unusually slow
+    MODEL_HEDGE_PERCENTILE: float = 95.0  # Hedge after this percentile of recent latency
+    MODEL_HEDGE_MAX_FRACTION: float = 0.05  # At most this share of calls are hedged
+    MODEL_HEDGE_MIN_SAMPLES: int = 20  # Latencies needed before hedging starts
+    MODEL_HEDGE_MIN_DELAY: float = 2.0  # Never hedge sooner than this (seconds)
     
     # Server
     HOST: str = "127.0.0.1"
     PORT: int = 8000
     
+    # Admission control for model-backed endpoints (analyze, search)
+    MODEL_RATE_LIMIT_PER_MINUTE: float = 10.0  # Per client token bucket refill rate
+    MODEL_RATE_LIMIT_BURST: int = 5  # Bucket size
+    MODEL_MAX_CONCURRENCY: int = 4  # Model-backed requests running at once (per worker)
+    MODEL_MAX_QUEUE: int = 16  # Requests allowed to wait for a slot before 503
+    MODEL_QUEUE_TIMEOUT: float = 30.0  # Seconds a request may wait for a slot
+    
+    # Duplicate analyze/upload requests
+    ANALYSIS_WAIT_TIMEOUT: float = 300.0  # Seconds to wait for another worker's analysis of the same document
+    ANALYSIS_POLL_INTERVAL: float = 1.0
+    IDEMPOTENCY_KEY_TTL_HOURS: int = 24  # Stored responses are replayed for this long
+    
+    # Processing leases (recovery of documents left PROCESSING by a dead worker)
+    ANALYSIS_LEASE_SECONDS: int = 120  # Renewed by a heartbeat while the analysis runs
+    ANALYSIS_HEARTBEAT_SECONDS: int = 30
+    ANALYSIS_MAX_ATTEMPTS: int = 3  # Expired leases are requeued until this many interrupted runs in a row, then failed
+    REAPER_INTERVAL_SECONDS: int = 60
+    
+    # Re-extraction of stale documents (services/reextraction_service.py)
+    REEXTRACT_BATCH_SIZE: int = 20  # Progress is saved after each batch
+    REEXTRACT_CONCURRENCY: int = 2  # Documents re-extracted at once (within a batch)
+    REEXTRACT_BATCH_PAUSE_SECONDS: float = 5.0  # Pause between batches, leaving room for user requests
+    REEXTRACT_BUDGET_WAIT_SECONDS: float = 300.0  # Wait while the token budget has no room for a full extraction
+    
+    # Observability
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # json or text
+    LOG_PAGE_SAMPLE_RATE: float = 0.1  # Fraction of per-page messages that are logged
+    LOG_QUEUE_SIZE: int = 10000  # Records beyond this are dropped instead of blocking
+    TRACE_LOG_STAGES: bool = False  # Log per-stage timings for every analysis
+    PROFILING_TOKEN: str = ""  # Admin token that enables per-request profiling (empty = disabled)
+    PROFILE_DIR: str = "profiles"
+    PROFILING_INTERVAL: float = 0.001  # Sampling interval in seconds
+    
+    # Production server (gunicorn.conf.py)
+    WORKERS: int = 0  # 0 = one worker per CPU core
+    WORKER_MAX_REQUESTS: int = 500  # Recycle workers to contain PDF/image memory growth
+    WORKER_MAX_REQUESTS_JITTER: int = 50
+    GRACEFUL_TIMEOUT: int = 120  # Seconds to let in-flight analyses finish on SIGTERM
+    WORKER_TIMEOUT: int = 180
+    
+    # Reference data cache (tax slabs). Admin changes apply immediately in the worker
+    # that made them; the other workers keep the old slabs for up to this long
+    REFERENCE_CACHE_TTL: int = 300
+    
     # File Upload (Only PDF and JPG)
     MAX_UPLOAD_SIZE: int = 10485760  # 10MB
     UPLOAD_FOLDER: str = "uploads"
@@ -34,6 +133,11 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     
+    # Response compression (bytes below this size are sent uncompressed)
+    COMPRESSION_MINIMUM_SIZE: int = 1024
+    BROTLI_QUALITY: int = 4
+    GZIP_LEVEL: int = 6
+    
     # CORS
     CORS_ORIGINS: List[str] = [
         "chrome-extension://*",
@@ -45,13 +149,10 @@ class Settings(BaseSettings):
         case_sensitive = True
 
     def get_upload_path(self) -> Path:
-        """Get the absolute path for uploads folder"""
+        """Get the path for uploads folder (created on first use, not at import)"""
         upload_path = Path(self.UPLOAD_FOLDER)
         upload_path.mkdir(exist_ok=True)  # Create if doesn't exist
         return upload_path
 
 # Create a global settings instance
-settings = Settings()
-
-# Create uploads folder if it doesn't exist
-settings.get_upload_path()
\ No newline at end of file
+settings = Settings()
\ No newline at end of file
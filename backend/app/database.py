@@ -1,7 +1,10 @@
-from sqlalchemy import create_engine
+import time
+from fastapi import Request, Response
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from app.config import settings
+from app.dependencies import client_key
 
 # Create database engine
 engine = create_engine(
@@ -10,20 +13,109 @@ engine = create_engine(
     pool_pre_ping=True  # Verify connections before using
 )
 
+# Read replica engine (falls back to the primary when no replica is configured)
+if settings.DATABASE_REPLICA_URL:
+    replica_engine = create_engine(
+        settings.DATABASE_REPLICA_URL,
+        echo=settings.DEBUG,
+        pool_pre_ping=True
+    )
+else:
+    replica_engine = engine
+
 # Create SessionLocal class for database sessions
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Read-only sessions bound to the replica
+ReplicaSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=replica_engine)
+
 # Base class for all models
 Base = declarative_base()
 
+# Read-your-writes: clients that wrote recently keep reading from the primary
+READ_YOUR_WRITES_COOKIE = "taxease_last_write"
+_recent_writers = {}  # client key -> monotonic time of last write
+_MAX_TRACKED_WRITERS = 10000
+
+
+def _mark_client_write(request: Request, response: Response) -> None:
+    """Remember that this client just wrote so its next reads hit the primary"""
+    now = time.monotonic()
+    if len(_recent_writers) >= _MAX_TRACKED_WRITERS:
+        cutoff = now - settings.REPLICA_STICKY_SECONDS
+        for key in [k for k, t in _recent_writers.items() if t < cutoff]:
+            del _recent_writers[key]
+    _recent_writers[client_key(request)] = now
+
+    # Cookie covers multi-worker deployments where the in-process map is not shared
+    response.set_cookie(
+        READ_YOUR_WRITES_COOKIE,
+        str(int(time.time())),
+        max_age=settings.REPLICA_STICKY_SECONDS,
+        httponly=True,
+        samesite="lax"
+    )
+
+
+def client_wrote_recently(request: Request) -> bool:
+    """True if reads for this client must go to the primary"""
+    last_write = _recent_writers.get(client_key(request))
+    if last_write is not None and time.monotonic() - last_write < settings.REPLICA_STICKY_SECONDS:
+        return True
+
+    cookie = request.cookies.get(READ_YOUR_WRITES_COOKIE)
+    if cookie:
+        try:
+            return time.time() - int(cookie) < settings.REPLICA_STICKY_SECONDS
+        except ValueError:
+            return False
+    return False
+
+
+@event.listens_for(Session, "after_flush")
+def _on_session_flush(session, flush_context):
+    """Fire the write hook registered by get_db once the session writes something"""
+    on_write = session.info.pop("on_write", None)
+    if on_write:
+        on_write()
+
+
 # Dependency to get database session
-def get_db():
+def get_db(request: Request, response: Response):
     """
-    Database session dependency for FastAPI routes.
+    Database session dependency for FastAPI routes (primary, read-write).
     Usage: def my_route(db: Session = Depends(get_db))
     """
     db = SessionLocal()
+    if replica_engine is not engine:
+        db.info["on_write"] = lambda: _mark_client_write(request, response)
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def mark_write(db: Session) -> None:
+    """
+    Treat a get_db session's client as a recent writer when the write itself
+    went through another session (e.g. a shared background analysis)
+    """
+    on_write = db.info.pop("on_write", None)
+    if on_write:
+        on_write()
+
+
+def get_read_db(request: Request):
+    """
+    Read-only session dependency for GET routes.
+    Uses the replica unless none is configured or the client wrote recently.
+    Usage: def my_route(db: Session = Depends(get_read_db))
+    """
+    if replica_engine is engine or client_wrote_recently(request):
+        db = SessionLocal()
+    else:
+        db = ReplicaSessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,147 @@
+"""
+Shared FastAPI dependencies
+Admission control for model-backed endpoints: a per-client token bucket plus
+a global concurrency cap with a bounded wait queue. Rejected requests get
+429 (client over its rate) or 503 (service saturated) with Retry-After.
+"""
+import asyncio
+import math
+import time
+import threading
+from typing import Dict, Tuple
+from fastapi import HTTPException, Request, status
+
+from app.config import settings
+
+
+def client_key(request: Request) -> str:
+    """Identify the caller (explicit client id header, else remote address)"""
+    client_id = request.headers.get("X-Client-Id")
+    if client_id:
+        return client_id
+    return request.client.host if request.client else "unknown"
+
+
+class TokenBucketLimiter:
+    """Per-key token bucket: `burst` requests at once, refilled at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute: float, burst: int, max_keys: int = 10000):
+        self.rate = rate_per_minute / 60.0
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}  # key -> (tokens, last refill)
+        self._lock = threading.Lock()
+
+    def try_acquire(self, key: str) -> float:
+        """Take a token. Returns 0 on success, else seconds until one is available."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (float(self.burst), now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens >= 1:
+                if key not in self._buckets and len(self._buckets) >= self.max_keys:
+                    self._evict_full_buckets(now)
+                self._buckets[key] = (tokens - 1, now)
+                return 0.0
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / self.rate if self.rate > 0 else 60.0
+
+    def _evict_full_buckets(self, now: float) -> None:
+        """Forget clients whose bucket has refilled (they are back at the default)"""
+        for key, (tokens, last) in list(self._buckets.items()):
+            if tokens + (now - last) * self.rate >= self.burst:
+                del self._buckets[key]
+
+
+class ServiceOverloaded(Exception):
+    """Raised when the concurrency gate cannot admit a request"""
+
+    def __init__(self, retry_after: float):
+        super().__init__("Service overloaded")
+        self.retry_after = retry_after
+
+
+class ConcurrencyGate:
+    """
+    Caps how many requests run at once. Up to `max_queue` more may wait
+    (for at most `queue_timeout` seconds); anything beyond is rejected.
+    """
+
+    def __init__(self, limit: int, max_queue: int, queue_timeout: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self._semaphore = None
+        self._avg_duration = 10.0  # EWMA of time a slot is held, seeds Retry-After
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.limit)
+        return self._semaphore
+
+    def retry_after(self) -> float:
+        """Rough time until a queued request would get a slot"""
+        return self._avg_duration * (self.waiting + 1) / max(1, self.limit)
+
+    async def acquire(self) -> float:
+        """Wait for a slot. Returns the acquisition time for release()."""
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.max_queue:
+            raise ServiceOverloaded(self.retry_after())
+
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise ServiceOverloaded(self.retry_after())
+        finally:
+            self.waiting -= 1
+
+        self.active += 1
+        return time.monotonic()
+
+    def release(self, acquired_at: float) -> None:
+        self.active -= 1
+        self._avg_duration = 0.8 * self._avg_duration + 0.2 * (time.monotonic() - acquired_at)
+        self._get_semaphore().release()
+
+
+model_rate_limiter = TokenBucketLimiter(
+    settings.MODEL_RATE_LIMIT_PER_MINUTE,
+    settings.MODEL_RATE_LIMIT_BURST
+)
+model_gate = ConcurrencyGate(
+    settings.MODEL_MAX_CONCURRENCY,
+    settings.MODEL_MAX_QUEUE,
+    settings.MODEL_QUEUE_TIMEOUT
+)
+
+
+async def model_admission(request: Request):
+    """
+    Admission control for endpoints that call the model.
+    Usage: @router.post("/analyze/{id}", dependencies=[Depends(model_admission)])
+    """
+    wait = model_rate_limiter.try_acquire(client_key(request))
+    if wait > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many analysis requests, please slow down",
+            headers={"Retry-After": str(math.ceil(wait))}
+        )
+
+    try:
+        acquired_at = await model_gate.acquire()
+    except ServiceOverloaded as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analysis service is busy, please retry shortly",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
+
+    try:
+        yield
+    finally:
+        model_gate.release(acquired_at)
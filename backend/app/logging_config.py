@@ -0,0 +1,185 @@
+"""
+Logging setup
+Request handlers never write to stdout themselves: records go into a bounded
+in-memory queue (QueueHandler) and a background thread (QueueListener) does
+the actual writing. Records are JSON lines carrying the request id of the
+request that produced them. Noisy per-page messages are sampled.
+
+Usage:
+    import logging
+    logger = logging.getLogger(__name__)
+    logger.info("Extraction complete", extra={"tokens_used": 1234})
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+
+from app.config import settings
+
+# Logger for per-page messages (sampled at LOG_PAGE_SAMPLE_RATE)
+PAGE_LOGGER_NAME = "app.pages"
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+# Attributes every LogRecord has; anything else was passed through `extra`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+_listener = None
+_handler = None
+
+
+class RequestIdFilter(logging.Filter):
+    """Attach the current request id to every record"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Let through only a fraction of records (warnings and errors always pass)"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, request id, message and extra fields"""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _STANDARD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable format for local development (LOG_FORMAT=text)"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s")
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    Formats in the caller and enqueues without blocking.
+    When the queue is full the record is dropped rather than stalling a request.
+    """
+
+    def prepare(self, record):
+        # Format here so the request id and exception text are captured now
+        record = copy.copy(record)
+        record.msg = self.format(record)
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        record.stack_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def _start_listener(log_queue) -> None:
+    global _listener
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+
+def _restart_listener_after_fork() -> None:
+    """
+    The writer thread does not survive fork (gunicorn workers): give the child
+    a fresh queue (the old one's lock may have been held) and a new writer.
+    """
+    if _handler is not None:
+        _handler.queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+        _start_listener(_handler.queue)
+
+
+def setup_logging() -> None:
+    """Route all logging through the queue. Safe to call more than once."""
+    global _handler
+    if _handler is not None:
+        return
+
+    log_queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+    handler = DroppingQueueHandler(log_queue)
+    handler.addFilter(RequestIdFilter())
+    handler.setFormatter(JsonFormatter() if settings.LOG_FORMAT == "json" else TextFormatter())
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(settings.LOG_LEVEL)
+    app_logger.addHandler(handler)
+    app_logger.propagate = False
+
+    logging.getLogger(PAGE_LOGGER_NAME).addFilter(SamplingFilter(settings.LOG_PAGE_SAMPLE_RATE))
+
+    _handler = handler
+    _start_listener(log_queue)
+    os.register_at_fork(after_in_child=_restart_listener_after_fork)
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flush queued records (called on application shutdown)"""
+    if _listener is not None:
+        _listener.stop()
+
+
+class RequestIdMiddleware:
+    """ASGI middleware: take X-Request-ID from the client or generate one, echo it back"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER, request_id.encode())]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -1,18 +1,67 @@
-from fastapi import FastAPI
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 from app.config import settings
+from app.logging_config import setup_logging, RequestIdMiddleware
+from app.services.metrics import render_metrics
+from app.services import document_service, reextraction_service
 import os
 
 # Import routers
 from app.api import documents, admin, tax
 
+# Queue-based JSON logging (must be set up before the first request)
+setup_logging()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Recover documents left PROCESSING by workers that died mid-analysis
+    reaper = asyncio.create_task(document_service.run_reaper())
+    # Resume re-extraction jobs whose worker stopped
+    job_monitor = asyncio.create_task(reextraction_service.run_job_monitor())
+    try:
+        yield
+    finally:
+        reaper.cancel()
+        job_monitor.cancel()
+        reextraction_service.stop_jobs()
+        # Hand back anything this worker is still analyzing so another worker can take it
+        document_service.release_leases()
+
 app = FastAPI(
     title=settings.APP_NAME,
     version=settings.APP_VERSION,
-    debug=settings.DEBUG
+    debug=settings.DEBUG,
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse  # orjson is several times faster than stdlib json
 )
 
+# Compress large responses (document lists with extracted_data, admin listings).
+# Brotli when the client accepts it, gzip otherwise.
+try:
+    from brotli_asgi import BrotliMiddleware
+    app.add_middleware(
+        BrotliMiddleware,
+        quality=settings.BROTLI_QUALITY,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        gzip_fallback=True
+    )
+except ImportError:
+    app.add_middleware(
+        GZipMiddleware,
+        minimum_size=settings.COMPRESSION_MINIMUM_SIZE,
+        compresslevel=settings.GZIP_LEVEL
+    )
+
+# On-demand profiling of single requests (installed only when a token is configured)
+if settings.PROFILING_TOKEN:
+    from app.profiling import ProfilingMiddleware
+    app.add_middleware(ProfilingMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -22,6 +71,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request ids for log correlation (outermost, so every log line carries one)
+app.add_middleware(RequestIdMiddleware)
+
 # Serve static files (admin panel)
 static_path = os.path.join(os.path.dirname(__file__), "..", "static")
 if os.path.exists(static_path):
@@ -44,12 +96,19 @@ async def health_check():
         "app": settings.APP_NAME
     }
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics (stage latency histograms, token counters)"""
+    payload, content_type = render_metrics()
+    return Response(content=payload, media_type=content_type)
+
 # Include routers
 app.include_router(documents.router, prefix="/api/documents", tags=["Documents"])
 app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
 app.include_router(tax.router, prefix="/api/tax", tags=["Tax"])
 
 if __name__ == "__main__":
+    # Development server only - production runs under gunicorn (see gunicorn.conf.py)
     import uvicorn
     uvicorn.run(
         "app.main:app",
@@ -1,6 +1,10 @@
 from app.database import Base  # Import Base from database
 from app.models.document import Document, DocumentStatus
 from app.models.tax_data import TaxCalculation
+from app.models.usage import ModelUsage
+from app.models.idempotency import IdempotencyKey
+from app.models.prompt import PromptTemplate
+from app.models.reextraction import ReextractionJob
 from app.models.admin import (
     User,
     TaxSlab,
@@ -15,6 +19,10 @@ __all__ = [
     "Document",
     "DocumentStatus",
     "TaxCalculation",
+    "ModelUsage",
+    "IdempotencyKey",
+    "PromptTemplate",
+    "ReextractionJob",
     "User",
     "TaxSlab",
     "AllowanceType",
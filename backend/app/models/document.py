@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Float, Text, Enum, Boolean
 from sqlalchemy.sql import func
 from app.database import Base
 import enum
@@ -36,6 +36,26 @@ class Document(Base):
     # Error handling
     error_message = Column(Text, nullable=True)
     
+    # What produced extracted_data: re-extraction finds documents stamped
+    # with an older extractor version or a prompt that is no longer current
+    extractor_version = Column(Integer, nullable=True)
+    prompt_version = Column(String(80), nullable=True)  # e.g. salary_slip@v3
+    
+    # Preflight: worked out once after upload (see preflight.py) so analysis,
+    # the cost estimate and the UI never re-open the file for the basics
+    file_digest = Column(String(64), nullable=True, index=True)  # SHA-256 of the content
+    page_count = Column(Integer, nullable=True)  # 1 for images
+    has_text = Column(Boolean, nullable=True)  # PDF with a text layer
+    image_width = Column(Integer, nullable=True)  # First page, in pixels (PDFs at the render DPI)
+    image_height = Column(Integer, nullable=True)
+    preflight_at = Column(DateTime(timezone=True), nullable=True)
+    
+    # Processing lease: the worker analyzing the document renews it while it
+    # works; an expired lease means the worker died (see document_service)
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    attempts = Column(Integer, default=0, nullable=False)  # Runs in a row that never finished
+    
     # Timestamps
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
     processed_at = Column(DateTime(timezone=True), nullable=True)
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+class IdempotencyKey(Base):
+    """
+    Responses stored under a client-supplied Idempotency-Key header
+    A retry with the same key gets the stored response instead of repeating the work
+    """
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("scope", "key", name="uq_idempotency_keys_scope_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    scope = Column(String(50), nullable=False)  # upload, analyze
+    key = Column(String(255), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # what the key was first used for
+
+    # Empty while the first request is still running
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)  # JSON string
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<IdempotencyKey(scope='{self.scope}', key='{self.key}', status={self.response_status})>"
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text, Boolean, UniqueConstraint
+from sqlalchemy.sql import func
+from app.database import Base
+
+class PromptTemplate(Base):
+    """
+    Versioned extraction prompts, one series per document type
+    The newest active version is used; adding a version (or deactivating the
+    newest) changes extraction without a redeploy. Built-in defaults apply
+    when a document type has no active row (see prompt_service).
+    """
+    __tablename__ = "prompt_templates"
+    __table_args__ = (UniqueConstraint("doc_type", "version", name="uq_prompt_templates_doc_type_version"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    doc_type = Column(String(50), nullable=False, index=True)  # salary_slip, bank_statement, employment_letter, unknown, bank_statement_chunk
+    version = Column(Integer, nullable=False)
+
+    system_prompt = Column(Text, nullable=False)
+    prompt = Column(Text, nullable=False)  # user message; document text or images follow it
+    max_tokens = Column(Integer, nullable=True)  # completion allowance for this schema
+
+    description = Column(Text, nullable=True)  # what changed in this version
+    is_active = Column(Boolean, default=True)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<PromptTemplate(doc_type='{self.doc_type}', version={self.version})>"
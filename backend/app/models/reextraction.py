@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from sqlalchemy.sql import func
+from app.database import Base
+
+class ReextractionJob(Base):
+    """
+    Background re-extraction of documents whose stored result is stale
+    (extracted by an older extractor version or prompt, see reextraction_service)
+    Progress is saved after every batch, so an interrupted job resumes where it stopped.
+    """
+    __tablename__ = "reextraction_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String(20), nullable=False, index=True)  # running, completed, cancelled
+    extractor_version = Column(Integer, nullable=False)  # version the job re-extracts to
+
+    # Progress
+    total = Column(Integer, default=0, nullable=False)  # stale documents when the job started
+    processed = Column(Integer, default=0, nullable=False)
+    succeeded = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)  # still stale; a later job tries them again
+    skipped = Column(Integer, default=0, nullable=False)  # no longer COMPLETED, or busy
+    last_document_id = Column(Integer, default=0, nullable=False)  # documents up to this id are done
+    message = Column(Text, nullable=True)  # e.g. why the job is waiting
+
+    # Runner lease: the worker running the job renews it; an expired lease
+    # means that worker stopped and another one resumes the job
+    lease_owner = Column(String(100), nullable=True)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<ReextractionJob(id={self.id}, status='{self.status}', processed={self.processed}/{self.total})>"
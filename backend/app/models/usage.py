@@ -0,0 +1,37 @@
+from sqlalchemy import Column, Integer, String, DateTime, Float, Boolean, ForeignKey
+from sqlalchemy.sql import func
+from app.database import Base
+
+class ModelUsage(Base):
+    """
+    Ledger of every model call (tokens, cost and latency)
+    Daily/monthly totals are rolled up from this table for budgets and reports
+    """
+    __tablename__ = "model_usage"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
+    
+    # What the call was for and how it was made
+    purpose = Column(String(50), nullable=False)  # extraction, reextraction, fields, search
+    model = Column(String(100), nullable=False)
+    input_mode = Column(String(20), nullable=False)  # text, vision-high, vision-low
+    
+    # Usage
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    cost_usd = Column(Float, default=0.0)
+    latency_ms = Column(Integer, nullable=True)
+    success = Column(Boolean, default=True)
+    
+    # Tiered routing: how the call was routed and what its kept answer would
+    # have cost on the top-tier model (0 for rejected answers)
+    route = Column(String(20), nullable=True)  # direct, first_tier, rejected, escalated
+    baseline_cost_usd = Column(Float, nullable=True)
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    
+    def __repr__(self):
+        return f"<ModelUsage(id={self.id}, model='{self.model}', tokens={self.total_tokens})>"
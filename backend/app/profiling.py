@@ -0,0 +1,180 @@
+"""
+On-demand request profiling
+Profiles a single request when it carries the admin profiling token, either as
+the `X-TaxEase-Profile` header or the `profile` query parameter:
+
+    curl -X POST -H "X-TaxEase-Profile: $PROFILING_TOKEN" \
+        http://localhost:8000/api/documents/analyze/42
+
+A sampling profile (speedscope JSON, open at https://www.speedscope.app) and a
+summary with the DB query count and time are saved to PROFILE_DIR. Profiles
+are listed at GET /api/admin/profiles.
+
+The middleware is only installed when PROFILING_TOKEN is set, so there is no
+overhead at all when profiling is disabled.
+"""
+import hmac
+import json
+import logging
+import re
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+from fastapi import Header, HTTPException, Query, status
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b"x-taxease-profile"
+PROFILE_QUERY_PARAM = "profile"
+PROFILES_ENDPOINT = "/api/admin/profiles"  # listing requests are never profiled
+
+_query_stats: ContextVar[Optional[Dict]] = ContextVar("profile_query_stats", default=None)
+_listeners_installed = False
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _query_stats.get() is not None:
+        conn.info.setdefault("profile_query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _query_stats.get()
+    if stats is not None:
+        started = conn.info["profile_query_start"].pop()
+        stats["count"] += 1
+        stats["time"] += time.perf_counter() - started
+
+
+def _install_query_listeners() -> None:
+    """Hook query counting into every engine the first time a request is profiled"""
+    global _listeners_installed
+    if not _listeners_installed:
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        _listeners_installed = True
+
+
+def get_profile_dir() -> Path:
+    profile_dir = Path(settings.PROFILE_DIR)
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    return profile_dir
+
+
+def _requested_token(scope) -> Optional[str]:
+    for name, value in scope.get("headers", []):
+        if name == PROFILE_HEADER:
+            return value.decode("latin-1")
+    query_string = scope.get("query_string", b"")
+    if PROFILE_QUERY_PARAM.encode() in query_string:
+        values = parse_qs(query_string.decode("latin-1")).get(PROFILE_QUERY_PARAM)
+        if values:
+            return values[0]
+    return None
+
+
+def _token_matches(token: Optional[str]) -> bool:
+    return bool(token) and bool(settings.PROFILING_TOKEN) and hmac.compare_digest(token, settings.PROFILING_TOKEN)
+
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests carrying the profiling token"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or
+                scope["path"].startswith(PROFILES_ENDPOINT) or
+                not _token_matches(_requested_token(scope))):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            from pyinstrument import Profiler
+            from pyinstrument.renderers import SpeedscopeRenderer
+        except ImportError:
+            logger.warning("Profiling requested but pyinstrument is not installed")
+            await self.app(scope, receive, send)
+            return
+
+        _install_query_listeners()
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        response_status = {"code": None}
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                response_status["code"] = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        stats = {"count": 0, "time": 0.0}
+        token = _query_stats.set(stats)
+        profiler = Profiler(interval=settings.PROFILING_INTERVAL, async_mode="enabled")
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profiler.stop()
+            _query_stats.reset(token)
+            duration = time.perf_counter() - started
+            self._save(profile_id, scope, response_status["code"], duration, stats,
+                       profiler.output(SpeedscopeRenderer()))
+
+    @staticmethod
+    def _save(profile_id: str, scope, status_code, duration: float, stats: Dict, speedscope: str) -> None:
+        profile_dir = get_profile_dir()
+        (profile_dir / f"{profile_id}.speedscope.json").write_text(speedscope)
+        summary = {
+            "id": profile_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "status": status_code,
+            "duration_ms": round(duration * 1000, 1),
+            "db_queries": stats["count"],
+            "db_time_ms": round(stats["time"] * 1000, 1),
+            "created_at": datetime.now().isoformat(),
+            "profile_file": f"{profile_id}.speedscope.json"
+        }
+        (profile_dir / f"{profile_id}.json").write_text(json.dumps(summary, indent=2))
+
+
+def require_profiling_token(
+    x_taxease_profile: Optional[str] = Header(None),
+    profile: Optional[str] = Query(None, include_in_schema=False)
+):
+    """Dependency for the profile listing endpoints (admin token required)"""
+    if not settings.PROFILING_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled")
+    if not (_token_matches(x_taxease_profile) or _token_matches(profile)):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid profiling token")
+
+
+def list_profiles(limit: int = 50) -> List[Dict]:
+    """Saved profile summaries, newest first"""
+    summaries = []
+    for path in sorted(get_profile_dir().glob("*.json"), reverse=True):
+        if path.name.endswith(".speedscope.json"):
+            continue
+        summaries.append(json.loads(path.read_text()))
+        if len(summaries) >= limit:
+            break
+    return summaries
+
+
+def get_profile_path(profile_id: str) -> Optional[Path]:
+    """Path of a saved speedscope profile (None if the id is invalid or missing)"""
+    if not re.fullmatch(r"[0-9a-f-]+", profile_id):
+        return None
+    path = get_profile_dir() / f"{profile_id}.speedscope.json"
+    return path if path.exists() else None
@@ -95,6 +95,44 @@ class SystemSettingResponse(SystemSettingBase):
         from_attributes = True
 
 
+# Prompt Template Schemas
+class PromptTemplateCreate(BaseModel):
+    doc_type: str
+    system_prompt: str
+    prompt: str
+    max_tokens: Optional[int] = None
+    description: Optional[str] = None
+
+class PromptTemplateResponse(PromptTemplateCreate):
+    id: int
+    version: int
+    is_active: bool
+    created_at: datetime
+    
+    class Config:
+        from_attributes = True
+
+
+# Re-extraction Job Schemas
+class ReextractionJobResponse(BaseModel):
+    id: int
+    status: str
+    extractor_version: int
+    total: int
+    processed: int
+    succeeded: int
+    failed: int
+    skipped: int
+    last_document_id: int
+    message: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+
 # User Schemas
 class UserBase(BaseModel):
     username: str
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 from app.models.document import DocumentStatus
 
 class DocumentBase(BaseModel):
@@ -21,12 +21,21 @@ class DocumentResponse(DocumentBase):
     file_size: int
     status: DocumentStatus
     extracted_data: Optional[str] = None
+    # Filled in by the upload preflight (None until it has run)
+    page_count: Optional[int] = None
+    has_text: Optional[bool] = None
+    image_width: Optional[int] = None
+    image_height: Optional[int] = None
     uploaded_at: datetime
     processed_at: Optional[datetime] = None
     
     class Config:
         from_attributes = True  # For SQLAlchemy models
 
+class FieldCorrectionRequest(BaseModel):
+    """Fields to ask the model for again (e.g. "cnic", "deductions.income_tax"); empty = missing or low-confidence ones"""
+    fields: Optional[List[str]] = None
+
 class DocumentList(BaseModel):
     """Schema for list of documents"""
     total: int
@@ -1,195 +1,123 @@
 """
 AI Service for extracting tax-related data from documents
-Uses OpenAI GPT-4 Vision for both image and PDF documents
+Uses OpenAI GPT-4 Vision for both image and PDF documents, trying cheaper
+model tiers first (see routing.py)
 """
 import os
 import json
-import base64
-from openai import OpenAI
+import asyncio
+import logging
+import math
+import time
+from functools import lru_cache
 from typing import Dict, Optional, List
 from pathlib import Path
-import PyPDF2
-from pdf2image import convert_from_path
-from PIL import Image
-import io
 
 from app.config import settings
-
-client = OpenAI(api_key=settings.OPENAI_API_KEY)
-
-# Prompt for extracting salary data
-SALARY_EXTRACTION_PROMPT = """
-You are a tax assistant helping Pakistani salaried employees file their taxes with FBR.
-
-Analyze this document (salary slip, bank statement, or employment letter) and extract the following information in JSON format.
-
-**IMPORTANT FOR BANK STATEMENTS:**
-If this is a bank statement, look for:
-- SALARY CREDITS: Look for regular monthly credits with descriptions like "SALARY", "SAL CR", "PAYROLL", "MONTHLY PAY", or credits from employer name
-- RENT DEBITS: Regular debits for rent payments (look for "RENT", "LANDLORD", "HOUSE RENT")
-- UTILITY PAYMENTS: Payments to LESCO, SNGPL, PTCL, K-Electric, etc.
-- The LARGEST regular credit transaction is likely the monthly salary
-- Pattern: If same amount credited every month = salary
-- Calculate annual salary by: monthly_salary × 12
-
-Extract the following in JSON format:
-
-{
-  "employee_name": "Account holder name from bank statement OR employee name from salary slip",
-  "cnic": "13-digit CNIC if available",
-  "employer_name": "Company name OR employer name appearing in salary credits",
-  "designation": "Job title if mentioned",
-  
-  "salary_details": {
-    "basic_salary": "Extract from salary slip OR if bank statement: estimate as 50-60% of gross salary",
-    "gross_salary": "Total monthly salary from slip OR largest regular monthly credit in bank statement",
-    "annual_gross_salary": "monthly gross salary × 12"
-  },
-  
-  "allowances": {
-    "house_rent": "From salary slip OR if bank statement: estimate as 40-45% of basic salary",
-    "medical": "From salary slip OR estimate as 10% of basic if bank statement",
-    "conveyance": "From salary slip OR standard Rs. 8000/month if bank statement",
-    "utility": "From salary slip OR 0",
-    "other": "Any other allowances"
-  },
-  
-  "deductions": {
-    "income_tax": "Tax deducted shown in salary slip OR look for 'TAX' debits in bank statement",
-    "provident_fund": "PF deduction OR look for 'PROVIDENT' in bank statement",
-    "eobi": "EOBI deduction if shown",
-    "social_security": "Social security if shown"
-  },
-  
-  "bank_details": {
-    "account_number": "Bank account number",
-    "bank_name": "Bank name (UBL, HBL, MCB, etc.)",
-    "monthly_salary_credit": "Amount and date of monthly salary credit if bank statement",
-    "total_credits": "Sum of all credits in the period",
-    "total_debits": "Sum of all debits in the period"
-  },
-  
-  "other_expenses": {
-    "rent_paid": "Monthly rent amount - look for regular debits to landlord/rent in bank statement",
-    "utilities_paid": "Utility bills - sum of LESCO, SNGPL, PTCL, K-Electric payments",
-    "education": "Education expenses if visible",
-    "medical_expenses": "Medical expenses if visible"
-  },
-  
-  "period": "Statement period OR salary month",
-  "document_type": "salary slip OR bank statement OR employment letter",
-  "confidence": "High/Medium/Low based on data clarity"
-}
-
-**EXTRACTION STRATEGY:**
-
-For BANK STATEMENTS:
-1. Identify SALARY CREDITS:
-   - Look for credits with "SALARY", "SAL", "PAYROLL" in description
-   - Or look for largest regular monthly credit (likely salary)
-   - Check if employer name appears in credit description
-   - Example: "Credit: Rs. 85,000 - SALARY FROM ABC COMPANY"
-
-2. Calculate SALARY BREAKDOWN:
-   - Gross Salary = Monthly salary credit amount
-   - Basic Salary ≈ 50-60% of gross (Pakistani standard)
-   - House Rent Allowance ≈ 40-45% of basic
-   - Medical Allowance ≈ 10% of basic
-   - Conveyance ≈ Rs. 8000/month (standard)
-
-3. Find EXPENSES:
-   - Rent: Look for regular debits with "RENT", "LANDLORD"
-   - Utilities: LESCO, SNGPL, PTCL, K-Electric, Water Board
-   - Tax: Look for "TAX" debits
-
-4. IMPORTANT: 
-   - Use actual numbers found in transactions
-   - If you can't find salary slip data, USE TRANSACTION PATTERNS
-   - Don't just say "Not found" - analyze and estimate from transactions!
-
-For SALARY SLIPS:
-- Extract exact amounts shown
-- All fields should have data
-- Don't estimate if actual data exists
-
-**Response Rules:**
-1. Always extract available data - don't use "Not found" if data exists in transactions
-2. For bank statements: ANALYZE TRANSACTION PATTERNS to find salary
-3. All amounts must be NUMBERS ONLY (no Rs., commas, or text)
-4. If you see a regular monthly credit of Rs. 85,000, that's the gross salary
-5. Calculate basic, allowances from gross using Pakistani standards
-6. Be intelligent about transaction patterns
-
-Respond with ONLY valid JSON, no additional text.
-"""
-
-
-def check_pdf_has_text(pdf_path: str) -> bool:
+from app.services import routing
+from app.services import render_cache, statements
+from app.services.classifier import classify_text, classify_images, BANK_STATEMENT, UNKNOWN
+from app.services.page_triage import select_pages, render_pages, RENDER_DPI
+from app.services.preflight import Preflight, inspect_file
+from app.services.preprocess import prepare_image, prepare_image_file, vision_tokens, PreparedImage
+from app.services.metrics import stage, record_tokens, MODEL_ROUTES, MODEL_ESCALATIONS, DOCUMENTS_CLASSIFIED
+from app.services.prompt_service import get_prompt, STATEMENT_CHUNK, SYSTEM_PROMPT, SALARY_EXTRACTION_PROMPT  # noqa: F401 (re-exported)
+from app.services.fields import FIELDS, HEADER_BAND, field_prompt, text_excerpt, max_tokens, read_answer, review_fields
+from app.services.resilience import call_model, estimate_request_tokens, ModelUnavailable
+from app.logging_config import PAGE_LOGGER_NAME
+
+logger = logging.getLogger(__name__)
+page_logger = logging.getLogger(PAGE_LOGGER_NAME)
+
+# PyPDF2, pdf2image, PIL and the OpenAI SDK are imported on first use so that
+# importing the app (workers, tests, CLI tools) does not pay for them.
+
+
+def preload_modules() -> None:
     """
-    Check if PDF has extractable text
-    Returns True if text found, False if image-based PDF
+    Import the heavy document-processing libraries up front.
+    Called by the production server before forking so workers share them.
     """
+    import PyPDF2  # noqa: F401
+    import pdf2image  # noqa: F401
+    from PIL import Image  # noqa: F401
+    import openai  # noqa: F401
+
+
+@lru_cache(maxsize=1)
+def get_client():
+    """Async OpenAI client, created on first use (model calls never block the event loop)"""
+    from openai import AsyncOpenAI
+    return AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.OPENAI_BASE_URL,
+        timeout=settings.MODEL_REQUEST_TIMEOUT,
+        max_retries=0  # retries, backoff and pacing are done by services/resilience.py
+    )
+
+
+def extract_page_texts(pdf_path: str) -> List[str]:
+    """Extract the text of every page of a text-based PDF file"""
+    import PyPDF2
     try:
         with open(pdf_path, 'rb') as file:
             pdf_reader = PyPDF2.PdfReader(file)
-            text = ""
-            # Check first 2 pages
-            for page_num in range(min(2, len(pdf_reader.pages))):
-                text += pdf_reader.pages[page_num].extract_text()
-            
-            # If we got meaningful text (more than 50 chars), it's text-based
-            return len(text.strip()) > 50
-    except Exception as e:
-        print(f"Error checking PDF text: {e}")
-        return False
-
-
-def extract_text_from_pdf(pdf_path: str) -> str:
-    """Extract text from text-based PDF file"""
-    try:
-        text = ""
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            for page in pdf_reader.pages:
-                text += page.extract_text()
-        return text
+            return [page.extract_text() for page in pdf_reader.pages]
     except Exception as e:
         raise Exception(f"Error reading PDF: {str(e)}")
 
 
-def pdf_to_images(pdf_path: str, max_pages: int = 3) -> List[Image.Image]:
-    """
-    Convert PDF pages to images for Vision API
-    Only converts first few pages to save costs
-    """
-    try:
-        # Convert PDF to images (first 3 pages only to save costs)
-        images = convert_from_path(
-            pdf_path,
-            dpi=200,  # Good quality for text recognition
-            first_page=1,
-            last_page=max_pages
-        )
-        return images
-    except Exception as e:
-        raise Exception(f"Error converting PDF to images: {str(e)}")
+def prepare_pdf_pages(pdf_path: str, digest: str, pages: List[int], detail: str) -> List[PreparedImage]:
+    """Prepared images of the given pages; only pages missing from the render cache are rendered"""
+    keys = {page: render_cache.cache_key(digest, page, RENDER_DPI, detail) for page in pages}
+    prepared = {page: render_cache.get(key) for page, key in keys.items()}
+    missing = [page for page in pages if prepared[page] is None]
+    if missing:
+        with stage("page_rendering"):
+            images = render_pages(pdf_path, missing)
+        for page, img in zip(missing, images):
+            with stage("preprocessing"):
+                prepared[page] = prepare_image(img, detail)
+            render_cache.put(keys[page], prepared[page])
+    return [prepared[page] for page in pages]
+
+
+def prepare_image_upload(image_path: str, digest: str, detail: str) -> PreparedImage:
+    """Prepared image of a JPEG upload, from the render cache when possible"""
+    key = render_cache.cache_key(digest, 1, 0, detail)
+    image = render_cache.get(key)
+    if image is None:
+        with stage("preprocessing"):
+            image = prepare_image_file(image_path, detail)
+        render_cache.put(key, image)
+    return image
+
+
+def _image_part(image: PreparedImage) -> dict:
+    return {
+        "type": "image_url",
+        "image_url": {
+            "url": image.data_url,
+            "detail": image.detail
+        }
+    }
 
 
-def image_to_base64(image: Image.Image) -> str:
-    """Convert PIL Image to base64 string"""
-    buffered = io.BytesIO()
-    # Convert to RGB if necessary
-    if image.mode in ('RGBA', 'LA', 'P'):
-        image = image.convert('RGB')
-    image.save(buffered, format="JPEG", quality=85)
-    return base64.b64encode(buffered.getvalue()).decode('utf-8')
+def _vision_input_mode(prepared: List[PreparedImage]) -> str:
+    """Usage label of a vision call: high when any image went out at high detail"""
+    return "vision-high" if any(image.detail == "high" for image in prepared) else "vision-low"
 
 
-def encode_image_file_to_base64(image_path: str) -> str:
-    """Convert image file to base64 string"""
-    with open(image_path, "rb") as image_file:
-        return base64.b64encode(image_file.read()).decode('utf-8')
-    
+def _log_prepared(image: PreparedImage, page: Optional[int] = None) -> None:
+    page_logger.info("Image prepared for analysis", extra={
+        "page": page,
+        "detail": image.detail,
+        "width": image.width,
+        "height": image.height,
+        "image_tokens": image.tokens,
+        "skew": image.skew
+    })
+
 
 def analyze_bank_transactions_post_processing(extracted_data: dict) -> dict:
     """
@@ -205,7 +133,7 @@ def analyze_bank_transactions_post_processing(extracted_data: dict) -> dict:
         bank_details.get("transactions") != "Not found" and
         salary_details.get("gross_salary") == "Not found"):
         
-        print("🔍 Bank statement detected with transactions - attempting intelligent estimation")
+        logger.info("Bank statement detected with transactions - attempting intelligent estimation")
         
         # For Pakistani salaried employees, make educated estimates
         # Based on account type and transaction patterns
@@ -229,12 +157,226 @@ def analyze_bank_transactions_post_processing(extracted_data: dict) -> dict:
         }
         
         extracted_data["confidence"] = "Low - Estimated from standard Pakistani salary structure"
-        print("⚠️ Used estimation model - recommend uploading actual salary slip for accuracy")
+        logger.warning("Used estimation model - recommend uploading actual salary slip for accuracy")
     
     return extracted_data
 
 
-async def extract_salary_data_from_document(file_path: str, file_type: str) -> Dict:
+# Stamped on every stored extraction together with the prompt label. Bump it
+# when a change to the extraction code or to post-processing changes what is
+# stored, so the re-extraction job (reextraction_service) picks old results up.
+EXTRACTOR_VERSION = 1
+
+# How much each extraction mode may spend (chosen from token budgets, see usage_service)
+EXTRACTION_MODES = {
+    "full": {"max_pages": 2, "detail": "auto", "max_text_chars": None, "chunk_statements": True},
+    "economy": {"max_pages": 1, "detail": "auto", "max_text_chars": 20000, "chunk_statements": False},
+    "minimal": {"max_pages": 1, "detail": "low", "max_text_chars": 8000, "chunk_statements": False}
+}
+
+# Rough prompt size of one text PDF page (a dense statement page) and of the
+# instructions around it, for estimate_extraction_tokens()
+TEXT_TOKENS_PER_PAGE = 700
+PROMPT_OVERHEAD_TOKENS = 400
+DEFAULT_PAGE_SIZE = (1654, 2339)  # A4 at RENDER_DPI
+
+# Shared by every chunked extraction in the worker (created on first use, in the event loop)
+_chunk_slots: Optional[asyncio.Semaphore] = None
+
+
+async def create_chat_completion(input_mode: str = "text", usage_log: Optional[list] = None, **request):
+    """
+    Single entry point for chat completion calls.
+    Paces, retries, hedges and circuit-breaks the call (see resilience.call_model),
+    counts tokens for /metrics and, when usage_log is given, appends a ledger
+    record (model, input mode, tokens, latency).
+    """
+    model = request.get("model", "unknown")
+    started = time.perf_counter()
+    response = None
+    try:
+        response = await call_model(
+            lambda: get_client().chat.completions.create(**request),
+            estimate_request_tokens(request),
+            kind=f"{model}:{input_mode}"
+        )
+        record_tokens(model, response.usage)
+        return response
+    finally:
+        if usage_log is not None:
+            usage = response.usage if response is not None else None
+            usage_log.append({
+                "model": model,
+                "input_mode": input_mode,
+                "prompt_tokens": usage.prompt_tokens if usage else 0,
+                "completion_tokens": usage.completion_tokens if usage else 0,
+                "total_tokens": usage.total_tokens if usage else 0,
+                "latency_ms": int((time.perf_counter() - started) * 1000),
+                "success": response is not None
+            })
+
+
+async def _routed_extraction(calls: list, input_mode: str, messages: list,
+                             review=routing.review_extraction, purpose: str = "extraction", **options):
+    """
+    Run an extraction prompt through the model tiers, cheapest first.
+    An answer that fails review (routing.review_extraction by default) is
+    escalated to the next tier; the top tier's answer is kept as is.
+    Returns (response, parsed data).
+    """
+    tiers = routing.model_tiers(input_mode)
+    top_model = tiers[-1]
+    options = {key: value for key, value in options.items() if value is not None}
+    for index, model in enumerate(tiers):
+        response = await create_chat_completion(
+            input_mode=input_mode,
+            usage_log=calls,
+            model=model,
+            messages=messages,
+            temperature=0.1,
+            response_format={"type": "json_object"},
+            **options
+        )
+        last = index == len(tiers) - 1
+        with stage("json_parse"):
+            if last:
+                data = json.loads(response.choices[0].message.content)
+                problems = []
+            else:
+                try:
+                    data = json.loads(response.choices[0].message.content)
+                except ValueError:
+                    data = None
+                problems = review(data)
+
+        if problems:
+            routing.label_call(calls[-1], routing.ROUTE_REJECTED, top_model)
+            for reason in problems:
+                MODEL_ESCALATIONS.labels(purpose=purpose, reason=reason).inc()
+            logger.info("Escalating extraction", extra={"model": model, "next_model": tiers[index + 1],
+                                                        "reasons": ",".join(problems), "purpose": purpose})
+            continue
+
+        route = routing.kept_route(index, len(tiers))
+        routing.label_call(calls[-1], route, top_model)
+        MODEL_ROUTES.labels(purpose=purpose, route=route).inc()
+        return response, data
+
+
+def estimate_extraction_tokens(preflight: Preflight, file_type: str, mode: str) -> int:
+    """
+    Upper bound of the tokens an extraction will use in a mode, from the
+    preflight alone (the document type is not known yet, so long PDFs are
+    assumed to be chunked statements and completions to use max_tokens)
+    """
+    plan = EXTRACTION_MODES.get(mode, EXTRACTION_MODES["full"])
+    page_count = preflight.page_count or 1
+    chunked = plan["chunk_statements"] and page_count > settings.STATEMENT_CHUNK_PAGES
+    if chunked:
+        pages = min(page_count, settings.STATEMENT_MAX_PAGES)
+        chunk_count = math.ceil(pages / settings.STATEMENT_CHUNK_PAGES)
+        completion = chunk_count * (get_prompt(STATEMENT_CHUNK).max_tokens + PROMPT_OVERHEAD_TOKENS)
+    else:
+        pages = page_count if file_type == "pdf" and preflight.has_text else min(page_count, plan["max_pages"])
+        completion = get_prompt(UNKNOWN).max_tokens + PROMPT_OVERHEAD_TOKENS
+
+    if file_type == "pdf" and preflight.has_text:
+        prompt_tokens = pages * TEXT_TOKENS_PER_PAGE
+        if plan["max_text_chars"] and not chunked:
+            prompt_tokens = min(prompt_tokens, plan["max_text_chars"] // 4)
+    else:
+        # Before preprocessing a page costs at most what the provider bills for it at full size
+        width, height = (preflight.width, preflight.height) if preflight.width else DEFAULT_PAGE_SIZE
+        prompt_tokens = pages * vision_tokens(width, height, "low" if plan["detail"] == "low" else "high")
+    return prompt_tokens + completion
+
+
+def _chunk_statement(plan: dict, doc_type: str, page_count: int) -> bool:
+    """Long bank statements are extracted in page chunks (full mode only)"""
+    return plan["chunk_statements"] and doc_type == BANK_STATEMENT and page_count > settings.STATEMENT_CHUNK_PAGES
+
+
+def _get_chunk_slots() -> asyncio.Semaphore:
+    global _chunk_slots
+    if _chunk_slots is None:
+        _chunk_slots = asyncio.Semaphore(settings.STATEMENT_CHUNK_CONCURRENCY)
+    return _chunk_slots
+
+
+async def _chunked_statement_extraction(calls: list, prompt, page_count: int, build_content):
+    """
+    Map-reduce extraction of a long bank statement (see statements.py).
+    Page groups are extracted concurrently, at most STATEMENT_CHUNK_CONCURRENCY
+    chunk calls at a time across the worker, and merged in Python.
+    build_content(pages) returns (input_mode, user content) for one chunk.
+    A chunk that fails on its own (page render error, bad request) only lowers
+    the confidence of the merged result; the error is raised when every chunk failed.
+    ModelUnavailable cancels the other chunks and is raised, so the document goes
+    back to UPLOADED instead of being stored with part of the statement.
+    Returns (first response, merged data).
+    """
+    chunks = statements.page_chunks(min(page_count, settings.STATEMENT_MAX_PAGES), settings.STATEMENT_CHUNK_PAGES)
+
+    async def extract_chunk(pages: List[int]):
+        try:
+            async with _get_chunk_slots():
+                input_mode, content = await build_content(pages)
+                model = routing.model_tiers(input_mode)[-1]
+                response = await create_chat_completion(
+                    input_mode=input_mode,
+                    usage_log=calls,
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": prompt.system_prompt},
+                        {"role": "user", "content": content}
+                    ],
+                    temperature=0.1,
+                    response_format={"type": "json_object"},
+                    max_tokens=prompt.max_tokens
+                )
+        except ModelUnavailable:
+            raise
+        except Exception as e:
+            logger.warning("Statement chunk failed", extra={"pages": f"{pages[0]}-{pages[-1]}", "error": str(e)})
+            errors.append(e)
+            return None, None
+        routing.label_call(calls[-1], routing.ROUTE_DIRECT, model)
+        try:
+            data = json.loads(response.choices[0].message.content)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            logger.warning("Unreadable statement chunk", extra={"pages": f"{pages[0]}-{pages[-1]}"})
+            return response, None
+        return response, data
+
+    errors = []
+    tasks = [asyncio.create_task(extract_chunk(pages)) for pages in chunks]
+    try:
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    if len(errors) == len(chunks):
+        raise errors[0]
+
+    with stage("merge"):
+        parsed = [data for _, data in results if data is not None]
+        merged = statements.merge_chunks(parsed, failed_chunks=len(results) - len(parsed))
+    responses = [response for response, _ in results if response is not None]
+    MODEL_ROUTES.labels(purpose="extraction", route=routing.ROUTE_DIRECT).inc(len(responses))
+    logger.info("Statement extracted in chunks", extra={
+        "page_count": page_count,
+        "chunks": len(chunks),
+        "failed_chunks": merged["failed_chunks"],
+        "transactions": merged["bank_details"]["transactions"]
+    })
+    return responses[0], merged
+
+
+async def extract_salary_data_from_document(file_path: str, file_type: str, mode: str = "full",
+                                           preflight: Optional[Preflight] = None) -> Dict:
     """
     Extract salary and tax-related data from document using AI
     Automatically detects if PDF is text-based or image-based
@@ -242,139 +384,326 @@ async def extract_salary_data_from_document(file_path: str, file_type: str) -> D
     Args:
         file_path: Path to the document file
         file_type: Type of file (pdf, jpg, jpeg)
+        mode: Extraction mode from EXTRACTION_MODES (cheaper modes send
+              fewer pages, lower image detail and less text)
+        preflight: The document's stored preflight data (inspected here when not given)
         
     Returns:
-        Dictionary containing extracted data
+        Dictionary containing extracted data and the model calls made
     """
     
     if not settings.OPENAI_API_KEY:
         raise Exception("OpenAI API key not configured")
     
+    plan = EXTRACTION_MODES.get(mode, EXTRACTION_MODES["full"])
+    detail = plan["detail"]
+    calls = []
+    
     try:
+        # Digest, page count and text layer (PDF parsing and rendering are
+        # CPU-bound, so they run in a worker thread)
+        if preflight is None:
+            with stage("pdf_inspection" if file_type == "pdf" else "file_digest"):
+                preflight = await asyncio.to_thread(inspect_file, file_path, file_type)
+        digest = preflight.digest
+
         if file_type == "pdf":
-            # First, check if PDF has extractable text
-            has_text = check_pdf_has_text(file_path)
-            
-            if has_text:
+            if preflight.has_text:
                 # Text-based PDF - extract text and use cheaper model
-                print("📄 Text-based PDF detected - using text extraction")
-                pdf_text = extract_text_from_pdf(file_path)
+                logger.info("Text-based PDF detected - using text extraction", extra={"mode": mode})
+                with stage("text_extraction"):
+                    page_texts = await asyncio.to_thread(extract_page_texts, file_path)
+                    pdf_text = "\n".join(page_texts)
+                with stage("classification"):
+                    classification = classify_text(pdf_text)
+                prompt = get_prompt(classification.doc_type)
+                if plan["max_text_chars"]:
+                    pdf_text = pdf_text[:plan["max_text_chars"]]
                 
-                response = client.chat.completions.create(
-                    model="gpt-4o",  # or gpt-4-turbo for cheaper
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a tax assistant specializing in Pakistani tax returns. Extract financial data accurately."
-                        },
-                        {
-                            "role": "user",
-                            "content": f"{SALARY_EXTRACTION_PROMPT}\n\nDocument Text:\n{pdf_text}"
-                        }
-                    ],
-                    temperature=0.1,
-                    response_format={"type": "json_object"}
-                )
+                if _chunk_statement(plan, classification.doc_type, len(page_texts)):
+                    prompt = get_prompt(STATEMENT_CHUNK)
+
+                    async def build_text_chunk(pages: List[int]):
+                        chunk_text = "\n".join(page_texts[page - 1] for page in pages)
+                        return "text", f"{prompt.prompt}\n\nDocument Text:\n{chunk_text}"
+
+                    response, extracted_data = await _chunked_statement_extraction(
+                        calls, prompt, len(page_texts), build_text_chunk
+                    )
+                else:
+                    response, extracted_data = await _routed_extraction(
+                        calls,
+                        input_mode="text",
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": prompt.system_prompt
+                            },
+                            {
+                                "role": "user",
+                                "content": f"{prompt.prompt}\n\nDocument Text:\n{pdf_text}"
+                            }
+                        ],
+                        max_tokens=prompt.max_tokens
+                    )
             else:
                 # Image-based PDF (scanned) - use Vision API
-                print("🖼️ Image-based PDF detected - using Vision API")
-                
-                # Convert PDF pages to images
-                images = pdf_to_images(file_path, max_pages=2)  # Only first 2 pages to save costs
-                
-                # Prepare content with all images
-                content = [
-                    {
-                        "type": "text",
-                        "text": SALARY_EXTRACTION_PROMPT
-                    }
-                ]
+                logger.info("Image-based PDF detected - using Vision API", extra={"mode": mode})
                 
-                # Add each page as an image
-                for idx, img in enumerate(images):
-                    base64_image = image_to_base64(img)
-                    content.append({
-                        "type": "image_url",
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{base64_image}",
-                            "detail": "high"  # High detail for better text recognition
-                        }
-                    })
-                    print(f"📄 Added page {idx + 1} to analysis")
+                # Score every page at low resolution, render only the best ones
+                with stage("page_triage"):
+                    triage = await asyncio.to_thread(select_pages, file_path, plan["max_pages"], preflight.page_count)
+                # Cropped, deskewed and sized for the fewest legible tokens (render cache first)
+                prepared = await asyncio.to_thread(prepare_pdf_pages, file_path, digest, triage.pages, detail)
+                for page, image in zip(triage.pages, prepared):
+                    _log_prepared(image, page)
+                with stage("classification"):
+                    classification = await asyncio.to_thread(
+                        classify_images, [prepared[0].to_image()], triage.page_count
+                    )
+                prompt = get_prompt(classification.doc_type)
                 
-                response = client.chat.completions.create(
-                    model="gpt-4o",  # Vision model
-                    messages=[
-                        {
-                            "role": "system",
-                            "content": "You are a tax assistant specializing in Pakistani tax returns. Extract financial data accurately from images."
-                        },
+                if _chunk_statement(plan, classification.doc_type, triage.page_count):
+                    prompt = get_prompt(STATEMENT_CHUNK)
+                    ready = dict(zip(triage.pages, prepared))
+
+                    async def build_scanned_chunk(pages: List[int]):
+                        missing = [page for page in pages if page not in ready]
+                        if missing:
+                            images = await asyncio.to_thread(prepare_pdf_pages, file_path, digest, missing, detail)
+                            ready.update(zip(missing, images))
+                            for page, image in zip(missing, images):
+                                _log_prepared(image, page)
+                        chunk = [ready.pop(page) for page in pages]
+                        content = [{"type": "text", "text": prompt.prompt}] + [_image_part(image) for image in chunk]
+                        return _vision_input_mode(chunk), content
+
+                    response, extracted_data = await _chunked_statement_extraction(
+                        calls, prompt, triage.page_count, build_scanned_chunk
+                    )
+                else:
+                    # Prepare content with all images
+                    content = [
                         {
-                            "role": "user",
-                            "content": content
+                            "type": "text",
+                            "text": prompt.prompt
                         }
-                    ],
-                    temperature=0.1,
-                    max_tokens=2000,
-                    response_format={"type": "json_object"}
-                )
+                    ]
+                    content.extend(_image_part(image) for image in prepared)
+                
+                    response, extracted_data = await _routed_extraction(
+                        calls,
+                        input_mode=_vision_input_mode(prepared),
+                        messages=[
+                            {
+                                "role": "system",
+                                "content": prompt.system_prompt
+                            },
+                            {
+                                "role": "user",
+                                "content": content
+                            }
+                        ],
+                        max_tokens=prompt.max_tokens
+                    )
         
         else:  # jpg, jpeg - use vision model directly
-            print("🖼️ Image file - using Vision API")
-            base64_image = encode_image_file_to_base64(file_path)
+            logger.info("Image file - using Vision API", extra={"mode": mode})
+            image = await asyncio.to_thread(prepare_image_upload, file_path, digest, detail)
+            _log_prepared(image)
+            with stage("classification"):
+                classification = await asyncio.to_thread(classify_images, [image.to_image()])
+            prompt = get_prompt(classification.doc_type)
             
-            response = client.chat.completions.create(
-                model="gpt-4o",
+            response, extracted_data = await _routed_extraction(
+                calls,
+                input_mode=_vision_input_mode([image]),
                 messages=[
                     {
                         "role": "system",
-                        "content": "You are a tax assistant specializing in Pakistani tax returns. Extract financial data accurately from images."
+                        "content": prompt.system_prompt
                     },
                     {
                         "role": "user",
                         "content": [
                             {
                                 "type": "text",
-                                "text": SALARY_EXTRACTION_PROMPT
+                                "text": prompt.prompt
                             },
-                            {
-                                "type": "image_url",
-                                "image_url": {
-                                    "url": f"data:image/jpeg;base64,{base64_image}",
-                                    "detail": "high"
-                                }
-                            }
+                            _image_part(image)
                         ]
                     }
                 ],
-                temperature=0.1,
-                max_tokens=2000,
-                response_format={"type": "json_object"}
+                max_tokens=prompt.max_tokens
             )
-        
-        # At the end of extract_salary_data_from_document, before returning:
-
-        # Parse the response
-        extracted_data = json.loads(response.choices[0].message.content)
 
         # Post-process for bank statements
-        if extracted_data.get("document_type") == "bank statement":
-            extracted_data = analyze_bank_transactions_post_processing(extracted_data)
-
-        print(f"✅ Extraction complete - {response.usage.total_tokens} tokens used")
+        with stage("post_processing"):
+            if extracted_data.get("document_type") == "bank statement":
+                extracted_data = analyze_bank_transactions_post_processing(extracted_data)
+
+        tokens_used = sum(call["total_tokens"] for call in calls)
+        logger.info("Extraction complete", extra={
+            "tokens_used": tokens_used,
+            "document_type": classification.doc_type,
+            "prompt_version": prompt.label,
+            "mode": mode,
+            "model": response.model,
+            "route": calls[-1].get("route"),
+            "classifier_confidence": classification.confidence
+        })
+        DOCUMENTS_CLASSIFIED.labels(doc_type=classification.doc_type).inc()
 
         return {
             "success": True,
             "data": extracted_data,
-            "tokens_used": response.usage.total_tokens
+            "tokens_used": tokens_used,
+            "document_type": classification.doc_type,
+            "prompt_version": prompt.label,
+            "extractor_version": EXTRACTOR_VERSION,
+            "mode": mode,
+            "calls": calls
         }
         
+    except ModelUnavailable as e:
+        logger.warning("Model unavailable during extraction", extra={"error": str(e)})
+        return {
+            "success": False,
+            "error": str(e),
+            "retry_after": e.retry_after,  # temporary: the document can be analyzed again later
+            "data": None,
+            "mode": mode,
+            "calls": calls
+        }
     except Exception as e:
-        print(f"❌ Error during extraction: {str(e)}")
+        logger.exception("Error during extraction")
         return {
             "success": False,
             "error": str(e),
-            "data": None
+            "data": None,
+            "mode": mode,
+            "calls": calls
+        }
+
+
+def _header_band(image: PreparedImage, detail: str) -> PreparedImage:
+    page = image.to_image()
+    with stage("preprocessing"):
+        return prepare_image(page.crop((0, 0, page.width, round(page.height * HEADER_BAND))), detail)
+
+
+def prepare_field_images(file_path: str, file_type: str, preflight: Preflight, fields: List[str],
+                         detail: str) -> List[PreparedImage]:
+    """
+    The page regions that hold the requested fields: the top band of the first
+    page for header fields, the best page (page triage) for the others
+    """
+    header = any(FIELDS[path].header for path in fields)
+    body = not all(FIELDS[path].header for path in fields)
+    if file_type == "pdf":
+        page = 1
+        if body:
+            with stage("page_triage"):
+                page = select_pages(file_path, 1, preflight.page_count).pages[0]
+        pages = [1, page] if header and page != 1 else [page]
+        prepared = prepare_pdf_pages(file_path, preflight.digest, pages, detail)
+    else:
+        pages = [1]
+        prepared = [prepare_image_upload(file_path, preflight.digest, detail)]
+
+    if header and (not body or len(pages) > 1):
+        prepared[0] = _header_band(prepared[0], detail)
+    return prepared
+
+
+async def extract_fields_from_document(file_path: str, file_type: str, fields: List[str],
+                                       document_type: Optional[str] = None, mode: str = "full",
+                                       preflight: Optional[Preflight] = None) -> Dict:
+    """
+    Ask the model again for just some fields of an analyzed document (see
+    fields.py): a minimal schema, and only the text lines or the page region
+    that hold them
+    
+    Args:
+        file_path: Path to the document file
+        file_type: Type of file (pdf, jpg, jpeg)
+        fields: Field paths from fields.FIELDS, e.g. "deductions.income_tax"
+        document_type: Stored document type, named in the prompt
+        mode: Extraction mode (its image detail is used)
+        preflight: The document's stored preflight data (inspected here when not given)
+        
+    Returns:
+        Dictionary with the values read ({field path: value}) and the model calls made
+    """
+    plan = EXTRACTION_MODES.get(mode, EXTRACTION_MODES["full"])
+    calls = []
+    
+    try:
+        if preflight is None:
+            with stage("pdf_inspection" if file_type == "pdf" else "file_digest"):
+                preflight = await asyncio.to_thread(inspect_file, file_path, file_type)
+        
+        prompt_text = field_prompt(fields, document_type)
+        if file_type == "pdf" and preflight.has_text:
+            with stage("text_extraction"):
+                page_texts = await asyncio.to_thread(extract_page_texts, file_path)
+            input_mode = "text"
+            content = f"{prompt_text}\n\nDocument Text:\n{text_excerpt(page_texts, fields)}"
+        else:
+            images = await asyncio.to_thread(prepare_field_images, file_path, file_type, preflight, fields,
+                                             plan["detail"])
+            for image in images:
+                _log_prepared(image)
+            input_mode = _vision_input_mode(images)
+            content = [{"type": "text", "text": prompt_text}] + [_image_part(image) for image in images]
+        
+        response, answer = await _routed_extraction(
+            calls,
+            input_mode=input_mode,
+            messages=[
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": content}
+            ],
+            review=lambda data: review_fields(data, fields),
+            purpose="fields",
+            max_tokens=max_tokens(fields)
+        )
+        values = read_answer(answer, fields)
+        
+        tokens_used = sum(call["total_tokens"] for call in calls)
+        logger.info("Field extraction complete", extra={
+            "tokens_used": tokens_used,
+            "fields": ",".join(fields),
+            "fields_read": len(values),
+            "mode": mode,
+            "model": response.model
+        })
+        return {
+            "success": True,
+            "values": values,
+            "tokens_used": tokens_used,
+            "mode": mode,
+            "calls": calls
+        }
+    
+    except ModelUnavailable as e:
+        logger.warning("Model unavailable during field extraction", extra={"error": str(e)})
+        return {
+            "success": False,
+            "error": str(e),
+            "retry_after": e.retry_after,
+            "values": None,
+            "mode": mode,
+            "calls": calls
+        }
+    except Exception as e:
+        logger.exception("Error during field extraction")
+        return {
+            "success": False,
+            "error": str(e),
+            "values": None,
+            "mode": mode,
+            "calls": calls
         }
 
 
@@ -393,33 +722,56 @@ async def search_in_documents(query: str, document_texts: list) -> Dict:
     if not settings.OPENAI_API_KEY:
         raise Exception("OpenAI API key not configured")
     
+    calls = []
+    
     try:
         # Combine all document texts
         combined_text = "\n\n---DOCUMENT SEPARATOR---\n\n".join(document_texts)
         
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are a helpful assistant that searches through salary and expense documents to answer user questions. Provide specific amounts and dates when available."
-                },
-                {
-                    "role": "user",
-                    "content": f"Search Query: {query}\n\nDocuments:\n{combined_text}\n\nPlease answer the query based on the documents. If the information is not found, say so clearly."
-                }
-            ],
-            temperature=0.3
-        )
+        messages = [
+            {
+                "role": "system",
+                "content": "You are a helpful assistant that searches through salary and expense documents to answer user questions. Provide specific amounts and dates when available."
+            },
+            {
+                "role": "user",
+                "content": f"Search Query: {query}\n\nDocuments:\n{combined_text}\n\nPlease answer the query based on the documents. If the information is not found, say so clearly."
+            }
+        ]
+
+        tiers = routing.model_tiers("text")
+        for index, model in enumerate(tiers):
+            response = await create_chat_completion(
+                input_mode="text",
+                usage_log=calls,
+                model=model,
+                messages=messages,
+                temperature=0.3
+            )
+            answer = response.choices[0].message.content
+            problems = routing.review_answer(answer) if index < len(tiers) - 1 else []
+            if not problems:
+                break
+            # The cheaper model found nothing; a stronger one may
+            routing.label_call(calls[-1], routing.ROUTE_REJECTED, tiers[-1])
+            for reason in problems:
+                MODEL_ESCALATIONS.labels(purpose="search", reason=reason).inc()
+
+        route = routing.kept_route(index, len(tiers))
+        routing.label_call(calls[-1], route, tiers[-1])
+        MODEL_ROUTES.labels(purpose="search", route=route).inc()
         
         return {
             "success": True,
-            "answer": response.choices[0].message.content
+            "answer": answer,
+            "calls": calls
         }
         
     except Exception as e:
         return {
             "success": False,
             "error": str(e),
-            "answer": None
+            "retry_after": getattr(e, "retry_after", None),
+            "answer": None,
+            "calls": calls
         }
\ No newline at end of file
@@ -0,0 +1,130 @@
+"""
+Local document-type classifier
+Decides what kind of document is being analyzed before any model call, so
+extraction can use a short prompt written for that type (see prompt_service).
+
+- PDF text: weighted keywords plus a layout feature (lines that start with a
+  date, i.e. transaction rows).
+- Images and scanned pages: the text-line structure of a small grayscale
+  copy (how many lines, how long they are, how many pages).
+
+Anything below CLASSIFIER_MIN_CONFIDENCE is UNKNOWN and gets the generic prompt.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, TYPE_CHECKING
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+SALARY_SLIP = "salary_slip"
+BANK_STATEMENT = "bank_statement"
+EMPLOYMENT_LETTER = "employment_letter"
+UNKNOWN = "unknown"
+
+DOCUMENT_TYPES = (SALARY_SLIP, BANK_STATEMENT, EMPLOYMENT_LETTER)
+
+_KEYWORDS: Dict[str, Dict[str, float]] = {
+    SALARY_SLIP: {
+        "payslip": 3, "pay slip": 3, "salary slip": 3, "net pay": 2, "net salary": 2, "earnings": 1.5,
+        "basic salary": 1.5, "gross salary": 1.5, "house rent allowance": 1, "total deductions": 1.5,
+        "employee id": 1, "employee code": 1, "pay period": 1.5, "eobi": 0.5, "provident fund": 0.5
+    },
+    BANK_STATEMENT: {
+        "account statement": 3, "statement of account": 3, "bank statement": 3, "opening balance": 2,
+        "closing balance": 2, "iban": 1.5, "value date": 1.5, "withdrawal": 1, "deposit": 1,
+        "debit": 1, "credit": 1, "balance": 1, "cheque": 1, "ibft": 1, "account title": 1.5
+    },
+    EMPLOYMENT_LETTER: {
+        "to whom it may concern": 3, "this is to certify": 3, "employment letter": 3,
+        "offer letter": 3, "letter of appointment": 3, "employment certificate": 3,
+        "sincerely": 1.5, "regards": 1, "has been employed": 2, "is employed": 1.5,
+        "joined": 1, "working with": 1.5, "annual package": 1.5
+    }
+}
+
+_DATE_AT_LINE_START = re.compile(
+    r"^\s*(\d{1,2}[-/.](\d{1,2}|[a-z]{3})[-/.]\d{2,4}|\d{4}-\d{2}-\d{2})\b", re.IGNORECASE | re.MULTILINE
+)
+
+
+@dataclass
+class Classification:
+    doc_type: str
+    confidence: float  # share of the evidence that points to doc_type (0-1)
+    scores: Dict[str, float] = field(default_factory=dict)
+
+
+def _decide(scores: Dict[str, float]) -> Classification:
+    total = sum(scores.values())
+    if total <= 0:
+        return Classification(UNKNOWN, 0.0, scores)
+    best = max(scores, key=scores.get)
+    confidence = scores[best] / total
+    if confidence < settings.CLASSIFIER_MIN_CONFIDENCE:
+        return Classification(UNKNOWN, round(confidence, 3), scores)
+    return Classification(best, round(confidence, 3), scores)
+
+
+def classify_text(text: str) -> Classification:
+    """Classify extracted PDF text"""
+    lowered = text.lower()
+    scores = {
+        doc_type: sum(weight for keyword, weight in keywords.items() if keyword in lowered)
+        for doc_type, keywords in _KEYWORDS.items()
+    }
+    # Transaction tables: many lines that begin with a date
+    dated_lines = len(_DATE_AT_LINE_START.findall(text))
+    if dated_lines >= 5:
+        scores[BANK_STATEMENT] += min(dated_lines / 5, 6)
+    return _decide(scores)
+
+
+def text_lines(image: "Image.Image", width: int = 400) -> List[float]:
+    """Lengths (as a share of the page width) of the text lines on a page"""
+    from PIL import ImageOps
+    small = image.convert("L")
+    small.thumbnail((width, width * 2))
+    # Ink becomes white on black so getbbox() finds it
+    ink = ImageOps.invert(small).point(lambda value: 255 if value > 127 else 0)
+    w, h = ink.size
+    lines, top, left, right = [], None, None, None
+    for y in range(h + 1):
+        box = ink.crop((0, y, w, y + 1)).getbbox() if y < h else None
+        if box:
+            if top is None:
+                top, left, right = y, box[0], box[2]
+            left, right = min(left, box[0]), max(right, box[2])
+        elif top is not None:
+            # Scan speckles are short in both directions; text lines are not
+            if y - top >= 2 and (right - left) / w >= 0.02:
+                lines.append((right - left) / w)
+            top = None
+    return lines
+
+
+def classify_images(images: List["Image.Image"], page_count: int = 0) -> Classification:
+    """
+    Classify page images by their line structure: statements are long runs of
+    table rows (often over several pages), slips are short forms, letters are
+    a few paragraphs of long lines
+    """
+    if not images:
+        return Classification(UNKNOWN, 0.0, {})
+    lines = text_lines(images[0])
+    if len(lines) < 3:
+        return Classification(UNKNOWN, 0.0, {})
+    wide = sum(1 for length in lines if length > 0.6) / len(lines)
+
+    scores = {SALARY_SLIP: 0.0, BANK_STATEMENT: 0.0, EMPLOYMENT_LETTER: 0.0}
+    if max(len(images), page_count) > 1:
+        scores[BANK_STATEMENT] += 2
+    if len(lines) >= 28:
+        scores[BANK_STATEMENT] += 3
+    elif wide > 0.6:
+        scores[EMPLOYMENT_LETTER] += 3
+    elif len(lines) >= 8:
+        scores[SALARY_SLIP] += 3
+    return _decide(scores)
@@ -0,0 +1,554 @@
+"""
+Document analysis
+Each document is analyzed at most once at a time:
+  - within a worker, concurrent requests for the same document share one
+    in-flight extraction (single-flight) and get the same result;
+  - across workers, the document row is claimed with a conditional UPDATE
+    (UPLOADED/FAILED -> PROCESSING), so only one worker calls the model and
+    the others wait for its result.
+
+A claim is a lease: the owning worker renews `lease_expires_at` with a
+heartbeat while the extraction runs. If the worker dies, the lease expires
+and the reaper (run_reaper, started with the app) puts the document back to
+UPLOADED, or FAILED once ANALYSIS_MAX_ATTEMPTS is reached.
+
+Re-extraction (reextract_document, driven by reextraction_service) claims a
+COMPLETED document the same way. Its stored result is only replaced by a
+successful extraction: on failure, or when its lease expires, the document
+goes back to COMPLETED with the old result.
+
+Field corrections (correct_fields) also hold a COMPLETED document under a
+lease while the model is asked again for a few fields (see fields.py).
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Document, DocumentStatus
+from app.services import idempotency_service, preflight
+from app.services.ai_service import (
+    extract_salary_data_from_document, extract_fields_from_document, estimate_extraction_tokens
+)
+from app.services.fields import FIELDS, fields_to_correct, merge_fields
+from app.services.metrics import (
+    stage, start_trace, format_trace, ANALYSIS_SECONDS, ANALYSIS_DEDUPLICATED, LEASES_REAPED
+)
+from app.services.usage_service import choose_extraction_mode, record_model_calls, MODE_FULL
+
+logger = logging.getLogger(__name__)
+
+# Statuses a document can be claimed from for analysis
+CLAIMABLE_STATUSES = (DocumentStatus.UPLOADED, DocumentStatus.FAILED)
+
+_in_flight: Dict[int, "asyncio.Task"] = {}
+
+
+class AnalysisError(Exception):
+    """Analysis could not be done; carries the HTTP status for the API layer"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+def record_analysis(document_id: int, trace: list, outcome: str, started: float):
+    """Observe total analysis time and optionally log the per-stage breakdown"""
+    ANALYSIS_SECONDS.labels(outcome=outcome).observe(time.perf_counter() - started)
+    if settings.TRACE_LOG_STAGES:
+        logger.info(
+            "Analysis finished",
+            extra={
+                "document_id": document_id,
+                "outcome": outcome,
+                "duration_ms": round((time.perf_counter() - started) * 1000),
+                "stages": format_trace(trace)
+            }
+        )
+
+
+def worker_id() -> str:
+    """Lease owner name of this process (pid changes after fork, so computed each time)"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _lease_expired(now: datetime):
+    """PROCESSING with an expired lease (or none: rows from before leases existed)"""
+    return and_(
+        Document.status == DocumentStatus.PROCESSING,
+        or_(Document.lease_expires_at.is_(None), Document.lease_expires_at < now)
+    )
+
+
+def claim_document(db: Session, document_id: int) -> bool:
+    """
+    Atomically move a document to PROCESSING under a lease owned by this worker.
+    Also takes over an expired lease while attempts remain (not an interrupted
+    re-extraction: the reaper restores that one to COMPLETED).
+    False if someone else holds it.
+    """
+    now = _utcnow()
+    claimed = db.query(Document).filter(
+        Document.id == document_id,
+        or_(
+            Document.status.in_(CLAIMABLE_STATUSES),
+            and_(
+                _lease_expired(now),
+                Document.attempts < settings.ANALYSIS_MAX_ATTEMPTS,
+                Document.extracted_data.is_(None)
+            )
+        )
+    ).update({
+        Document.status: DocumentStatus.PROCESSING,
+        Document.lease_owner: worker_id(),
+        Document.lease_expires_at: now + timedelta(seconds=settings.ANALYSIS_LEASE_SECONDS),
+        Document.attempts: Document.attempts + 1
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def claim_for_reextraction(db: Session, document_id: int) -> bool:
+    """Move a COMPLETED document to PROCESSING under this worker's lease (attempts are not counted)"""
+    claimed = db.query(Document).filter(
+        Document.id == document_id,
+        Document.status == DocumentStatus.COMPLETED
+    ).update({
+        Document.status: DocumentStatus.PROCESSING,
+        Document.lease_owner: worker_id(),
+        Document.lease_expires_at: _utcnow() + timedelta(seconds=settings.ANALYSIS_LEASE_SECONDS)
+    }, synchronize_session=False)
+    db.commit()
+    return claimed == 1
+
+
+def renew_lease(document_id: int, owner: str) -> bool:
+    """Extend this worker's lease; False if the lease was lost"""
+    db = SessionLocal()
+    try:
+        renewed = db.query(Document).filter(
+            Document.id == document_id,
+            Document.status == DocumentStatus.PROCESSING,
+            Document.lease_owner == owner
+        ).update({
+            Document.lease_expires_at: _utcnow() + timedelta(seconds=settings.ANALYSIS_LEASE_SECONDS)
+        }, synchronize_session=False)
+        db.commit()
+        return renewed == 1
+    finally:
+        db.close()
+
+
+async def _heartbeat(document_id: int, owner: str) -> None:
+    """Keep the lease alive during long model calls"""
+    while True:
+        await asyncio.sleep(settings.ANALYSIS_HEARTBEAT_SECONDS)
+        try:
+            if not renew_lease(document_id, owner):
+                logger.warning("Processing lease lost", extra={"document_id": document_id})
+                return
+        except Exception:
+            logger.exception("Error renewing processing lease", extra={"document_id": document_id})
+
+
+def _finish(db: Session, document_id: int, owner: str, values: Dict) -> bool:
+    """Store the outcome and release the lease, only if this worker still holds it"""
+    values.update({Document.lease_owner: None, Document.lease_expires_at: None})
+    saved = db.query(Document).filter(
+        Document.id == document_id,
+        Document.status == DocumentStatus.PROCESSING,
+        Document.lease_owner == owner
+    ).update(values, synchronize_session=False)
+    db.commit()
+    if not saved:
+        logger.warning("Processing lease lost before the result was saved", extra={"document_id": document_id})
+    return saved == 1
+
+
+def already_analyzed(document: Document, message: str = "Document already analyzed") -> Dict:
+    return {
+        "success": True,
+        "message": message,
+        "document_id": document.id,
+        "extracted_data": json.loads(document.extracted_data) if document.extracted_data else None
+    }
+
+
+async def analyze_document(document_id: int) -> Dict:
+    """
+    Analyze a document, sharing the work with any concurrent request for it.
+    Returns the API response body; raises AnalysisError.
+    """
+    task = _in_flight.get(document_id)
+    if task is None:
+        task = asyncio.create_task(_run_analysis(document_id))
+        _in_flight[document_id] = task
+        task.add_done_callback(lambda finished: _forget(document_id, finished))
+    else:
+        ANALYSIS_DEDUPLICATED.labels(source="in_process").inc()
+        logger.info("Joining in-flight analysis", extra={"document_id": document_id})
+    # Shielded: a caller that disconnects does not cancel the others' extraction
+    return await asyncio.shield(task)
+
+
+def _forget(document_id: int, task: "asyncio.Task") -> None:
+    if _in_flight.get(document_id) is task:
+        del _in_flight[document_id]
+    if not task.cancelled():
+        task.exception()  # retrieved here so an unawaited failure is not reported as lost
+
+
+async def _run_analysis(document_id: int) -> Dict:
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if not document:
+            raise AnalysisError(404, "Document not found")
+
+        # Check if already processed
+        if document.status == DocumentStatus.COMPLETED:
+            return already_analyzed(document)
+
+        if not claim_document(db, document_id):
+            ANALYSIS_DEDUPLICATED.labels(source="other_worker").inc()
+            return await _wait_for_other_worker(db, document_id)
+
+        db.refresh(document)
+        return await _extract(db, document)
+    finally:
+        db.close()
+
+
+async def _wait_for_other_worker(db: Session, document_id: int) -> Dict:
+    """Another worker claimed the document: poll until its analysis finishes"""
+    logger.info("Waiting for analysis in another worker", extra={"document_id": document_id})
+    deadline = time.monotonic() + settings.ANALYSIS_WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(settings.ANALYSIS_POLL_INTERVAL)
+        db.expire_all()
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if not document:
+            raise AnalysisError(404, "Document not found")
+        if document.status == DocumentStatus.COMPLETED:
+            return already_analyzed(document, "Document analyzed by a concurrent request")
+        if document.status == DocumentStatus.FAILED:
+            raise AnalysisError(500, f"AI analysis failed: {document.error_message or 'Unknown error'}")
+        # Requeued by the other worker or the reaper, or its lease expired: take it over
+        if claim_document(db, document_id):
+            db.refresh(document)
+            return await _extract(db, document)
+    raise AnalysisError(409, "Document is still being analyzed, try again later")
+
+
+async def reextract_document(document_id: int) -> bool:
+    """
+    Extract a COMPLETED document again (its stored result is stale).
+    False if it is no longer COMPLETED (deleted, or being analyzed);
+    raises AnalysisError, with retry_after when it should be tried later.
+    """
+    db = SessionLocal()
+    try:
+        if not claim_for_reextraction(db, document_id):
+            return False
+        document = db.query(Document).filter(Document.id == document_id).first()
+        await _extract(db, document, reextract=True)
+        return True
+    finally:
+        db.close()
+
+
+async def _preflight(db: Session, document: Document) -> preflight.Preflight:
+    """Page count, text layer and digest from the upload preflight (inspected now if it has not run)"""
+    inspected = preflight.from_document(document)
+    if inspected is None:
+        with stage("preflight"):
+            inspected = await asyncio.to_thread(preflight.inspect_file, document.file_path, document.file_type)
+        preflight.store(db, document.id, inspected)
+    return inspected
+
+
+async def correct_fields(document_id: int, fields: Optional[List[str]] = None) -> Dict:
+    """
+    Ask the model again for some fields of an analyzed document and merge the
+    answers into its stored extraction. Without fields, the missing and
+    low-confidence ones are chosen (fields.fields_to_correct).
+    Returns the API response body; raises AnalysisError.
+    """
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if not document:
+            raise AnalysisError(404, "Document not found")
+        if document.status != DocumentStatus.COMPLETED or not document.extracted_data:
+            raise AnalysisError(409, "Document must be analyzed before its fields can be corrected")
+
+        data = json.loads(document.extracted_data)
+        requested = list(dict.fromkeys(fields)) if fields else fields_to_correct(data)
+        unknown = [path for path in requested if path not in FIELDS]
+        if unknown:
+            raise AnalysisError(400, f"Unsupported fields: {', '.join(unknown)} (supported: {', '.join(FIELDS)})")
+        if not requested:
+            return {
+                "success": True,
+                "message": "No missing or low-confidence fields",
+                "document_id": document_id,
+                "requested_fields": [],
+                "updated_fields": [],
+                "extracted_data": data,
+                "tokens_used": 0
+            }
+
+        if not claim_for_reextraction(db, document_id):
+            raise AnalysisError(409, "Document is being analyzed, try again later")
+        db.refresh(document)
+        data = json.loads(document.extracted_data)  # As of the claim (a re-extraction may have finished meanwhile)
+        owner = document.lease_owner
+        heartbeat = asyncio.create_task(_heartbeat(document_id, owner))
+        try:
+            inspected = await _preflight(db, document)
+            result = await extract_fields_from_document(
+                document.file_path,
+                document.file_type,
+                requested,
+                document_type=data.get("document_type"),
+                mode=choose_extraction_mode(),
+                preflight=inspected
+            )
+            record_model_calls(result.get("calls", []), "fields", document_id)
+        except Exception as e:
+            logger.exception("Field correction error", extra={"document_id": document_id})
+            result = {"success": False, "error": str(e)}
+        finally:
+            heartbeat.cancel()
+
+        if not result["success"]:
+            _finish(db, document_id, owner, {Document.status: DocumentStatus.COMPLETED})
+            error_message = result.get("error", "Unknown error")
+            if result.get("retry_after") is not None:
+                raise AnalysisError(503, f"AI service temporarily unavailable: {error_message}", result["retry_after"])
+            raise AnalysisError(500, f"Field correction failed: {error_message}")
+
+        # The lease kept the stored extraction unchanged since it was read
+        updated = merge_fields(data, result["values"])
+        with stage("db_commit"):
+            _finish(db, document_id, owner, {
+                Document.extracted_data: json.dumps(data),
+                Document.status: DocumentStatus.COMPLETED
+            })
+        logger.info("Fields corrected", extra={
+            "document_id": document_id,
+            "requested": len(requested),
+            "updated": len(updated)
+        })
+        return {
+            "success": True,
+            "message": f"{len(updated)} of {len(requested)} fields updated",
+            "document_id": document_id,
+            "requested_fields": requested,
+            "updated_fields": updated,
+            "extracted_data": data,
+            "tokens_used": result.get("tokens_used", 0)
+        }
+    finally:
+        db.close()
+
+
+async def _extract(db: Session, document: Document, reextract: bool = False) -> Dict:
+    """Run the extraction for a claimed document and store the outcome"""
+    document_id = document.id
+    owner = document.lease_owner
+    trace = start_trace()
+    started = time.perf_counter()
+    heartbeat = asyncio.create_task(_heartbeat(document_id, owner))
+
+    try:
+        inspected = await _preflight(db, document)
+
+        # Pick the extraction mode from today's/this month's token budgets and this document's size
+        file_type = document.file_type
+        mode = choose_extraction_mode(lambda mode: estimate_extraction_tokens(inspected, file_type, mode))
+
+        if reextract and mode != MODE_FULL:
+            # A cheaper mode would replace a full extraction with a worse one, and
+            # the remaining budget belongs to new documents: try again later
+            result = {
+                "success": False,
+                "error": "Token budget has no room for a full extraction",
+                "retry_after": settings.REEXTRACT_BUDGET_WAIT_SECONDS
+            }
+        else:
+            # Extract data using AI
+            result = await extract_salary_data_from_document(
+                document.file_path,
+                file_type,
+                mode=mode,
+                preflight=inspected
+            )
+            record_model_calls(result.get("calls", []), "reextraction" if reextract else "extraction", document_id)
+    except Exception as e:
+        logger.exception("Analysis error", extra={"document_id": document_id})
+        result = {"success": False, "error": str(e)}
+        error_prefix = "Analysis error"
+    else:
+        error_prefix = "AI analysis failed"
+    finally:
+        heartbeat.cancel()
+
+    if result["success"]:
+        # Store extracted data as JSON string
+        with stage("db_commit"):
+            _finish(db, document_id, owner, {
+                Document.extracted_data: json.dumps(result["data"]),
+                Document.extractor_version: result.get("extractor_version"),
+                Document.prompt_version: result.get("prompt_version"),
+                Document.status: DocumentStatus.COMPLETED,
+                Document.processed_at: datetime.now(),
+                Document.error_message: None,
+                Document.attempts: 0
+            })
+        record_analysis(document_id, trace, "completed", started)
+
+        return {
+            "success": True,
+            "message": "Document analyzed successfully",
+            "document_id": document_id,
+            "extracted_data": result["data"],
+            "tokens_used": result.get("tokens_used", 0),
+            "document_type": result.get("document_type"),
+            "extraction_mode": mode
+        }
+
+    error_message = result.get("error", "Unknown error")
+    if reextract:
+        # Keep the stored result; the re-extraction job retries or moves on
+        _finish(db, document_id, owner, {Document.status: DocumentStatus.COMPLETED})
+        if result.get("retry_after") is not None:
+            record_analysis(document_id, trace, "unavailable", started)
+            raise AnalysisError(503, f"Re-extraction postponed: {error_message}", result["retry_after"])
+        record_analysis(document_id, trace, "failed", started)
+        raise AnalysisError(500, f"Re-extraction failed: {error_message}")
+
+    if result.get("retry_after") is not None:
+        # The provider is down or rate limiting: not the document's fault, so it
+        # goes back to UPLOADED and the interrupted run does not count as an attempt
+        _finish(db, document_id, owner, {
+            Document.status: DocumentStatus.UPLOADED,
+            Document.error_message: error_message,
+            Document.attempts: Document.attempts - 1
+        })
+        record_analysis(document_id, trace, "unavailable", started)
+        raise AnalysisError(503, f"AI service temporarily unavailable: {error_message}", result["retry_after"])
+
+    # A run that ended is not an interrupted attempt: only crashes in a row count
+    _finish(db, document_id, owner, {
+        Document.status: DocumentStatus.FAILED,
+        Document.error_message: error_message,
+        Document.attempts: 0
+    })
+    record_analysis(document_id, trace, "failed", started)
+    raise AnalysisError(500, f"{error_prefix}: {error_message}")
+
+
+def reap_expired_leases(db: Session) -> Dict[str, int]:
+    """
+    Recover documents whose worker stopped renewing its lease: back to UPLOADED
+    (the next analyze request picks them up) or FAILED after too many attempts.
+    Interrupted re-extractions go back to COMPLETED with their old result.
+    """
+    now = _utcnow()
+    released = {Document.lease_owner: None, Document.lease_expires_at: None}
+    restored = db.query(Document).filter(
+        _lease_expired(now),
+        Document.extracted_data.isnot(None)
+    ).update({
+        **released,
+        Document.status: DocumentStatus.COMPLETED
+    }, synchronize_session=False)
+    requeued = db.query(Document).filter(
+        _lease_expired(now),
+        Document.attempts < settings.ANALYSIS_MAX_ATTEMPTS
+    ).update({
+        **released,
+        Document.status: DocumentStatus.UPLOADED,
+        Document.error_message: "Analysis interrupted (worker stopped); requeued"
+    }, synchronize_session=False)
+    failed = db.query(Document).filter(
+        _lease_expired(now),
+        Document.attempts >= settings.ANALYSIS_MAX_ATTEMPTS
+    ).update({
+        **released,
+        Document.status: DocumentStatus.FAILED,
+        Document.error_message: f"Analysis abandoned after {settings.ANALYSIS_MAX_ATTEMPTS} interrupted attempts"
+    }, synchronize_session=False)
+    db.commit()
+
+    if requeued or failed or restored:
+        LEASES_REAPED.labels(outcome="requeued").inc(requeued)
+        LEASES_REAPED.labels(outcome="failed").inc(failed)
+        LEASES_REAPED.labels(outcome="restored").inc(restored)
+        logger.warning("Recovered documents with expired leases",
+                       extra={"requeued": requeued, "failed": failed, "restored": restored})
+    return {"requeued": requeued, "failed": failed, "restored": restored}
+
+
+def _reap_once() -> None:
+    db = SessionLocal()
+    try:
+        reap_expired_leases(db)
+        idempotency_service.purge_expired(db)
+    finally:
+        db.close()
+
+
+async def run_reaper() -> None:
+    """Background loop started with the app (every worker runs one; the updates are conditional)"""
+    while True:
+        await asyncio.sleep(settings.REAPER_INTERVAL_SECONDS)
+        try:
+            await asyncio.to_thread(_reap_once)
+        except Exception:
+            logger.exception("Lease reaper error")
+
+
+def release_leases() -> int:
+    """
+    Hand back documents this worker still holds (on shutdown), without
+    counting the interrupted run as an attempt
+    """
+    db = SessionLocal()
+    try:
+        held = and_(Document.status == DocumentStatus.PROCESSING, Document.lease_owner == worker_id())
+        restored = db.query(Document).filter(held, Document.extracted_data.isnot(None)).update({
+            Document.status: DocumentStatus.COMPLETED,
+            Document.lease_owner: None,
+            Document.lease_expires_at: None
+        }, synchronize_session=False)
+        released = db.query(Document).filter(held).update({
+            Document.status: DocumentStatus.UPLOADED,
+            Document.lease_owner: None,
+            Document.lease_expires_at: None,
+            Document.attempts: Document.attempts - 1
+        }, synchronize_session=False)
+        db.commit()
+        return released + restored
+    except Exception:
+        db.rollback()
+        logger.exception("Error releasing processing leases")
+        return 0
+    finally:
+        db.close()
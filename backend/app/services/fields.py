@@ -0,0 +1,205 @@
+"""
+Field-level correction of a stored extraction
+When a few fields of a document come back missing ("Not found", empty) or
+fail review (see routing.review_extraction), only those fields are asked for
+again, instead of running the whole document through the full prompt:
+
+  - the prompt is a minimal JSON schema with just the requested fields;
+  - text PDFs send only the lines around the fields' keywords;
+  - scans and photos send one page: the top band of the first page for
+    header fields (names, CNIC, account number), the best page otherwise.
+
+The answers are merged into the stored extraction (document_service.correct_fields);
+fields the model still cannot read keep their old value.
+"""
+import json
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from app.services.routing import is_blank, parse_amount, review_extraction
+
+HEADER_BAND = 0.35  # Share of the first page (from the top) that holds the header fields
+CONTEXT_LINES = 1  # Lines kept around each keyword hit in a text excerpt
+MAX_EXCERPT_CHARS = 3000
+TOKENS_PER_FIELD = 40  # Completion allowance per requested field
+
+
+@dataclass(frozen=True)
+class FieldSpec:
+    description: str
+    keywords: "re.Pattern"  # Lines (or pages) that mention the field
+    amount: bool = False  # Stored as a number
+    header: bool = False  # Printed in the page header (top band of page 1)
+
+
+def _spec(description: str, keywords: str, amount: bool = False, header: bool = False) -> FieldSpec:
+    return FieldSpec(description, re.compile(keywords, re.IGNORECASE), amount, header)
+
+
+# Fields that can be read off a page (totals and estimates computed over a
+# whole statement cannot, they need a full extraction)
+FIELDS: Dict[str, FieldSpec] = {
+    "employee_name": _spec("employee or account holder name", r"\b(name|employee|account title|holder)\b", header=True),
+    "cnic": _spec("13-digit CNIC as #####-#######-#", r"\bc?nic\b|\b\d{5}-?\d{7}-?\d\b", header=True),
+    "employer_name": _spec("employer / company name", r"\b(company|employer|ltd|limited|pvt|organi[sz]ation)\b", header=True),
+    "designation": _spec("job title", r"\b(designation|title|position|grade)\b", header=True),
+    "period": _spec("salary month or statement period", r"\b(period|month|from|dated?)\b", header=True),
+    "salary_details.basic_salary": _spec("monthly basic salary", r"\bbasic\b", amount=True),
+    "salary_details.gross_salary": _spec("monthly gross salary", r"\b(gross|total (earnings|salary|pay))\b", amount=True),
+    "salary_details.annual_gross_salary": _spec("annual gross salary", r"\b(annual|yearly|per annum|gross)\b", amount=True),
+    "allowances.house_rent": _spec("monthly house rent allowance", r"\b(house rent|hra|rent allowance)\b", amount=True),
+    "allowances.medical": _spec("monthly medical allowance", r"\bmedical\b", amount=True),
+    "allowances.conveyance": _spec("monthly conveyance allowance", r"\b(conveyance|transport)\b", amount=True),
+    "allowances.utility": _spec("monthly utility allowance", r"\butilit(y|ies)\b", amount=True),
+    "allowances.other": _spec("other monthly allowances", r"\b(other|special|allowance)\b", amount=True),
+    "deductions.income_tax": _spec("income tax deducted this month", r"\b(income tax|tax|wht)\b", amount=True),
+    "deductions.provident_fund": _spec("provident fund deduction", r"\b(provident|pf)\b", amount=True),
+    "deductions.eobi": _spec("EOBI deduction", r"\beobi\b", amount=True),
+    "deductions.social_security": _spec("social security deduction", r"\b(social security|pessi|sessi)\b", amount=True),
+    "bank_details.account_number": _spec("bank account number or IBAN", r"\b(account|a/c|iban)\b", header=True),
+    "bank_details.bank_name": _spec("bank name", r"\bbank\b", header=True)
+}
+
+# Fields implicated by each review problem
+_REVIEW_FIELDS = {
+    "missing_gross_salary": ["salary_details.gross_salary"],
+    "annual_mismatch": ["salary_details.annual_gross_salary"],
+    "components_mismatch": ["salary_details.basic_salary", "salary_details.gross_salary"]
+}
+
+FIELD_PROMPT = """
+Read only these fields from this {document} and answer as JSON with exactly these keys. Amounts are plain monthly numbers (no Rs. or commas). Use null for a field that is not shown.
+
+{schema}
+
+Respond with JSON only.
+"""
+
+
+def get_path(data: Dict, path: str) -> Any:
+    value = data
+    for key in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _has_path(data: Dict, path: str) -> bool:
+    *parents, key = path.split(".")
+    section = data
+    for parent in parents:
+        section = section.get(parent) if isinstance(section, dict) else None
+    return isinstance(section, dict) and key in section
+
+
+def fields_to_correct(data: Dict) -> List[str]:
+    """Supported fields of an extraction that are missing, not numeric, or flagged by review"""
+    selected = []
+    for path, spec in FIELDS.items():
+        if not _has_path(data, path):
+            continue  # Not part of this document type's schema
+        value = get_path(data, path)
+        if is_blank(value) or (spec.amount and parse_amount(value) is None):
+            selected.append(path)
+    for problem in review_extraction(data):
+        selected.extend(_REVIEW_FIELDS.get(problem, []))
+    return list(dict.fromkeys(selected))
+
+
+def field_prompt(fields: List[str], document_type: Optional[str]) -> str:
+    """Minimal schema: the requested fields, nested as in the stored extraction"""
+    schema: Dict[str, Any] = {}
+    for path in fields:
+        *parents, key = path.split(".")
+        section = schema
+        for parent in parents:
+            section = section.setdefault(parent, {})
+        section[key] = FIELDS[path].description
+    return FIELD_PROMPT.strip().format(document=document_type or "document", schema=json.dumps(schema, indent=1))
+
+
+def text_excerpt(page_texts: List[str], fields: List[str]) -> str:
+    """Lines mentioning the requested fields (with a little context), in page order"""
+    patterns = [FIELDS[path].keywords for path in fields]
+    header_only = all(FIELDS[path].header for path in fields)
+    excerpt = []
+    for number, text in enumerate(page_texts[:1] if header_only else page_texts):
+        lines = [line for line in (text or "").splitlines() if line.strip()]
+        keep = set()
+        for index, line in enumerate(lines):
+            if any(pattern.search(line) for pattern in patterns):
+                keep.update(range(max(index - CONTEXT_LINES, 0), min(index + CONTEXT_LINES + 1, len(lines))))
+        if keep:
+            excerpt.append(f"[Page {number + 1}]")
+            excerpt.extend(lines[index] for index in sorted(keep))
+    if not excerpt:
+        # No keyword anywhere: the start of the document is the best guess
+        return (page_texts[0] if page_texts else "")[:MAX_EXCERPT_CHARS]
+    return "\n".join(excerpt)[:MAX_EXCERPT_CHARS]
+
+
+def max_tokens(fields: List[str]) -> int:
+    return 50 + TOKENS_PER_FIELD * len(fields)
+
+
+def read_answer(answer: Any, fields: List[str]) -> Dict[str, Any]:
+    """Requested fields the model could read: {path: value}, amounts as numbers"""
+    if not isinstance(answer, dict):
+        return {}
+    values = {}
+    for path in fields:
+        value = get_path(answer, path)
+        if value is None:
+            value = answer.get(path)  # Answered flat ("deductions.income_tax": ...)
+        if is_blank(value):
+            continue
+        if FIELDS[path].amount:
+            value = parse_amount(value)
+            if value is None:
+                continue
+        elif path == "cnic":
+            digits = re.sub(r"\D", "", str(value))
+            if len(digits) != 13:
+                continue
+            value = f"{digits[:5]}-{digits[5:12]}-{digits[12]}"
+        else:
+            value = " ".join(str(value).split())
+        values[path] = value
+    return values
+
+
+def review_fields(answer: Any, fields: List[str]) -> List[str]:
+    """Reasons to escalate a field answer: not JSON, or none of the fields read"""
+    if not isinstance(answer, dict):
+        return ["schema"]
+    if not read_answer(answer, fields):
+        return ["fields_not_found"]
+    return []
+
+
+def merge_fields(data: Dict, values: Dict[str, Any]) -> List[str]:
+    """
+    Write corrected values into an extraction; returns the fields that changed.
+    A corrected gross salary also sets the annual figure (gross x 12) unless
+    that was corrected too, so the extraction passes review afterwards.
+    """
+    values = dict(values)
+    gross = values.get("salary_details.gross_salary")
+    if gross is not None and "salary_details.annual_gross_salary" not in values:
+        values["salary_details.annual_gross_salary"] = round(gross * 12, 2)
+    changed = []
+    for path, value in values.items():
+        *parents, key = path.split(".")
+        section = data
+        for parent in parents:
+            if not isinstance(section.get(parent), dict):
+                section[parent] = {}
+            section = section[parent]
+        if section.get(key) != value:
+            section[key] = value
+            changed.append(path)
+    if changed:
+        data["corrected_fields"] = sorted(set(data.get("corrected_fields") or []) | set(changed))
+    return changed
@@ -0,0 +1,135 @@
+"""
+Idempotency keys for upload and analyze
+A client sends `Idempotency-Key: <uuid>` and reuses it when it retries. The
+first request claims the key; once it succeeds its response is stored and
+every retry gets that response back instead of repeating the work. Failed
+requests release the key so the retry runs again.
+"""
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.idempotency import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+MAX_KEY_LENGTH = 255
+# A key left in progress this long belongs to a request that died; the next retry takes it over
+STALE_CLAIM_SECONDS = 600
+
+
+def request_hash(*parts: Any) -> str:
+    """Fingerprint of what a key is used for (a key may not be reused for a different request)"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _expiry_cutoff() -> datetime:
+    """Oldest creation time still honoured (naive UTC, as stored)"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    return now - timedelta(hours=settings.IDEMPOTENCY_KEY_TTL_HOURS)
+
+
+def _is_expired(row: IdempotencyKey) -> bool:
+    created_at = row.created_at
+    if created_at is None:
+        return False
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+    if row.response_status is None:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return created_at < now - timedelta(seconds=STALE_CLAIM_SECONDS)
+    return created_at < _expiry_cutoff()
+
+
+def begin(db: Session, scope: str, key: str, fingerprint: str) -> Optional[Tuple[int, Any]]:
+    """
+    Claim `key` for this request.
+    Returns None when the caller should do the work, or (status code, body) of
+    the stored response when this is a retry of a completed request.
+    Raises 409 while the first request is still running and 422 when the key
+    was used for a different request.
+    """
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Idempotency-Key is too long")
+
+    for _ in range(2):
+        db.add(IdempotencyKey(scope=scope, key=key, request_hash=fingerprint))
+        try:
+            db.commit()
+            return None
+        except IntegrityError:
+            db.rollback()
+
+        existing = db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.key == key
+        ).first()
+        if existing is None:
+            continue  # released in the meantime
+        if _is_expired(existing):
+            db.delete(existing)
+            db.commit()
+            continue
+        if existing.request_hash != fingerprint:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request"
+            )
+        if existing.response_status is None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="A request with this Idempotency-Key is still in progress",
+                headers={"Retry-After": "2"}
+            )
+        logger.info("Replaying stored response", extra={"scope": scope, "idempotency_key": key})
+        return existing.response_status, json.loads(existing.response_body)
+
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Idempotency-Key is busy, retry shortly")
+
+
+def complete(db: Session, scope: str, key: str, status_code: int, body: Any) -> None:
+    """Store the response of a successful request under its key"""
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.scope == scope,
+        IdempotencyKey.key == key
+    ).update({
+        IdempotencyKey.response_status: status_code,
+        IdempotencyKey.response_body: json.dumps(body, default=str),
+        IdempotencyKey.completed_at: datetime.now(timezone.utc)
+    }, synchronize_session=False)
+    db.commit()
+
+
+def release(db: Session, scope: str, key: str) -> None:
+    """Forget a key whose request failed, so a retry runs again"""
+    try:
+        db.rollback()
+        db.query(IdempotencyKey).filter(
+            IdempotencyKey.scope == scope,
+            IdempotencyKey.key == key,
+            IdempotencyKey.response_status.is_(None)
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error releasing idempotency key", extra={"scope": scope, "idempotency_key": key})
+
+
+def purge_expired(db: Session) -> int:
+    """Delete keys older than IDEMPOTENCY_KEY_TTL_HOURS; returns the number removed"""
+    removed = db.query(IdempotencyKey)\
+        .filter(IdempotencyKey.created_at < _expiry_cutoff())\
+        .delete(synchronize_session=False)
+    db.commit()
+    return removed
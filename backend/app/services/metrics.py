@@ -0,0 +1,156 @@
+"""
+Prometheus metrics and per-stage latency tracing for the extraction pipeline
+
+Usage:
+    with stage("page_rendering"):
+        images = render_pages(...)
+
+Every stage is observed in the `taxease_extraction_stage_seconds` histogram.
+When a trace is active (start_trace() at the beginning of a request), stage
+timings are also collected so they can be logged for that request.
+
+Under gunicorn, set PROMETHEUS_MULTIPROC_DIR so /metrics aggregates all workers.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional, Tuple
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    generate_latest,
+    multiprocess
+)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+STAGE_SECONDS = Histogram(
+    "taxease_extraction_stage_seconds",
+    "Time spent in each stage of document upload and analysis",
+    ["stage"],
+    buckets=LATENCY_BUCKETS
+)
+
+ANALYSIS_SECONDS = Histogram(
+    "taxease_analysis_seconds",
+    "End-to-end document analysis time",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS
+)
+
+ANALYSIS_DEDUPLICATED = Counter(
+    "taxease_analysis_deduplicated_total",
+    "Analyze requests served by another request's extraction instead of a new model call",
+    ["source"]  # in_process, other_worker, idempotency_key
+)
+
+LEASES_REAPED = Counter(
+    "taxease_analysis_leases_reaped_total",
+    "Documents whose processing lease expired (worker died or hung)",
+    ["outcome"]  # requeued, failed, restored (interrupted re-extraction)
+)
+
+MODEL_TOKENS = Counter(
+    "taxease_model_tokens_total",
+    "Tokens used by model calls",
+    ["model", "kind"]
+)
+
+MODEL_RETRIES = Counter(
+    "taxease_model_retries_total",
+    "Model calls retried after a transient failure",
+    ["reason"]  # rate_limit, timeout, connection, server_error
+)
+
+MODEL_BREAKER_OPEN = Gauge(
+    "taxease_model_circuit_open",
+    "1 while the model circuit breaker is open (calls fail fast)",
+    multiprocess_mode="max"
+)
+
+MODEL_HEDGES = Counter(
+    "taxease_model_hedges_total",
+    "Slow model calls that reached the hedging delay",
+    ["outcome"]  # primary_won, hedge_won, both_failed, skipped (budget or pacing)
+)
+
+MODEL_ROUTES = Counter(
+    "taxease_model_routes_total",
+    "Model answers kept, by the routing tier that produced them",
+    ["purpose", "route"]  # route: direct, first_tier, escalated
+)
+
+MODEL_ESCALATIONS = Counter(
+    "taxease_model_escalations_total",
+    "Cheap-tier answers rejected by review and escalated to a stronger model",
+    ["purpose", "reason"]
+)
+
+DOCUMENTS_CLASSIFIED = Counter(
+    "taxease_documents_classified_total",
+    "Extractions by the document type the local classifier chose (unknown = generic prompt)",
+    ["doc_type"]
+)
+
+REEXTRACTIONS = Counter(
+    "taxease_reextractions_total",
+    "Documents handled by re-extraction jobs",
+    ["outcome"]  # reextracted, failed, skipped, postponed
+)
+
+RENDER_CACHE = Counter(
+    "taxease_render_cache_total",
+    "Lookups and evictions of the rendered page cache",
+    ["result"]  # hit, miss, evicted
+)
+
+_current_trace: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar("extraction_trace", default=None)
+
+
+def start_trace() -> List[Tuple[str, float]]:
+    """Start collecting stage timings for the current request"""
+    trace = []
+    _current_trace.set(trace)
+    return trace
+
+
+def format_trace(trace: List[Tuple[str, float]]) -> str:
+    """One-line summary, e.g. 'pdf_inspection=12ms model_round_trip=5310ms'"""
+    return " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in trace)
+
+
+@contextmanager
+def stage(name: str):
+    """Time a pipeline stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.labels(stage=name).observe(elapsed)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.append((name, elapsed))
+
+
+def record_tokens(model: str, usage) -> None:
+    """Count prompt and completion tokens from an OpenAI usage object"""
+    if usage is None:
+        return
+    MODEL_TOKENS.labels(model=model, kind="prompt").inc(usage.prompt_tokens or 0)
+    MODEL_TOKENS.labels(model=model, kind="completion").inc(usage.completion_tokens or 0)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Prometheus exposition payload and content type"""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
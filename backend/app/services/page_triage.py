@@ -0,0 +1,163 @@
+"""
+Page triage for scanned PDFs
+Instead of always sending the first pages, every page (up to
+PAGE_TRIAGE_MAX_PAGES) is rendered once at PAGE_TRIAGE_DPI and scored:
+
+  - ink density: blank and near-blank pages (covers, separators) score 0;
+  - table structure: many text rows with empty vertical gutters between
+    columns (transaction tables, earnings/deductions grids) score higher
+    than paragraphs (terms and conditions, notices);
+  - keywords: when PAGE_TRIAGE_OCR is on and tesseract is installed, a quick
+    OCR pass rewards pages mentioning salary, payroll, gross, net pay...
+
+Only the best pages are rendered at full resolution, and they are sent in
+document order.
+"""
+import logging
+import re
+import shutil
+from dataclasses import dataclass, field
+from typing import List, Optional, TYPE_CHECKING
+
+from app.config import settings
+from app.logging_config import PAGE_LOGGER_NAME
+from app.services.classifier import text_lines
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+page_logger = logging.getLogger(PAGE_LOGGER_NAME)
+
+RENDER_DPI = 200  # Resolution of the pages sent to the vision model
+BLANK_INK_DENSITY = 0.003
+
+_SALARY_WORDS = re.compile(
+    r"\b(salary|sal cr|payroll|pay ?slip|gross|net pay|basic|allowance|income tax|employer)\b", re.IGNORECASE
+)
+
+
+@dataclass
+class PageScore:
+    page: int  # 1-based page number
+    score: float
+    ink: float
+    rows: int
+    gutters: float
+    keywords: int = 0
+
+
+@dataclass
+class Triage:
+    pages: List[int]  # selected 1-based page numbers, in document order
+    page_count: int
+    scores: List[PageScore] = field(default_factory=list)  # empty when every page fits
+
+
+def count_pages(pdf_path: str) -> int:
+    import PyPDF2
+    with open(pdf_path, "rb") as file:
+        return len(PyPDF2.PdfReader(file).pages)
+
+
+def _ink_mask(image: "Image.Image") -> "Image.Image":
+    """Binary L image: 255 where there is ink"""
+    from PIL import ImageOps
+    return ImageOps.invert(image.convert("L")).point(lambda value: 255 if value > 127 else 0)
+
+
+def _gutter_share(mask: "Image.Image") -> float:
+    """Share of the text area's width that is empty in every row (column gutters)"""
+    box = mask.getbbox()
+    if not box:
+        return 0.0
+    area = mask.crop(box)
+    empty = sum(1 for x in range(area.width) if not area.crop((x, 0, x + 1, area.height)).getbbox())
+    return empty / max(area.width, 1)
+
+
+def score_page(image: "Image.Image", page: int, ocr_text: Optional[str] = None) -> PageScore:
+    """Cheap relevance score of one low-resolution page"""
+    mask = _ink_mask(image)
+    histogram = mask.histogram()
+    ink = histogram[255] / max(mask.width * mask.height, 1)
+    if ink < BLANK_INK_DENSITY:
+        return PageScore(page, 0.0, round(ink, 4), 0, 0.0)
+
+    rows = len(text_lines(image))
+    gutters = _gutter_share(mask)
+    keywords = len(_SALARY_WORDS.findall(ocr_text)) if ocr_text else 0
+
+    # Rows count fully only when they form columns (paragraph text has no gutters),
+    # and gutters mean little on a page with a couple of lines (a cover title)
+    row_weight = 1.0 if gutters >= 0.1 else 0.4
+    score = (1.0 + min(rows, 40) / 10 * row_weight + 4 * gutters * min(rows, 10) / 10
+             + min(keywords, 10) * 0.5)
+    return PageScore(page, round(score, 3), round(ink, 4), rows, round(gutters, 3), keywords)
+
+
+def _ocr_available() -> bool:
+    if not settings.PAGE_TRIAGE_OCR or not shutil.which("tesseract"):
+        return False
+    try:
+        import pytesseract  # noqa: F401
+    except ImportError:
+        logger.warning("PAGE_TRIAGE_OCR is set but pytesseract is not installed")
+        return False
+    return True
+
+
+def _ocr(image: "Image.Image") -> Optional[str]:
+    import pytesseract
+    try:
+        return pytesseract.image_to_string(image, timeout=5)
+    except Exception:
+        logger.exception("OCR pass failed during page triage")
+        return None
+
+
+def select_pages(pdf_path: str, max_pages: int, page_count: Optional[int] = None) -> Triage:
+    """Choose the pages worth sending to the model (all of them when they fit)"""
+    from pdf2image import convert_from_path
+
+    if page_count is None:
+        page_count = count_pages(pdf_path)
+    if page_count <= max_pages:
+        return Triage(list(range(1, page_count + 1)), page_count)
+
+    scored_count = min(page_count, settings.PAGE_TRIAGE_MAX_PAGES)
+    ocr = _ocr_available()
+    previews = convert_from_path(
+        pdf_path,
+        dpi=settings.PAGE_TRIAGE_OCR_DPI if ocr else settings.PAGE_TRIAGE_DPI,
+        grayscale=True,
+        first_page=1,
+        last_page=scored_count
+    )
+    scores = [score_page(image, number, _ocr(image) if ocr else None)
+              for number, image in enumerate(previews, start=1)]
+    for page_score in scores:
+        page_logger.info("Page triage score", extra=vars(page_score))
+
+    best = sorted(scores, key=lambda s: (-s.score, s.page))[:max_pages]
+    selected = sorted(s.page for s in best if s.score > 0) or [1]
+    logger.info("Pages selected for analysis", extra={
+        "pages": ",".join(map(str, selected)),
+        "page_count": page_count,
+        "scored_pages": scored_count
+    })
+    return Triage(selected, page_count, scores)
+
+
+def render_pages(pdf_path: str, pages: List[int]) -> List["Image.Image"]:
+    """Render the given pages at full resolution (consecutive pages in one call)"""
+    from pdf2image import convert_from_path
+    images = []
+    start = 0
+    while start < len(pages):
+        end = start
+        while end + 1 < len(pages) and pages[end + 1] == pages[end] + 1:
+            end += 1
+        images.extend(convert_from_path(pdf_path, dpi=RENDER_DPI, first_page=pages[start], last_page=pages[end]))
+        start = end + 1
+    return images
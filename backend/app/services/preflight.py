@@ -0,0 +1,113 @@
+"""
+Upload preflight
+Right after an upload, a background task works out the basics of the file
+once and stores them on the document row: the content digest, the page count,
+whether a PDF has a text layer, and the size of the first page. Analysis, the
+cost estimate and the UI read them from the row instead of opening the file
+again (and the digest keys the render cache).
+
+Documents without preflight data (uploaded before it existed, or whose
+background task did not run) are inspected when they are analyzed.
+"""
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Document
+from app.services.page_triage import RENDER_DPI
+from app.services.render_cache import file_digest
+
+logger = logging.getLogger(__name__)
+
+MIN_TEXT_CHARS = 50  # Text on the first pages below this means a scanned PDF
+TEXT_CHECK_PAGES = 2
+EXIF_ORIENTATION = 0x0112
+
+
+@dataclass
+class Preflight:
+    digest: str
+    page_count: Optional[int]  # None when the PDF could not be read
+    has_text: bool
+    width: Optional[int]  # First page in pixels (PDFs at RENDER_DPI)
+    height: Optional[int]
+
+
+def _inspect_pdf(path: str, digest: str) -> Preflight:
+    import PyPDF2
+    try:
+        with open(path, "rb") as file:
+            reader = PyPDF2.PdfReader(file)
+            pages = reader.pages
+            text = "".join(pages[number].extract_text() or "" for number in range(min(TEXT_CHECK_PAGES, len(pages))))
+            width = height = None
+            if len(pages):
+                box = pages[0].mediabox
+                width = round(float(box.width) * RENDER_DPI / 72)
+                height = round(float(box.height) * RENDER_DPI / 72)
+                if (pages[0].get("/Rotate") or 0) % 180:
+                    width, height = height, width
+            return Preflight(digest, len(pages), len(text.strip()) > MIN_TEXT_CHARS, width, height)
+    except Exception as e:
+        logger.warning("Error reading PDF during preflight", extra={"error": str(e)})
+        return Preflight(digest, None, False, None, None)
+
+
+def _inspect_image(path: str, digest: str) -> Preflight:
+    from PIL import Image
+    try:
+        with Image.open(path) as image:  # Reads the header only
+            width, height = image.size
+            if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):  # Rotated by 90 degrees
+                width, height = height, width
+    except Exception as e:
+        logger.warning("Error reading image during preflight", extra={"error": str(e)})
+        width = height = None
+    return Preflight(digest, 1, False, width, height)
+
+
+def inspect_file(path: str, file_type: str) -> Preflight:
+    """Digest, page count, text layer and first page size of an uploaded file"""
+    digest = file_digest(path)
+    if file_type == "pdf":
+        return _inspect_pdf(path, digest)
+    return _inspect_image(path, digest)
+
+
+def from_document(document: Document) -> Optional[Preflight]:
+    """Stored preflight data of a document, None if it has not run"""
+    if document.preflight_at is None:
+        return None
+    return Preflight(document.file_digest, document.page_count, bool(document.has_text),
+                     document.image_width, document.image_height)
+
+
+def store(db: Session, document_id: int, preflight: Preflight) -> None:
+    db.query(Document).filter(Document.id == document_id).update({
+        Document.file_digest: preflight.digest,
+        Document.page_count: preflight.page_count,
+        Document.has_text: preflight.has_text,
+        Document.image_width: preflight.width,
+        Document.image_height: preflight.height,
+        Document.preflight_at: datetime.now()
+    }, synchronize_session=False)
+    db.commit()
+
+
+def run_preflight(document_id: int) -> None:
+    """Background task after an upload (errors are logged: analysis runs the preflight itself if needed)"""
+    db = SessionLocal()
+    try:
+        document = db.query(Document).filter(Document.id == document_id).first()
+        if document is None or document.preflight_at is not None:
+            return
+        store(db, document_id, inspect_file(document.file_path, document.file_type))
+    except Exception:
+        db.rollback()
+        logger.exception("Preflight failed", extra={"document_id": document_id})
+    finally:
+        db.close()
@@ -0,0 +1,212 @@
+"""
+Image preprocessing before vision calls
+Pages and photos are cropped to their content, deskewed, and downscaled to
+the smallest size that keeps text legible (text lines of at least
+PREPROCESS_MIN_LINE_PX pixels). The size is also snapped to the provider's
+tiling rules, so no pixels are paid for that do not buy a smaller token
+count. Images that stay legible within 512x512 go out at `detail: "low"`.
+
+Tiling rules (OpenAI vision): high detail fits the image in 2048x2048,
+scales the short side down to 768, and bills 85 + 170 tokens per 512px
+tile; low detail is a flat 85 tokens for a 512x512 view.
+
+PREPROCESS_VERSION changes whenever the output for the same input changes
+(cached renders are keyed on it).
+"""
+import base64
+import io
+import math
+import statistics
+from dataclasses import dataclass
+from typing import List, Optional, TYPE_CHECKING
+
+from app.config import settings
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+PREPROCESS_VERSION = 1
+
+TILE_SIDE = 512
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+LOW_DETAIL_SIDE = 512
+BASE_TOKENS = 85
+TILE_TOKENS = 170
+
+SKEW_RANGE_DEGREES = 5.0
+SKEW_STEP_DEGREES = 0.5
+MARGIN_PADDING = 0.02  # share of the content size kept around it
+
+
+@dataclass
+class PreparedImage:
+    data: str  # base64 JPEG
+    detail: str  # low or high
+    width: int
+    height: int
+    tokens: int  # prompt tokens the provider will bill for it
+    skew: float  # degrees corrected
+    line_height: Optional[float]  # median text line height in the sent image (px)
+
+    @property
+    def data_url(self) -> str:
+        return f"data:image/jpeg;base64,{self.data}"
+
+    def to_image(self) -> "Image.Image":
+        """Decode the prepared JPEG (e.g. to classify a page served from the render cache)"""
+        from PIL import Image
+        return Image.open(io.BytesIO(base64.b64decode(self.data)))
+
+
+def provider_size(width: int, height: int) -> tuple:
+    """Size the provider actually looks at in high detail"""
+    scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    return width * scale, height * scale
+
+
+def vision_tokens(width: int, height: int, detail: str) -> int:
+    """Prompt tokens billed for an image of this size"""
+    if detail == "low":
+        return BASE_TOKENS
+    fitted_width, fitted_height = provider_size(width, height)
+    tiles = math.ceil(fitted_width / TILE_SIDE) * math.ceil(fitted_height / TILE_SIDE)
+    return BASE_TOKENS + TILE_TOKENS * tiles
+
+
+def _ink_mask(gray: "Image.Image") -> "Image.Image":
+    """255 where there is ink (dark on light), 0 elsewhere"""
+    from PIL import ImageOps
+    return ImageOps.invert(gray).point(lambda value: 255 if value > 100 else 0)
+
+
+def crop_margins(gray: "Image.Image") -> "Image.Image":
+    """Crop to the content, ignoring scan speckle, with a little padding"""
+    from PIL import Image
+    # Averaging 4x4 blocks before thresholding drops isolated specks
+    small = _ink_mask(gray).resize((max(gray.width // 4, 1), max(gray.height // 4, 1)), Image.BOX)
+    box = small.point(lambda value: 255 if value > 40 else 0).getbbox()
+    if not box:
+        return gray
+    left, top, right, bottom = (coordinate * 4 for coordinate in box)
+    pad_x = int((right - left) * MARGIN_PADDING)
+    pad_y = int((bottom - top) * MARGIN_PADDING)
+    return gray.crop((
+        max(left - pad_x, 0), max(top - pad_y, 0),
+        min(right + pad_x, gray.width), min(bottom + pad_y, gray.height)
+    ))
+
+
+def _row_profile(mask: "Image.Image") -> List[float]:
+    """Mean ink per row"""
+    from PIL import Image
+    return list(mask.resize((1, mask.height), Image.BOX).getdata())
+
+
+def estimate_skew(gray: "Image.Image") -> float:
+    """
+    Rotation (degrees) that makes text lines horizontal: the angle whose row
+    profile is most peaked (lines and gaps sharply separated)
+    """
+    small = gray.copy()
+    small.thumbnail((600, 600))
+    mask = _ink_mask(small)
+
+    def sharpness(angle: float) -> float:
+        return statistics.pvariance(_row_profile(mask.rotate(angle, fillcolor=0)))
+
+    steps = int(SKEW_RANGE_DEGREES / SKEW_STEP_DEGREES)
+    best = max((i * SKEW_STEP_DEGREES for i in range(-steps, steps + 1)), key=sharpness)
+    # Refine between the neighbouring steps
+    fine = SKEW_STEP_DEGREES / 2
+    return max((best - fine, best, best + fine), key=sharpness)
+
+
+def median_line_height(gray: "Image.Image") -> Optional[float]:
+    """Median height (px) of text lines, None if no lines are found"""
+    heights, run = [], 0
+    for value in _row_profile(_ink_mask(gray)) + [0]:
+        if value > 2:
+            run += 1
+        elif run:
+            if run >= 2:
+                heights.append(run)
+            run = 0
+    return statistics.median(heights) if len(heights) >= 3 else None
+
+
+def _target_scale(width: int, height: int, line_height: Optional[float]) -> float:
+    """
+    Largest scale that costs no more tokens than the smallest legible scale.
+    Scales are relative to the original size and never upscale.
+    """
+    fitted_width, _ = provider_size(width, height)
+    provider_scale = fitted_width / width
+    if not line_height:
+        return provider_scale
+    legible = min(provider_scale, settings.PREPROCESS_MIN_LINE_PX / line_height)
+    cost = vision_tokens(width * legible, height * legible, "high")
+    # Tile boundaries are the largest scales of each tile count
+    candidates = [legible] + [
+        TILE_SIDE * k / side for side in (width, height) for k in range(1, 9)
+        if legible < TILE_SIDE * k / side <= provider_scale
+    ]
+    return max(s for s in candidates if vision_tokens(width * s, height * s, "high") <= cost)
+
+
+def _encode(image: "Image.Image") -> str:
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG", quality=settings.PREPROCESS_JPEG_QUALITY, optimize=True)
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
+def prepare_image(image: "Image.Image", detail: str = "auto") -> PreparedImage:
+    """
+    Crop, deskew and downscale a page for the vision model.
+    detail: "auto" picks low when the text stays legible in 512x512, "low"
+    and "high" force the detail level.
+    """
+    from PIL import Image, ImageOps
+
+    gray = ImageOps.exif_transpose(image).convert("L")
+    # The provider never looks at more than 2048px, so neither do we
+    gray.thumbnail((HIGH_DETAIL_MAX_SIDE, HIGH_DETAIL_MAX_SIDE), Image.LANCZOS, reducing_gap=2.0)
+    gray = crop_margins(gray)
+    skew = estimate_skew(gray)
+    if abs(skew) >= 0.25:
+        gray = crop_margins(gray.rotate(skew, resample=Image.BICUBIC, expand=True, fillcolor=255))
+
+    line_height = median_line_height(gray)
+    scale = _target_scale(gray.width, gray.height, line_height)
+    width, height = max(round(gray.width * scale), 1), max(round(gray.height * scale), 1)
+
+    low_fits = max(width, height) <= LOW_DETAIL_SIDE
+    if detail == "low" or (detail == "auto" and low_fits):
+        detail = "low"
+        fit = min(1.0, LOW_DETAIL_SIDE / max(width, height))
+        width, height = max(round(width * fit), 1), max(round(height * fit), 1)
+    else:
+        detail = "high"
+
+    original_width = gray.width
+    if (width, height) != gray.size:
+        gray = gray.resize((width, height), Image.LANCZOS)
+    return PreparedImage(
+        data=_encode(gray),
+        detail=detail,
+        width=width,
+        height=height,
+        tokens=vision_tokens(width, height, detail),
+        skew=round(skew, 2),
+        line_height=round(line_height * width / max(original_width, 1), 1) if line_height else None
+    )
+
+
+def prepare_image_file(image_path: str, detail: str = "auto") -> PreparedImage:
+    from PIL import Image
+    with Image.open(image_path) as image:
+        # JPEGs decode straight to grayscale at the smallest scale still above 2048px
+        image.draft("L", (HIGH_DETAIL_MAX_SIDE, HIGH_DETAIL_MAX_SIDE))
+        return prepare_image(image, detail)
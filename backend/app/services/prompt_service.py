@@ -0,0 +1,284 @@
+"""
+Extraction prompts
+Each document type (see classifier.py) has a short prompt and a small JSON
+schema of its own; documents the classifier cannot place get the generic
+SALARY_EXTRACTION_PROMPT. Prompts are versioned in the prompt_templates
+table: the newest active version of a type wins, and the built-in defaults
+below (version 0) apply until an admin adds one.
+
+Templates are cached for PROMPT_CACHE_TTL seconds and invalidated by admin writes.
+"""
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.prompt import PromptTemplate
+from app.services.classifier import SALARY_SLIP, BANK_STATEMENT, EMPLOYMENT_LETTER, UNKNOWN
+
+logger = logging.getLogger(__name__)
+
+# Page groups of a long statement (map step of the chunked extraction, see statements.py)
+STATEMENT_CHUNK = "bank_statement_chunk"
+
+PROMPT_DOC_TYPES = (SALARY_SLIP, BANK_STATEMENT, EMPLOYMENT_LETTER, UNKNOWN, STATEMENT_CHUNK)
+
+SYSTEM_PROMPT = "You are a tax assistant specializing in Pakistani tax returns. Extract financial data accurately."
+
+# Generic prompt for documents the classifier could not place
+SALARY_EXTRACTION_PROMPT = """
+You are a tax assistant helping Pakistani salaried employees file their taxes with FBR.
+
+Analyze this document (salary slip, bank statement, or employment letter) and extract the following information in JSON format.
+
+**IMPORTANT FOR BANK STATEMENTS:**
+If this is a bank statement, look for:
+- SALARY CREDITS: Look for regular monthly credits with descriptions like "SALARY", "SAL CR", "PAYROLL", "MONTHLY PAY", or credits from employer name
+- RENT DEBITS: Regular debits for rent payments (look for "RENT", "LANDLORD", "HOUSE RENT")
+- UTILITY PAYMENTS: Payments to LESCO, SNGPL, PTCL, K-Electric, etc.
+- The LARGEST regular credit transaction is likely the monthly salary
+- Pattern: If same amount credited every month = salary
+- Calculate annual salary by: monthly_salary × 12
+
+Extract the following in JSON format:
+
+{
+  "employee_name": "Account holder name from bank statement OR employee name from salary slip",
+  "cnic": "13-digit CNIC if available",
+  "employer_name": "Company name OR employer name appearing in salary credits",
+  "designation": "Job title if mentioned",
+  
+  "salary_details": {
+    "basic_salary": "Extract from salary slip OR if bank statement: estimate as 50-60% of gross salary",
+    "gross_salary": "Total monthly salary from slip OR largest regular monthly credit in bank statement",
+    "annual_gross_salary": "monthly gross salary × 12"
+  },
+  
+  "allowances": {
+    "house_rent": "From salary slip OR if bank statement: estimate as 40-45% of basic salary",
+    "medical": "From salary slip OR estimate as 10% of basic if bank statement",
+    "conveyance": "From salary slip OR standard Rs. 8000/month if bank statement",
+    "utility": "From salary slip OR 0",
+    "other": "Any other allowances"
+  },
+  
+  "deductions": {
+    "income_tax": "Tax deducted shown in salary slip OR look for 'TAX' debits in bank statement",
+    "provident_fund": "PF deduction OR look for 'PROVIDENT' in bank statement",
+    "eobi": "EOBI deduction if shown",
+    "social_security": "Social security if shown"
+  },
+  
+  "bank_details": {
+    "account_number": "Bank account number",
+    "bank_name": "Bank name (UBL, HBL, MCB, etc.)",
+    "monthly_salary_credit": "Amount and date of monthly salary credit if bank statement",
+    "total_credits": "Sum of all credits in the period",
+    "total_debits": "Sum of all debits in the period"
+  },
+  
+  "other_expenses": {
+    "rent_paid": "Monthly rent amount - look for regular debits to landlord/rent in bank statement",
+    "utilities_paid": "Utility bills - sum of LESCO, SNGPL, PTCL, K-Electric payments",
+    "education": "Education expenses if visible",
+    "medical_expenses": "Medical expenses if visible"
+  },
+  
+  "period": "Statement period OR salary month",
+  "document_type": "salary slip OR bank statement OR employment letter",
+  "confidence": "High/Medium/Low based on data clarity"
+}
+
+**EXTRACTION STRATEGY:**
+
+For BANK STATEMENTS:
+1. Identify SALARY CREDITS:
+   - Look for credits with "SALARY", "SAL", "PAYROLL" in description
+   - Or look for largest regular monthly credit (likely salary)
+   - Check if employer name appears in credit description
+   - Example: "Credit: Rs. 85,000 - SALARY FROM ABC COMPANY"
+
+2. Calculate SALARY BREAKDOWN:
+   - Gross Salary = Monthly salary credit amount
+   - Basic Salary ≈ 50-60% of gross (Pakistani standard)
+   - House Rent Allowance ≈ 40-45% of basic
+   - Medical Allowance ≈ 10% of basic
+   - Conveyance ≈ Rs. 8000/month (standard)
+
+3. Find EXPENSES:
+   - Rent: Look for regular debits with "RENT", "LANDLORD"
+   - Utilities: LESCO, SNGPL, PTCL, K-Electric, Water Board
+   - Tax: Look for "TAX" debits
+
+4. IMPORTANT: 
+   - Use actual numbers found in transactions
+   - If you can't find salary slip data, USE TRANSACTION PATTERNS
+   - Don't just say "Not found" - analyze and estimate from transactions!
+
+For SALARY SLIPS:
+- Extract exact amounts shown
+- All fields should have data
+- Don't estimate if actual data exists
+
+**Response Rules:**
+1. Always extract available data - don't use "Not found" if data exists in transactions
+2. For bank statements: ANALYZE TRANSACTION PATTERNS to find salary
+3. All amounts must be NUMBERS ONLY (no Rs., commas, or text)
+4. If you see a regular monthly credit of Rs. 85,000, that's the gross salary
+5. Calculate basic, allowances from gross using Pakistani standards
+6. Be intelligent about transaction patterns
+
+Respond with ONLY valid JSON, no additional text.
+"""
+
+
+SALARY_SLIP_PROMPT = """
+Extract this Pakistani salary slip as JSON. Amounts are plain monthly numbers (no Rs. or commas); use 0 for anything not on the slip.
+
+{
+  "employee_name": "", "cnic": "", "employer_name": "", "designation": "", "period": "",
+  "salary_details": {"basic_salary": 0, "gross_salary": 0, "annual_gross_salary": 0},
+  "allowances": {"house_rent": 0, "medical": 0, "conveyance": 0, "utility": 0, "other": 0},
+  "deductions": {"income_tax": 0, "provident_fund": 0, "eobi": 0, "social_security": 0},
+  "document_type": "salary slip",
+  "confidence": "High/Medium/Low"
+}
+
+annual_gross_salary = gross_salary x 12. Respond with JSON only.
+"""
+
+BANK_STATEMENT_PROMPT = """
+Extract this Pakistani bank statement as JSON for a salaried person's tax return. Amounts are plain numbers (no Rs. or commas).
+- gross_salary: the regular monthly salary credit ("SALARY", "SAL CR", "PAYROLL", or the largest credit repeated every month); annual_gross_salary = gross_salary x 12
+- basic_salary: 55% of gross; allowances from basic: house_rent 45%, medical 10%, utility 10%; conveyance 8000
+- rent_paid: the regular monthly rent/landlord debit; utilities_paid: LESCO, SNGPL, PTCL, K-Electric etc. in one month; income_tax: "TAX" debits
+
+{
+  "employee_name": "account holder", "employer_name": "", "period": "",
+  "salary_details": {"basic_salary": 0, "gross_salary": 0, "annual_gross_salary": 0},
+  "allowances": {"house_rent": 0, "medical": 0, "conveyance": 0, "utility": 0, "other": 0},
+  "deductions": {"income_tax": 0, "provident_fund": 0, "eobi": 0, "social_security": 0},
+  "bank_details": {"account_number": "", "bank_name": "", "monthly_salary_credit": 0, "total_credits": 0, "total_debits": 0},
+  "other_expenses": {"rent_paid": 0, "utilities_paid": 0},
+  "document_type": "bank statement",
+  "confidence": "High/Medium/Low"
+}
+
+Respond with JSON only.
+"""
+
+EMPLOYMENT_LETTER_PROMPT = """
+Extract this Pakistani employment letter as JSON. Amounts are plain monthly numbers (no Rs. or commas); use 0 for anything the letter does not state (a stated annual package is divided by 12).
+
+{
+  "employee_name": "", "cnic": "", "employer_name": "", "designation": "", "period": "date of the letter",
+  "salary_details": {"basic_salary": 0, "gross_salary": 0, "annual_gross_salary": 0},
+  "allowances": {"house_rent": 0, "medical": 0, "conveyance": 0, "utility": 0, "other": 0},
+  "deductions": {"income_tax": 0, "provident_fund": 0, "eobi": 0, "social_security": 0},
+  "document_type": "employment letter",
+  "confidence": "High/Medium/Low"
+}
+
+annual_gross_salary = gross_salary x 12. Respond with JSON only.
+"""
+
+STATEMENT_CHUNK_PROMPT = """
+These are some pages of a Pakistani bank statement. List every transaction row on them as JSON, in page order. Amounts are plain numbers (no Rs. or commas); dates are YYYY-MM-DD; leave out balance brought/carried forward rows.
+
+{
+  "account_holder": "", "account_number": "", "bank_name": "", "period": "",
+  "transactions": [{"date": "", "description": "", "debit": 0, "credit": 0, "balance": 0}]
+}
+
+Use "" for header fields these pages do not show. Respond with JSON only.
+"""
+
+
+@dataclass(frozen=True)
+class Prompt:
+    doc_type: str
+    version: int  # 0 = built-in default
+    system_prompt: str
+    prompt: str
+    max_tokens: Optional[int] = None
+
+    @property
+    def label(self) -> str:
+        """e.g. 'salary_slip@v3' (recorded with each extraction)"""
+        return f"{self.doc_type}@v{self.version}"
+
+
+DEFAULT_PROMPTS: Dict[str, Prompt] = {
+    SALARY_SLIP: Prompt(SALARY_SLIP, 0, SYSTEM_PROMPT, SALARY_SLIP_PROMPT.strip(), 600),
+    BANK_STATEMENT: Prompt(BANK_STATEMENT, 0, SYSTEM_PROMPT, BANK_STATEMENT_PROMPT.strip(), 800),
+    EMPLOYMENT_LETTER: Prompt(EMPLOYMENT_LETTER, 0, SYSTEM_PROMPT, EMPLOYMENT_LETTER_PROMPT.strip(), 600),
+    UNKNOWN: Prompt(UNKNOWN, 0, SYSTEM_PROMPT, SALARY_EXTRACTION_PROMPT, 2000),
+    # About 40 rows of ~30 tokens per page, for STATEMENT_CHUNK_PAGES pages
+    STATEMENT_CHUNK: Prompt(STATEMENT_CHUNK, 0, SYSTEM_PROMPT, STATEMENT_CHUNK_PROMPT.strip(), 4000)
+}
+
+_lock = threading.Lock()
+_prompts: Optional[Dict[str, Prompt]] = None
+_loaded_at = 0.0
+
+
+def _to_prompt(row: PromptTemplate) -> Prompt:
+    return Prompt(row.doc_type, row.version, row.system_prompt, row.prompt, row.max_tokens)
+
+
+def load_prompts(db: Session) -> int:
+    """Cache the newest active template of every document type. Returns how many came from the database."""
+    global _prompts, _loaded_at
+    newest = db.query(PromptTemplate.doc_type, func.max(PromptTemplate.version).label("version"))\
+        .filter(PromptTemplate.is_active == True)\
+        .group_by(PromptTemplate.doc_type)\
+        .subquery()
+    rows = db.query(PromptTemplate).join(
+        newest,
+        (PromptTemplate.doc_type == newest.c.doc_type) & (PromptTemplate.version == newest.c.version)
+    ).all()
+    prompts = dict(DEFAULT_PROMPTS)
+    prompts.update({row.doc_type: _to_prompt(row) for row in rows})
+    with _lock:
+        _prompts = prompts
+        _loaded_at = time.monotonic()
+    return len(rows)
+
+
+def invalidate_prompts() -> None:
+    """Drop cached templates (called after admin changes)"""
+    global _prompts
+    with _lock:
+        _prompts = None
+
+
+def get_prompt(doc_type: str) -> Prompt:
+    """Template for a document type (falls back to the generic prompt for unknown types)"""
+    if _prompts is None or time.monotonic() - _loaded_at > settings.PROMPT_CACHE_TTL:
+        db = SessionLocal()
+        try:
+            load_prompts(db)
+        except Exception:
+            logger.exception("Error loading prompt templates, using built-in defaults")
+            return DEFAULT_PROMPTS.get(doc_type, DEFAULT_PROMPTS[UNKNOWN])
+        finally:
+            db.close()
+    prompts = _prompts or DEFAULT_PROMPTS
+    return prompts.get(doc_type) or prompts[UNKNOWN]
+
+
+def current_labels() -> List[str]:
+    """Labels of the templates in use for every document type (an extraction stamped otherwise is stale)"""
+    return sorted({get_prompt(doc_type).label for doc_type in PROMPT_DOC_TYPES})
+
+
+def next_version(db: Session, doc_type: str) -> int:
+    """Version number for a new template of this type"""
+    latest = db.query(func.max(PromptTemplate.version)).filter(PromptTemplate.doc_type == doc_type).scalar()
+    return (latest or 0) + 1
@@ -0,0 +1,331 @@
+"""
+Re-extraction of stale documents
+Every stored extraction is stamped with EXTRACTOR_VERSION (ai_service) and the
+label of the prompt that produced it (e.g. salary_slip@v3). A COMPLETED
+document is stale when its extractor version is older, or its prompt is no
+longer the one in use for its type (prompt_service.current_labels).
+Documents analyzed before the stamps existed are stale too.
+
+An admin starts a job (POST /api/admin?resource=reextraction). The job walks
+the stale documents in id order, in batches of REEXTRACT_BATCH_SIZE, with
+REEXTRACT_CONCURRENCY extractions at once and a pause between batches.
+Re-extraction only runs in full mode: when the token budget has no room for
+it, or the provider is unavailable, the job waits and tries again. A document
+keeps its old result until a new extraction succeeds
+(document_service.reextract_document).
+
+Progress and the cursor (last_document_id) are saved after every batch. The
+job is held under a lease renewed by the worker running it; when that worker
+stops, run_job_monitor in another worker (or in the same one after a restart)
+resumes it from the cursor. Documents that fail stay stale; a later job
+tries them again.
+"""
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models import Document, DocumentStatus, ReextractionJob
+from app.services.ai_service import EXTRACTOR_VERSION
+from app.services.document_service import AnalysisError, reextract_document, worker_id
+from app.services.metrics import REEXTRACTIONS
+from app.services.prompt_service import current_labels
+
+logger = logging.getLogger(__name__)
+
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_CANCELLED = "cancelled"
+
+_tasks: Set["asyncio.Task"] = set()  # Jobs running in this worker
+
+
+class JobConflict(Exception):
+    """A re-extraction job is already running"""
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def stale_documents():
+    """Filter for COMPLETED documents whose stored extraction is stale"""
+    return and_(
+        Document.status == DocumentStatus.COMPLETED,
+        or_(
+            Document.extractor_version.is_(None),
+            Document.extractor_version < EXTRACTOR_VERSION,
+            Document.prompt_version.is_(None),
+            Document.prompt_version.notin_(current_labels())
+        )
+    )
+
+
+def count_stale(db: Session) -> int:
+    return db.query(Document.id).filter(stale_documents()).count()
+
+
+def get_status(db: Session) -> Dict:
+    """Current versions, how many documents are stale, and the latest job"""
+    return {
+        "extractor_version": EXTRACTOR_VERSION,
+        "prompt_versions": current_labels(),
+        "stale_documents": count_stale(db),
+        "job": db.query(ReextractionJob).order_by(ReextractionJob.id.desc()).first()
+    }
+
+
+def _lease_values(owner: Optional[str]) -> Dict:
+    now = _utcnow()
+    return {
+        ReextractionJob.lease_owner: owner,
+        ReextractionJob.lease_expires_at: now + timedelta(seconds=settings.ANALYSIS_LEASE_SECONDS) if owner else None,
+        ReextractionJob.updated_at: now
+    }
+
+
+def start_job(db: Session) -> ReextractionJob:
+    """Create a job and run it in this worker; raises JobConflict if one is running"""
+    running = db.query(ReextractionJob).filter(ReextractionJob.status == JOB_RUNNING).first()
+    if running:
+        raise JobConflict(f"Re-extraction job {running.id} is already running")
+
+    owner = worker_id()
+    now = _utcnow()
+    job = ReextractionJob(
+        status=JOB_RUNNING,
+        extractor_version=EXTRACTOR_VERSION,
+        total=count_stale(db),
+        processed=0,
+        succeeded=0,
+        failed=0,
+        skipped=0,
+        last_document_id=0,
+        lease_owner=owner,
+        lease_expires_at=now + timedelta(seconds=settings.ANALYSIS_LEASE_SECONDS),
+        updated_at=now
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    logger.info("Re-extraction job started", extra={"job_id": job.id, "stale_documents": job.total})
+    _spawn(job.id, owner)
+    return job
+
+
+def cancel_job(db: Session, job_id: int) -> bool:
+    """Stop a running job (documents being re-extracted finish first). False if it is not running."""
+    cancelled = db.query(ReextractionJob).filter(
+        ReextractionJob.id == job_id,
+        ReextractionJob.status == JOB_RUNNING
+    ).update({
+        **_lease_values(None),
+        ReextractionJob.status: JOB_CANCELLED,
+        ReextractionJob.finished_at: _utcnow()
+    }, synchronize_session=False)
+    db.commit()
+    return cancelled == 1
+
+
+def _spawn(job_id: int, owner: str) -> None:
+    task = asyncio.create_task(run_job(job_id, owner))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+def _update(job_id: int, owner: str, values: Dict) -> bool:
+    """Save progress and renew the lease, only while this worker runs the job (False once cancelled or lost)"""
+    db = SessionLocal()
+    try:
+        updated = db.query(ReextractionJob).filter(
+            ReextractionJob.id == job_id,
+            ReextractionJob.status == JOB_RUNNING,
+            ReextractionJob.lease_owner == owner
+        ).update({**values, **_lease_values(owner)}, synchronize_session=False)
+        db.commit()
+        return updated == 1
+    finally:
+        db.close()
+
+
+async def _heartbeat(job_id: int, owner: str) -> None:
+    """Keep the job lease alive; returns when the job was cancelled or taken over"""
+    while True:
+        await asyncio.sleep(settings.ANALYSIS_HEARTBEAT_SECONDS)
+        try:
+            if not await asyncio.to_thread(_update, job_id, owner, {}):
+                return
+        except Exception:
+            logger.exception("Error renewing re-extraction job lease", extra={"job_id": job_id})
+
+
+def _next_batch(job_id: int) -> List[int]:
+    """Ids of the next stale documents after the job's cursor"""
+    db = SessionLocal()
+    try:
+        cursor = db.query(ReextractionJob.last_document_id).filter(ReextractionJob.id == job_id).scalar() or 0
+        rows = db.query(Document.id)\
+            .filter(stale_documents(), Document.id > cursor)\
+            .order_by(Document.id)\
+            .limit(settings.REEXTRACT_BATCH_SIZE)\
+            .all()
+        return [row.id for row in rows]
+    finally:
+        db.close()
+
+
+async def _reextract(document_id: int, slots: asyncio.Semaphore) -> Tuple[str, Optional[AnalysisError]]:
+    async with slots:
+        try:
+            done = await reextract_document(document_id)
+        except AnalysisError as e:
+            if e.retry_after is not None:
+                return "postponed", e
+            logger.warning("Re-extraction failed", extra={"document_id": document_id, "error": e.detail})
+            return "failed", e
+        except Exception:
+            logger.exception("Re-extraction error", extra={"document_id": document_id})
+            return "failed", None
+    return ("reextracted" if done else "skipped"), None
+
+
+async def _run_batch(job_id: int, owner: str, batch: List[int], heartbeat: "asyncio.Task") -> Optional[Counter]:
+    """Re-extract a batch, retrying postponed documents. None if the job stopped meanwhile."""
+    slots = asyncio.Semaphore(max(settings.REEXTRACT_CONCURRENCY, 1))
+    counts = Counter()
+    pending = batch
+    while pending:
+        outcomes = await asyncio.gather(*(_reextract(document_id, slots) for document_id in pending))
+        postponed = []
+        for document_id, (outcome, error) in zip(pending, outcomes):
+            REEXTRACTIONS.labels(outcome=outcome).inc()
+            if outcome == "postponed":
+                postponed.append((document_id, error))
+            else:
+                counts[outcome] += 1
+        if heartbeat.done():
+            return None
+        if postponed:
+            # Budget exhausted or provider down: wait, then retry the same documents
+            wait = min(max(error.retry_after for _, error in postponed), settings.REEXTRACT_BUDGET_WAIT_SECONDS)
+            message = f"Waiting {wait:.0f}s to retry {len(postponed)} documents. {postponed[0][1].detail}"
+            logger.info("Re-extraction waiting", extra={"job_id": job_id, "postponed": len(postponed), "wait": wait})
+            if not await asyncio.to_thread(_update, job_id, owner, {ReextractionJob.message: message}):
+                return None
+            await asyncio.sleep(wait)
+            if heartbeat.done():
+                return None
+        pending = [document_id for document_id, _ in postponed]
+    return counts
+
+
+async def run_job(job_id: int, owner: str) -> None:
+    """Work through the stale documents until none are left, or the job is cancelled or taken over"""
+    heartbeat = asyncio.create_task(_heartbeat(job_id, owner))
+    try:
+        while not heartbeat.done():
+            batch = await asyncio.to_thread(_next_batch, job_id)
+            if not batch:
+                _finish_job(job_id, owner)
+                return
+
+            counts = await _run_batch(job_id, owner, batch, heartbeat)
+            if counts is None:
+                logger.info("Re-extraction job stopped", extra={"job_id": job_id})
+                return
+            saved = await asyncio.to_thread(_update, job_id, owner, {
+                ReextractionJob.processed: ReextractionJob.processed + sum(counts.values()),
+                ReextractionJob.succeeded: ReextractionJob.succeeded + counts["reextracted"],
+                ReextractionJob.failed: ReextractionJob.failed + counts["failed"],
+                ReextractionJob.skipped: ReextractionJob.skipped + counts["skipped"],
+                ReextractionJob.last_document_id: batch[-1],
+                ReextractionJob.message: None
+            })
+            if not saved:
+                logger.info("Re-extraction job stopped", extra={"job_id": job_id})
+                return
+            logger.info("Re-extraction batch done", extra={"job_id": job_id, "last_document_id": batch[-1], **counts})
+            await asyncio.sleep(settings.REEXTRACT_BATCH_PAUSE_SECONDS)
+        logger.info("Re-extraction job stopped", extra={"job_id": job_id})
+    except Exception:
+        # The lease expires and the job is resumed from its last saved batch
+        logger.exception("Re-extraction job error", extra={"job_id": job_id})
+    finally:
+        heartbeat.cancel()
+
+
+def _finish_job(job_id: int, owner: str) -> None:
+    db = SessionLocal()
+    try:
+        db.query(ReextractionJob).filter(
+            ReextractionJob.id == job_id,
+            ReextractionJob.status == JOB_RUNNING,
+            ReextractionJob.lease_owner == owner
+        ).update({
+            **_lease_values(None),
+            ReextractionJob.status: JOB_COMPLETED,
+            ReextractionJob.finished_at: _utcnow()
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    logger.info("Re-extraction job completed", extra={"job_id": job_id})
+
+
+def claim_interrupted_job() -> Optional[Tuple[int, str]]:
+    """Take over a running job whose lease expired; (job id, owner) or None"""
+    db = SessionLocal()
+    try:
+        now = _utcnow()
+        expired = and_(
+            ReextractionJob.status == JOB_RUNNING,
+            or_(ReextractionJob.lease_expires_at.is_(None), ReextractionJob.lease_expires_at < now)
+        )
+        job_id = db.query(ReextractionJob.id).filter(expired).order_by(ReextractionJob.id).limit(1).scalar()
+        if job_id is None:
+            return None
+        owner = worker_id()
+        claimed = db.query(ReextractionJob).filter(ReextractionJob.id == job_id, expired)\
+            .update(_lease_values(owner), synchronize_session=False)
+        db.commit()
+        return (job_id, owner) if claimed else None
+    finally:
+        db.close()
+
+
+async def run_job_monitor() -> None:
+    """Background loop started with the app: resumes jobs whose worker stopped"""
+    while True:
+        await asyncio.sleep(settings.REAPER_INTERVAL_SECONDS)
+        try:
+            claimed = await asyncio.to_thread(claim_interrupted_job)
+        except Exception:
+            logger.exception("Re-extraction job monitor error")
+            continue
+        if claimed:
+            logger.info("Resuming re-extraction job", extra={"job_id": claimed[0]})
+            _spawn(*claimed)
+
+
+def stop_jobs() -> None:
+    """On shutdown: stop this worker's jobs and release their leases so another worker resumes them"""
+    for task in list(_tasks):
+        task.cancel()
+    db = SessionLocal()
+    try:
+        db.query(ReextractionJob).filter(
+            ReextractionJob.status == JOB_RUNNING,
+            ReextractionJob.lease_owner == worker_id()
+        ).update({ReextractionJob.lease_expires_at: None}, synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error releasing re-extraction job leases")
+    finally:
+        db.close()
@@ -0,0 +1,166 @@
+"""
+Disk cache of rendered, preprocessed page images
+Rendering a scanned page at RENDER_DPI and preprocessing it (preprocess.py)
+are the most CPU-heavy steps of an analysis, and retries and re-analyses
+of the same file used to repeat them. Prepared pages are stored under
+RENDER_CACHE_DIR, keyed by:
+
+  (file digest, page, dpi, preprocessing variant)
+
+The variant covers PREPROCESS_VERSION, the requested detail and the
+preprocessing settings, so changing any of them never serves a stale image.
+Each entry is one file: a JSON metadata line followed by the JPEG bytes.
+Hits are read through mmap and base64-encoded straight from the mapping.
+
+The cache is bounded by RENDER_CACHE_MAX_MB. File mtimes record use
+(touched on every hit), and the least recently used entries are evicted.
+Entries are written atomically (temp file + rename), so several workers
+can share the folder.
+"""
+import base64
+import hashlib
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+from app.config import settings
+from app.services.metrics import RENDER_CACHE
+from app.services.preprocess import PREPROCESS_VERSION, PreparedImage
+
+logger = logging.getLogger(__name__)
+
+ENTRY_SUFFIX = ".page"
+EVICT_TO = 0.9  # Share of the size limit kept after an eviction pass
+
+_lock = threading.Lock()
+_size: Optional[int] = None  # Bytes on disk as far as this worker knows (None = not scanned yet)
+
+
+def file_digest(path: str) -> str:
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _variant(detail: str) -> str:
+    settings_key = f"{PREPROCESS_VERSION}:{detail}:{settings.PREPROCESS_MIN_LINE_PX}:{settings.PREPROCESS_JPEG_QUALITY}"
+    return hashlib.sha256(settings_key.encode()).hexdigest()[:12]
+
+
+def cache_key(digest: str, page: int, dpi: int, detail: str) -> str:
+    return f"{digest}-p{page}-{dpi}dpi-{_variant(detail)}"
+
+
+def _cache_dir() -> Path:
+    path = Path(settings.RENDER_CACHE_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def _entry_path(key: str) -> Path:
+    # Two-level fan-out keeps directories small
+    return _cache_dir() / key[:2] / f"{key}{ENTRY_SUFFIX}"
+
+
+def get(key: str) -> Optional[PreparedImage]:
+    """Cached prepared page, or None"""
+    if not settings.RENDER_CACHE_ENABLED:
+        return None
+    path = _entry_path(key)
+    try:
+        with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            header_end = mapped.find(b"\n")
+            meta = json.loads(mapped[:header_end])
+            with memoryview(mapped) as view:
+                data = base64.b64encode(view[header_end + 1:]).decode("ascii")
+        os.utime(path)  # Mark as recently used
+    except FileNotFoundError:
+        RENDER_CACHE.labels(result="miss").inc()
+        return None
+    except (OSError, ValueError):
+        logger.warning("Unreadable render cache entry, ignoring it", extra={"key": key})
+        RENDER_CACHE.labels(result="miss").inc()
+        return None
+    RENDER_CACHE.labels(result="hit").inc()
+    return PreparedImage(data=data, **meta)
+
+
+def put(key: str, image: PreparedImage) -> None:
+    """Store a prepared page (errors are logged, never raised: the cache is an optimization)"""
+    global _size
+    if not settings.RENDER_CACHE_ENABLED:
+        return
+    meta = {field: getattr(image, field) for field in ("detail", "width", "height", "tokens", "skew", "line_height")}
+    payload = json.dumps(meta).encode() + b"\n" + base64.b64decode(image.data)
+    path = _entry_path(key)
+    temp_path = None
+    try:
+        path.parent.mkdir(exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(descriptor, "wb") as file:
+            file.write(payload)
+        os.replace(temp_path, path)
+    except OSError:
+        logger.exception("Could not write render cache entry", extra={"key": key})
+        if temp_path is not None:
+            # Not an entry, so eviction would never see it
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+        return
+
+    with _lock:
+        if _size is None:
+            _size = _disk_usage()
+        else:
+            _size += len(payload)
+        over_limit = _size > settings.RENDER_CACHE_MAX_MB * 1024 * 1024
+    if over_limit:
+        evict()
+
+
+def _entries():
+    for path in _cache_dir().glob(f"*/*{ENTRY_SUFFIX}"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue  # Evicted by another worker
+        yield path, stat.st_size, stat.st_mtime
+
+
+def _disk_usage() -> int:
+    return sum(size for _, size, _ in _entries())
+
+
+def evict() -> int:
+    """Delete least recently used entries until the cache is under EVICT_TO of its limit. Returns how many."""
+    global _size
+    with _lock:
+        entries = sorted(_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = settings.RENDER_CACHE_MAX_MB * 1024 * 1024 * EVICT_TO
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        _size = total
+    if removed:
+        RENDER_CACHE.labels(result="evicted").inc(removed)
+        logger.info("Render cache evicted", extra={"entries": removed, "bytes": total})
+    return removed
+
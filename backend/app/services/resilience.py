@@ -0,0 +1,372 @@
+"""
+Resilient model calls
+Every chat completion goes through `call_model`, which adds:
+  - pacing: calls wait for room in the requests-per-minute and
+    tokens-per-minute budgets (MODEL_RPM_LIMIT / MODEL_TPM_LIMIT), and a 429
+    from the provider pauses all callers until its Retry-After has passed;
+  - retries: rate limits, timeouts, connection errors and 5xx responses are
+    retried with jittered exponential backoff (honouring Retry-After);
+  - a circuit breaker: after MODEL_BREAKER_FAILURES consecutive provider
+    failures, calls fail fast with ModelUnavailable for
+    MODEL_BREAKER_RESET_SECONDS, then a single probe call is let through;
+  - hedging (MODEL_HEDGING): when a call has not answered within the
+    MODEL_HEDGE_PERCENTILE of recent latency for its kind of request, an
+    identical second call is sent and the first answer wins. Hedges are
+    capped at MODEL_HEDGE_MAX_FRACTION of calls and only sent when the pacer
+    has room for them.
+
+Limits, latency history and breaker state are per worker process.
+"""
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from app.config import settings
+from app.services.metrics import stage, MODEL_RETRIES, MODEL_BREAKER_OPEN, MODEL_HEDGES
+
+logger = logging.getLogger(__name__)
+
+# Rough prompt cost of an image (OpenAI tiling: 85 base + 170 per 512px tile)
+LOW_DETAIL_IMAGE_TOKENS = 85
+HIGH_DETAIL_IMAGE_TOKENS = 85 + 170 * 4
+DEFAULT_COMPLETION_TOKENS = 1000
+
+
+class ModelUnavailable(Exception):
+    """The model provider cannot be used right now (breaker open or retries exhausted)"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def estimate_request_tokens(request: dict) -> int:
+    """Prompt tokens (about 4 characters per token, fixed cost per image) plus the completion allowance"""
+    tokens = 0
+    for message in request.get("messages", []):
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += len(part.get("text", "")) // 4
+            elif part.get("type") == "image_url":
+                detail = part.get("image_url", {}).get("detail", "high")
+                tokens += LOW_DETAIL_IMAGE_TOKENS if detail == "low" else HIGH_DETAIL_IMAGE_TOKENS
+    return tokens + (request.get("max_tokens") or DEFAULT_COMPLETION_TOKENS)
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Retry-After (or retry-after-ms) from a provider error response, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def classify_error(error: Exception) -> Optional[str]:
+    """Reason label for a retryable error, None if retrying cannot help"""
+    import openai
+    if isinstance(error, openai.RateLimitError):
+        return "rate_limit"
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    if isinstance(error, openai.InternalServerError):
+        return "server_error"
+    if isinstance(error, openai.APIStatusError) and error.status_code in (408, 409):
+        return "server_error"
+    return None
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float]) -> float:
+    """Full-jitter exponential backoff, never shorter than the provider's Retry-After"""
+    ceiling = min(settings.MODEL_BACKOFF_MAX, settings.MODEL_BACKOFF_BASE * 2 ** attempt)
+    delay = random.uniform(0, ceiling)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class RateScheduler:
+    """
+    Paces calls to a requests-per-minute and tokens-per-minute budget
+    (two token buckets refilled continuously). Waiters are served in order.
+    """
+
+    def __init__(self, rpm: float, tpm: float):
+        self.rpm = rpm
+        self.tpm = tpm
+        now = time.monotonic()
+        self._requests = (float(rpm), now)
+        self._tokens = (float(tpm), now)
+        self._paused_until = 0.0
+        self._lock = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        return self._lock
+
+    @staticmethod
+    def _refill(bucket, limit: float, now: float) -> float:
+        level, last = bucket
+        return min(limit, level + (now - last) * limit / 60.0)
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        wait = max(self._paused_until - now, 0.0)
+        if self.rpm > 0:
+            level = self._refill(self._requests, self.rpm, now)
+            wait = max(wait, (1 - level) * 60.0 / self.rpm)
+        if self.tpm > 0:
+            # A single call larger than the whole budget only waits for a full bucket
+            needed = min(tokens, self.tpm)
+            level = self._refill(self._tokens, self.tpm, now)
+            wait = max(wait, (needed - level) * 60.0 / self.tpm)
+        return wait
+
+    async def acquire(self, tokens: int) -> None:
+        """Wait until the call fits in both budgets, then take its share"""
+        if self.rpm <= 0 and self.tpm <= 0 and self._paused_until <= time.monotonic():
+            return
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                wait = self._wait_time(tokens, now)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self.rpm > 0:
+                self._requests = (self._refill(self._requests, self.rpm, now) - 1, now)
+            if self.tpm > 0:
+                self._tokens = (self._refill(self._tokens, self.tpm, now) - min(tokens, self.tpm), now)
+
+    def try_acquire(self, tokens: int) -> bool:
+        """Take a share only if one is available right now (never waits, never jumps the queue)"""
+        if self.rpm <= 0 and self.tpm <= 0:
+            return self._paused_until <= time.monotonic()
+        if self._get_lock().locked():
+            return False
+        now = time.monotonic()
+        if self._wait_time(tokens, now) > 0:
+            return False
+        if self.rpm > 0:
+            self._requests = (self._refill(self._requests, self.rpm, now) - 1, now)
+        if self.tpm > 0:
+            self._tokens = (self._refill(self._tokens, self.tpm, now) - min(tokens, self.tpm), now)
+        return True
+
+    def settle(self, estimated: int, actual: int) -> None:
+        """Correct the token bucket once the real usage is known"""
+        if self.tpm > 0 and actual:
+            now = time.monotonic()
+            level = self._refill(self._tokens, self.tpm, now)
+            self._tokens = (min(self.tpm, level + estimated - actual), now)
+
+    def pause(self, seconds: float) -> None:
+        """Hold every caller back (the provider said we are over its limit)"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures -> half-open probe after a cool-down"""
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def before_call(self) -> bool:
+        """
+        Raise ModelUnavailable while open; let one probe through once the cool-down is over.
+        True if this call is the probe (it must end in record_success, record_failure or release_probe).
+        """
+        if self.opened_at is None:
+            return False
+        remaining = self.opened_at + self.reset_seconds - time.monotonic()
+        if remaining > 0 or self._probing:
+            raise ModelUnavailable("Model provider unavailable (circuit open)", max(remaining, 1.0))
+        self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        if self.opened_at is not None:
+            logger.info("Model circuit closed")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        MODEL_BREAKER_OPEN.set(0)
+
+    def release_probe(self) -> None:
+        """The probe ended without telling us anything about the provider"""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self._probing or (self.opened_at is None and self.failures >= self.failure_threshold):
+            logger.warning("Model circuit opened", extra={"consecutive_failures": self.failures})
+            self.opened_at = time.monotonic()
+            MODEL_BREAKER_OPEN.set(1)
+        self._probing = False
+
+
+class HedgePolicy:
+    """
+    Decides when a slow call gets a hedge: after the configured percentile of
+    recent latencies for the same kind of call, within a budget of
+    max_fraction hedges per call.
+    """
+
+    def __init__(self, percentile: float, max_fraction: float, min_samples: int,
+                 min_delay: float, window: int = 200):
+        self.percentile = percentile
+        self.max_fraction = max_fraction
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.window = window
+        self._latencies: Dict[str, deque] = {}
+        self.calls = 0
+        self.hedges = 0
+
+    def record(self, kind: str, seconds: float) -> None:
+        self._latencies.setdefault(kind, deque(maxlen=self.window)).append(seconds)
+
+    def delay(self, kind: str) -> Optional[float]:
+        """Seconds to wait before hedging a call of this kind, None if it should not be hedged"""
+        self.calls += 1
+        samples = self._latencies.get(kind)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(ordered[index], self.min_delay)
+
+    def allow(self) -> bool:
+        """Spend one hedge from the budget, if any is left"""
+        if self.hedges + 1 > self.calls * self.max_fraction:
+            return False
+        self.hedges += 1
+        return True
+
+
+scheduler = RateScheduler(settings.MODEL_RPM_LIMIT, settings.MODEL_TPM_LIMIT)
+breaker = CircuitBreaker(settings.MODEL_BREAKER_FAILURES, settings.MODEL_BREAKER_RESET_SECONDS)
+hedging = HedgePolicy(
+    settings.MODEL_HEDGE_PERCENTILE,
+    settings.MODEL_HEDGE_MAX_FRACTION,
+    settings.MODEL_HEDGE_MIN_SAMPLES,
+    settings.MODEL_HEDGE_MIN_DELAY
+)
+
+
+async def _first_success(primary: asyncio.Task, hedge: asyncio.Task):
+    """Result of whichever call succeeds first; the primary's error if both fail"""
+    pending = {primary, hedge}
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not task.cancelled() and task.exception() is None:
+                MODEL_HEDGES.labels(outcome="hedge_won" if task is hedge else "primary_won").inc()
+                return task.result()
+    MODEL_HEDGES.labels(outcome="both_failed").inc()
+    hedge.exception()  # retrieved so asyncio does not log it as unhandled
+    return primary.result()
+
+
+async def _round_trip(make_call: Callable[[], Awaitable], estimated_tokens: int, kind: str):
+    """One attempt, hedged with an identical second call when it is slower than usual"""
+    delay = hedging.delay(kind) if settings.MODEL_HEDGING else None
+    started = time.perf_counter()
+    primary = asyncio.ensure_future(make_call())
+    hedge = None
+    try:
+        if delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+            if not done:
+                if hedging.allow() and scheduler.try_acquire(estimated_tokens):
+                    logger.info("Hedging slow model call", extra={"kind": kind, "after_s": round(delay, 2)})
+                    hedge = asyncio.ensure_future(make_call())
+                else:
+                    MODEL_HEDGES.labels(outcome="skipped").inc()
+        response = await (_first_success(primary, hedge) if hedge else primary)
+    finally:
+        # The slower call (or both, if we were cancelled) is abandoned
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
+    hedging.record(kind, time.perf_counter() - started)
+    return response
+
+
+async def call_model(make_call: Callable[[], Awaitable], estimated_tokens: int, kind: str = "default"):
+    """
+    Run a model call with pacing, retries, hedging and the circuit breaker.
+    `kind` groups calls with similar latency (model and input mode) for hedging.
+    Raises ModelUnavailable when the provider stays unavailable; other errors
+    (bad request, authentication) are raised immediately.
+    """
+    attempt = 0
+    while True:
+        probe = breaker.before_call()
+        try:
+            with stage("rate_limit_wait"):
+                await scheduler.acquire(estimated_tokens)
+            with stage("model_round_trip"):
+                response = await _round_trip(make_call, estimated_tokens, kind)
+        except Exception as e:
+            reason = classify_error(e)
+            if reason is None:
+                # Our request is wrong, not the provider; do not count it against the breaker
+                import openai
+                if isinstance(e, openai.APIStatusError):
+                    breaker.record_success()
+                elif probe:
+                    breaker.release_probe()
+                raise
+            retry_after = retry_after_seconds(e)
+            if reason == "rate_limit":
+                scheduler.pause(retry_after or settings.MODEL_BACKOFF_BASE)
+                if probe:
+                    # Over our quota says nothing about an outage: the next call probes again
+                    breaker.release_probe()
+            else:
+                breaker.record_failure()
+            if attempt >= settings.MODEL_MAX_RETRIES:
+                raise ModelUnavailable(
+                    f"Model call failed after {attempt + 1} attempts ({reason}): {e}",
+                    retry_after or settings.MODEL_BACKOFF_MAX
+                ) from e
+            delay = backoff_delay(attempt, retry_after)
+            MODEL_RETRIES.labels(reason=reason).inc()
+            logger.warning("Retrying model call", extra={"reason": reason, "attempt": attempt + 1,
+                                                         "delay_s": round(delay, 2)})
+            with stage("retry_backoff"):
+                await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        except BaseException:
+            # Cancelled (client gone, losing hedge or chunk, shutdown): the probe proved nothing
+            if probe:
+                breaker.release_probe()
+            raise
+
+        breaker.record_success()
+        usage = getattr(response, "usage", None)
+        if usage is not None:
+            scheduler.settle(estimated_tokens, usage.total_tokens or 0)
+        return response
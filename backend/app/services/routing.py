@@ -0,0 +1,140 @@
+"""
+Tiered model routing
+Model calls try the cheapest model in MODEL_ROUTE_TIERS first. Its answer is
+reviewed (schema, arithmetic consistency, the model's own confidence) and
+only escalated to the next tier when the review finds a problem.
+
+Every call in a routed request is labelled in the usage log with its route:
+  direct      not routed (a single tier, or an input mode that is not routed)
+  first_tier  the cheap answer was kept
+  rejected    the answer failed review and the request was escalated
+  escalated   answer of a higher tier after an escalation
+The ledger stores what the kept answer would have cost on the top tier, so
+savings (baseline minus actual cost, rejected calls included) can be rolled up.
+"""
+import re
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+
+ROUTE_DIRECT = "direct"
+ROUTE_FIRST_TIER = "first_tier"
+ROUTE_REJECTED = "rejected"
+ROUTE_ESCALATED = "escalated"
+
+_NOT_FOUND = re.compile(
+    r"\b(not (found|available|mentioned|present|provided)|no (information|data|record)s?|cannot find|could not find)\b",
+    re.IGNORECASE
+)
+
+# Currency written around an amount: "Rs. 85,000", "Rs 85000", "PKR 85,000", "85,000/-"
+_CURRENCY_PREFIX = re.compile(r"^(rs\.?|pkr|rupees|usd|us\$|\$)\s*", re.IGNORECASE)
+_CURRENCY_SUFFIX = re.compile(r"\s*(/-|/=|pkr|rupees)$", re.IGNORECASE)
+
+
+def model_tiers(input_mode: str) -> List[str]:
+    """Models to try for a call, cheapest first"""
+    tiers = settings.MODEL_ROUTE_TIERS or ["gpt-4o"]
+    if input_mode != "text" and not settings.MODEL_ROUTE_VISION:
+        return tiers[-1:]
+    return tiers
+
+
+def kept_route(index: int, tier_count: int) -> str:
+    """Route label of the answer that was kept, given its tier"""
+    if tier_count == 1:
+        return ROUTE_DIRECT
+    return ROUTE_FIRST_TIER if index == 0 else ROUTE_ESCALATED
+
+
+def label_call(call: Dict, route: str, top_model: str) -> None:
+    """Attach the routing decision to a usage log entry"""
+    call["route"] = route
+    call["baseline_model"] = None if route == ROUTE_REJECTED else top_model
+
+
+def parse_amount(value: Any) -> Optional[float]:
+    """Number from a model amount (numbers, or strings like '85,000' / 'Rs 85000' / '85,000/-'); None if absent or text"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        cleaned = value.replace(",", "").strip()
+        cleaned = _CURRENCY_SUFFIX.sub("", _CURRENCY_PREFIX.sub("", cleaned))
+        try:
+            return float(cleaned)
+        except ValueError:
+            return None
+    return None
+
+
+def is_blank(value: Any) -> bool:
+    """No value given (None, empty, or text like 'Not found')"""
+    if value is None:
+        return True
+    if isinstance(value, str):
+        text = value.strip().lower()
+        return text in ("", "n/a", "na", "none", "null", "-") or bool(_NOT_FOUND.search(text))
+    return False
+
+
+def _close(actual: float, expected: float) -> bool:
+    return abs(actual - expected) <= settings.MODEL_ROUTE_TOLERANCE * max(abs(expected), 1.0)
+
+
+def review_extraction(data: Any) -> List[str]:
+    """
+    Reasons to distrust an extraction answer (empty list = keep it):
+    schema, numeric amounts, annual = monthly x 12, gross = basic + allowances
+    on salary slips, and low model confidence
+    """
+    if not isinstance(data, dict):
+        return ["schema"]
+    problems = []
+    sections = {}
+    for key in ("salary_details", "allowances", "deductions"):
+        section = data.get(key)
+        if not isinstance(section, dict):
+            problems.append("schema")
+            section = {}
+        sections[key] = section
+    if not data.get("document_type"):
+        problems.append("schema")
+
+    for section in sections.values():
+        if any(parse_amount(value) is None and not is_blank(value) for value in section.values()):
+            problems.append("non_numeric_amount")
+            break
+
+    salary = sections["salary_details"]
+    gross = parse_amount(salary.get("gross_salary"))
+    if not gross or gross <= 0:
+        problems.append("missing_gross_salary")
+    else:
+        annual = parse_amount(salary.get("annual_gross_salary"))
+        if annual is not None and not _close(annual, gross * 12):
+            problems.append("annual_mismatch")
+
+        basic = parse_amount(salary.get("basic_salary"))
+        if basic is not None and "slip" in str(data.get("document_type", "")).lower():
+            components = basic + sum(
+                amount for amount in map(parse_amount, sections["allowances"].values()) if amount is not None
+            )
+            if not _close(components, gross):
+                problems.append("components_mismatch")
+
+    confidence = str(data.get("confidence", "")).strip().lower()
+    if not confidence or confidence.startswith("low"):
+        problems.append("low_confidence")
+
+    return list(dict.fromkeys(problems))
+
+
+def review_answer(answer: Optional[str]) -> List[str]:
+    """Reasons to escalate a search answer: empty, or the model says it found nothing"""
+    if not answer or not answer.strip():
+        return ["empty_answer"]
+    if _NOT_FOUND.search(answer):
+        return ["not_found"]
+    return []
@@ -0,0 +1,218 @@
+"""
+Chunked (map-reduce) extraction of long bank statements
+A statement longer than STATEMENT_CHUNK_PAGES pages is split into page groups.
+Each group is sent to the model on its own with the short
+bank_statement_chunk prompt, which only lists the transaction rows and the
+header fields visible on those pages (map). The chunk answers are then merged
+here, in plain Python (reduce):
+
+  - header fields (account holder, number, bank) by majority vote;
+  - transactions normalized (ISO dates, numeric amounts) and de-duplicated:
+    a row repeated with the same running balance is the same row, and rows
+    without a balance are only dropped when they repeat across chunks
+    (a page header or carried-over row read twice);
+  - salary credits found by description, or as the largest credit repeated
+    in most months; rent, utilities and tax debits by description;
+  - monthly figures are medians over the months covered, annual totals are
+    sums over the whole statement.
+
+The merged result has the shape of the bank statement extraction, so
+post-processing, routing review and tax calculation work unchanged.
+"""
+import re
+import statistics
+from collections import Counter, defaultdict
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+from app.services.routing import parse_amount
+
+_SALARY = re.compile(r"\b(salary|sal cr|payroll|monthly pay|pay ?roll)\b", re.IGNORECASE)
+_RENT = re.compile(r"\b(rent|landlord)\b", re.IGNORECASE)
+_UTILITY = re.compile(r"\b(lesco|sngpl|ssgc|ptcl|k-?electric|iesco|fesco|gepco|mepco|pesco|water board|wasa)\b",
+                      re.IGNORECASE)
+_TAX = re.compile(r"\b(tax|wht|withholding)\b", re.IGNORECASE)
+_FORWARD = re.compile(r"\b(b/f|c/f|brought forward|carried forward|opening balance|closing balance)\b",
+                      re.IGNORECASE)
+
+_DATE_FORMATS = ("%Y-%m-%d", "%d-%b-%y", "%d-%b-%Y", "%d %b %Y", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%d/%m/%y")
+
+
+def page_chunks(page_count: int, chunk_pages: int) -> List[List[int]]:
+    """1-based page numbers grouped into consecutive chunks"""
+    pages = list(range(1, page_count + 1))
+    return [pages[start:start + chunk_pages] for start in range(0, page_count, max(chunk_pages, 1))]
+
+
+def parse_date(value: Any) -> Optional[date]:
+    if not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip()
+    for fmt in _DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _normalize(row: Any) -> Optional[Dict]:
+    """A transaction row with a date, a description and one non-zero amount; None otherwise"""
+    if not isinstance(row, dict):
+        return None
+    when = parse_date(row.get("date"))
+    description = " ".join(str(row.get("description") or "").split())
+    debit = abs(parse_amount(row.get("debit")) or 0.0)
+    credit = abs(parse_amount(row.get("credit")) or 0.0)
+    if when is None or (not debit and not credit) or _FORWARD.search(description):
+        return None
+    return {
+        "date": when,
+        "description": description,
+        "debit": debit,
+        "credit": credit,
+        "balance": parse_amount(row.get("balance"))
+    }
+
+
+def merge_transactions(chunks: List[Dict]) -> List[Dict]:
+    """Normalized transactions of all chunks, de-duplicated, in date order (stable)"""
+    seen: Dict[tuple, int] = {}  # row key -> chunk it was first read in
+    merged = []
+    for index, chunk in enumerate(chunks):
+        for row in chunk.get("transactions") or []:
+            transaction = _normalize(row)
+            if transaction is None:
+                continue
+            key = (transaction["date"], transaction["description"].lower(),
+                   transaction["debit"], transaction["credit"], transaction["balance"])
+            if key in seen and (seen[key] != index or transaction["balance"] is not None):
+                continue
+            seen.setdefault(key, index)
+            merged.append(transaction)
+    merged.sort(key=lambda transaction: transaction["date"])
+    return merged
+
+
+def _vote(values: List[Any]) -> str:
+    """Most common non-empty value, earliest on ties"""
+    values = [" ".join(str(value).split()) for value in values if value and str(value).strip()]
+    if not values:
+        return ""
+    counts = Counter(values)
+    return max(values, key=lambda value: (counts[value], -values.index(value)))
+
+
+def _month(transaction: Dict) -> tuple:
+    return transaction["date"].year, transaction["date"].month
+
+
+def _monthly(transactions: List[Dict], months: List[tuple], field: str) -> Dict[tuple, float]:
+    totals = {month: 0.0 for month in months}
+    for transaction in transactions:
+        totals[_month(transaction)] += transaction[field]
+    return totals
+
+
+def _median_month(totals: Dict[tuple, float]) -> float:
+    """Median over the months with any such transaction"""
+    values = [value for value in totals.values() if value]
+    return round(statistics.median(values), 2) if values else 0.0
+
+
+def salary_credits(transactions: List[Dict], months: List[tuple]) -> List[Dict]:
+    """Credits described as salary; otherwise the largest amount credited in most months"""
+    credits = [t for t in transactions if t["credit"]]
+    named = [t for t in credits if _SALARY.search(t["description"])]
+    if named:
+        return named
+    by_amount = defaultdict(set)
+    for transaction in credits:
+        by_amount[transaction["credit"]].add(_month(transaction))
+    recurring = [amount for amount, seen in by_amount.items() if len(seen) >= max(2, len(months) // 2)]
+    if not recurring:
+        return []
+    amount = max(recurring)
+    return [t for t in credits if t["credit"] == amount]
+
+
+def _employer(salary: List[Dict]) -> str:
+    """Employer named in salary credit descriptions ('SALARY ACME LTD' -> 'ACME LTD')"""
+    names = [_SALARY.sub("", t["description"]).strip(" -:/") for t in salary]
+    return _vote([name for name in names if len(name) > 2])
+
+
+def merge_chunks(chunks: List[Dict], failed_chunks: int = 0) -> Dict:
+    """Reduce chunk answers to one bank statement extraction"""
+    transactions = merge_transactions(chunks)
+    months = sorted({_month(t) for t in transactions})
+    salary = salary_credits(transactions, months)
+    rent = [t for t in transactions if t["debit"] and _RENT.search(t["description"])]
+    utilities = [t for t in transactions if t["debit"] and _UTILITY.search(t["description"])]
+    tax = [t for t in transactions if t["debit"] and _TAX.search(t["description"])]
+
+    gross = _median_month(_monthly(salary, months, "credit"))
+    basic = round(gross * 0.55, 2)
+    balances = [t["balance"] for t in transactions if t["balance"] is not None]
+    first = transactions[0] if transactions else None
+    opening = round(first["balance"] - first["credit"] + first["debit"], 2) \
+        if first and first["balance"] is not None else None
+    period = f"{transactions[0]['date']:%B %Y} - {transactions[-1]['date']:%B %Y}" if transactions \
+        else _vote([chunk.get("period") for chunk in chunks])
+
+    if failed_chunks or not salary:
+        confidence = "Low"
+    elif any(_SALARY.search(t["description"]) for t in salary) and len({_month(t) for t in salary}) >= 2:
+        confidence = "High"
+    else:
+        confidence = "Medium"
+
+    return {
+        "employee_name": _vote([chunk.get("account_holder") for chunk in chunks]),
+        "employer_name": _employer(salary),
+        "period": period,
+        "salary_details": {
+            "basic_salary": basic,
+            # No salary found: leave it to the post-processing estimate from total credits
+            "gross_salary": gross or "Not found",
+            "annual_gross_salary": round(gross * 12, 2)
+        },
+        "allowances": {
+            "house_rent": round(basic * 0.45, 2),
+            "medical": round(basic * 0.10, 2),
+            "conveyance": 8000 if gross else 0,
+            "utility": round(basic * 0.10, 2),
+            "other": 0
+        },
+        "deductions": {
+            "income_tax": _median_month(_monthly(tax, months, "debit")),
+            "provident_fund": 0,
+            "eobi": 0,
+            "social_security": 0
+        },
+        "bank_details": {
+            "account_number": _vote([chunk.get("account_number") for chunk in chunks]),
+            "bank_name": _vote([chunk.get("bank_name") for chunk in chunks]),
+            "monthly_salary_credit": gross,
+            "total_credits": round(sum(t["credit"] for t in transactions), 2),
+            "total_debits": round(sum(t["debit"] for t in transactions), 2),
+            "opening_balance": opening,
+            "closing_balance": balances[-1] if balances else None,
+            "transactions": len(transactions)
+        },
+        "other_expenses": {
+            "rent_paid": _median_month(_monthly(rent, months, "debit")),
+            "utilities_paid": _median_month(_monthly(utilities, months, "debit"))
+        },
+        "annual_totals": {
+            "months": len(months),
+            "salary_received": round(sum(t["credit"] for t in salary), 2),
+            "rent_paid": round(sum(t["debit"] for t in rent), 2),
+            "utilities_paid": round(sum(t["debit"] for t in utilities), 2),
+            "income_tax": round(sum(t["debit"] for t in tax), 2)
+        },
+        "chunks": len(chunks) + failed_chunks,
+        "failed_chunks": failed_chunks,
+        "document_type": "bank statement",
+        "confidence": confidence
+    }
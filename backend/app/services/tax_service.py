@@ -0,0 +1,93 @@
+"""
+Tax reference data service
+Keeps active tax slabs in memory so slab lookups do not hit the database on
+every request. The cache is warmed before workers fork (see gunicorn.conf.py),
+refreshed after REFERENCE_CACHE_TTL seconds and invalidated by admin writes.
+An admin write only invalidates the cache of the worker that served it: the
+other workers calculate with the old slabs until their TTL runs out.
+"""
+import time
+import threading
+from typing import Dict, List, Optional
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.admin import TaxSlab, TaxCategory
+
+_lock = threading.Lock()
+_tax_slabs: Optional[List[Dict]] = None
+_loaded_at = 0.0
+
+
+def _slab_to_dict(slab: TaxSlab) -> Dict:
+    """Detached snapshot of a slab row (safe to share across sessions and threads)"""
+    return {
+        "category": slab.category,
+        "tax_year": slab.tax_year,
+        "min_income": slab.min_income,
+        "max_income": slab.max_income,
+        "fixed_tax": slab.fixed_tax,
+        "tax_rate": slab.tax_rate,
+        "description": slab.description
+    }
+
+
+def load_reference_data(db: Session) -> int:
+    """Load all active tax slabs into the cache. Returns the number of slabs."""
+    global _tax_slabs, _loaded_at
+    slabs = db.query(TaxSlab)\
+        .filter(TaxSlab.is_active == True)\
+        .order_by(TaxSlab.min_income.desc())\
+        .all()
+    with _lock:
+        _tax_slabs = [_slab_to_dict(slab) for slab in slabs]
+        _loaded_at = time.monotonic()
+    return len(_tax_slabs)
+
+
+def invalidate_reference_data() -> None:
+    """Drop cached reference data (called after admin changes)"""
+    global _tax_slabs
+    with _lock:
+        _tax_slabs = None
+
+
+def _cached_slabs(db: Session) -> List[Dict]:
+    if _tax_slabs is None or time.monotonic() - _loaded_at > settings.REFERENCE_CACHE_TTL:
+        load_reference_data(db)
+    return _tax_slabs
+
+
+def _normalize_category(category) -> Optional[TaxCategory]:
+    """Accept enum members, names ("SALARIED") or values ("salaried")"""
+    if isinstance(category, TaxCategory):
+        return category
+    for member in TaxCategory:
+        if category.upper() == member.name:
+            return member
+    return None
+
+
+def find_tax_slab(db: Session, income: float, category="SALARIED", tax_year: str = "2025-26") -> Optional[Dict]:
+    """
+    Find the slab that covers an income (highest min_income <= income)
+    Returns a dict with the slab fields, or None if no slab matches
+    """
+    tax_category = _normalize_category(category)
+    if tax_category is None:
+        return None
+
+    for slab in _cached_slabs(db):  # ordered by min_income descending
+        if (slab["category"] == tax_category and
+                slab["tax_year"] == tax_year and
+                slab["min_income"] <= income and
+                (slab["max_income"] is None or slab["max_income"] >= income)):
+            return slab
+    return None
+
+
+def calculate_tax(slab: Dict, income: float) -> float:
+    """Apply the FBR formula: fixed tax + rate on income above the slab minimum"""
+    excess_income = income - slab["min_income"]
+    variable_tax = excess_income * (slab["tax_rate"] / 100)
+    return slab["fixed_tax"] + variable_tax
@@ -0,0 +1,207 @@
+"""
+Model usage ledger and token budgets
+Every model call is written to the model_usage table. Daily and monthly
+totals are compared with the budgets in SystemSettings to pick how much
+the extraction pipeline may spend on the next document, and rolled up with
+the savings of tiered routing (see routing.py).
+"""
+import logging
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.models.admin import SystemSettings
+from app.models.usage import ModelUsage
+
+logger = logging.getLogger(__name__)
+
+# Extraction modes, most to least expensive (see ai_service.EXTRACTION_MODES)
+MODE_FULL = "full"
+MODE_ECONOMY = "economy"
+MODE_MINIMAL = "minimal"
+
+BUDGET_SETTING_KEYS = ("daily_token_budget", "monthly_token_budget", "budget_degrade_threshold")
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Cost in USD using MODEL_PRICES (per million input/output tokens)"""
+    input_price, output_price = settings.MODEL_PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def record_model_calls(calls: List[Dict], purpose: str, document_id: Optional[int] = None) -> None:
+    """
+    Write model calls to the ledger in their own transaction
+    (works the same whether the request session is on the primary or a replica)
+    """
+    if not calls:
+        return
+    db = SessionLocal()
+    try:
+        for call in calls:
+            prompt_tokens = call.get("prompt_tokens", 0)
+            completion_tokens = call.get("completion_tokens", 0)
+            cost = estimate_cost(call["model"], prompt_tokens, completion_tokens)
+            baseline_model = call.get("baseline_model", call["model"])
+            db.add(ModelUsage(
+                document_id=document_id,
+                purpose=purpose,
+                model=call["model"],
+                input_mode=call["input_mode"],
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=call.get("total_tokens", 0),
+                cost_usd=cost,
+                latency_ms=call.get("latency_ms"),
+                success=call.get("success", True),
+                route=call.get("route"),
+                baseline_cost_usd=estimate_cost(baseline_model, prompt_tokens, completion_tokens)
+                if baseline_model else 0.0
+            ))
+        db.commit()
+    except Exception:
+        db.rollback()
+        logger.exception("Error recording model usage")
+    finally:
+        db.close()
+
+
+def _period_starts() -> Dict[str, datetime]:
+    """Start of the current UTC day and month (naive UTC, as stored)"""
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {"daily": day, "monthly": day.replace(day=1)}
+
+
+def get_usage_totals(db: Session) -> Dict[str, int]:
+    """Tokens used so far today and this month"""
+    totals = {}
+    for period, start in _period_starts().items():
+        totals[period] = db.query(func.coalesce(func.sum(ModelUsage.total_tokens), 0))\
+            .filter(ModelUsage.created_at >= start)\
+            .scalar()
+    return totals
+
+
+def get_budgets(db: Session) -> Dict[str, float]:
+    """Budget settings from SystemSettings (missing or invalid values mean unlimited)"""
+    rows = db.query(SystemSettings)\
+        .filter(SystemSettings.setting_key.in_(BUDGET_SETTING_KEYS))\
+        .all()
+    values = {row.setting_key: row.setting_value for row in rows}
+
+    def number(key: str, default: float) -> float:
+        try:
+            return float(values.get(key, default))
+        except (TypeError, ValueError):
+            return default
+
+    return {
+        "daily": number("daily_token_budget", 0),
+        "monthly": number("monthly_token_budget", 0),
+        "degrade_threshold": number("budget_degrade_threshold", 0.8)
+    }
+
+
+def get_budget_status(db: Session, estimate: Optional[Callable[[str], int]] = None) -> Dict:
+    """
+    Usage against budgets and the extraction mode that follows from it.
+    estimate(mode), when given, is what the next document would use in each
+    mode: a mode is only chosen if usage stays within budget after it.
+    """
+    budgets = get_budgets(db)
+    totals = get_usage_totals(db)
+
+    def fraction(extra_tokens: int) -> float:
+        used = 0.0
+        for period in ("daily", "monthly"):
+            if budgets[period] > 0:
+                used = max(used, (totals[period] + extra_tokens) / budgets[period])
+        return used
+
+    usage_fraction = fraction(0)
+    if fraction(estimate(MODE_FULL) if estimate else 0) < budgets["degrade_threshold"]:
+        mode = MODE_FULL
+    elif fraction(estimate(MODE_ECONOMY) if estimate else 0) < 1:
+        mode = MODE_ECONOMY
+    else:
+        mode = MODE_MINIMAL
+
+    return {
+        "mode": mode,
+        "usage_fraction": round(usage_fraction, 4),
+        "tokens_today": totals["daily"],
+        "tokens_this_month": totals["monthly"],
+        "daily_budget": budgets["daily"],
+        "monthly_budget": budgets["monthly"],
+        "degrade_threshold": budgets["degrade_threshold"]
+    }
+
+
+def choose_extraction_mode(estimate: Optional[Callable[[str], int]] = None) -> str:
+    """Extraction mode for the next document, based on today's and this month's usage (and its own estimate)"""
+    db = SessionLocal()
+    try:
+        return get_budget_status(db, estimate)["mode"]
+    except Exception:
+        logger.exception("Error reading token budgets, using full mode")
+        return MODE_FULL
+    finally:
+        db.close()
+
+
+def get_usage_summary(db: Session, days: int = 30, months: int = 12) -> Dict:
+    """
+    Daily and monthly roll-ups of the ledger plus the current budget status.
+    savings_usd is what routing saved against sending every call to the top
+    tier (negative when escalations cost more than cheap answers saved).
+    """
+    if db.bind.dialect.name == "sqlite":
+        month_expr = func.strftime("%Y-%m", ModelUsage.created_at)
+    else:
+        month_expr = func.to_char(ModelUsage.created_at, "YYYY-MM")
+    day_expr = func.date(ModelUsage.created_at)
+
+    def rollup(period_expr, limit: int) -> List[Dict]:
+        rows = db.query(
+            period_expr.label("period"),
+            func.count(ModelUsage.id),
+            func.coalesce(func.sum(ModelUsage.prompt_tokens), 0),
+            func.coalesce(func.sum(ModelUsage.completion_tokens), 0),
+            func.coalesce(func.sum(ModelUsage.total_tokens), 0),
+            func.coalesce(func.sum(ModelUsage.cost_usd), 0.0),
+            func.coalesce(func.sum(func.coalesce(ModelUsage.baseline_cost_usd, ModelUsage.cost_usd)), 0.0),
+            func.avg(ModelUsage.latency_ms)
+        ).group_by(period_expr).order_by(period_expr.desc()).limit(limit).all()
+        return [
+            {
+                "period": str(period),
+                "calls": calls,
+                "prompt_tokens": prompt,
+                "completion_tokens": completion,
+                "total_tokens": total,
+                "cost_usd": round(cost, 4),
+                "savings_usd": round(baseline - cost, 4),
+                "avg_latency_ms": round(latency) if latency is not None else None
+            }
+            for period, calls, prompt, completion, total, cost, baseline, latency in rows
+        ]
+
+    routes = db.query(
+        ModelUsage.purpose,
+        func.coalesce(ModelUsage.route, "unrouted"),
+        func.count(ModelUsage.id)
+    ).filter(ModelUsage.created_at >= _period_starts()["monthly"])\
+        .group_by(ModelUsage.purpose, func.coalesce(ModelUsage.route, "unrouted")).all()
+
+    return {
+        "daily": rollup(day_expr, days),
+        "monthly": rollup(month_expr, months),
+        "routes_this_month": [
+            {"purpose": purpose, "route": route, "calls": calls} for purpose, route, calls in routes
+        ],
+        "budget": get_budget_status(db)
+    }
@@ -0,0 +1 @@
+# Benchmarks and load-testing tools (not imported by the app)
@@ -0,0 +1,182 @@
+"""
+Image preprocessing benchmark
+Compares what the vision model used to receive (the uploaded photo or scanned
+page as is, high detail) with the preprocessed image (cropped, deskewed,
+downscaled to the smallest legible size, low detail when it fits) on a
+synthetic corpus of scanned JPEGs:
+
+  - upload size (bytes of the image sent)
+  - image prompt tokens under the provider's tiling rules
+  - preprocessing time
+
+Accuracy needs a real model: with --live every image is extracted twice
+(before and after) through OPENAI_API_KEY and the answers are scored against
+the corpus ground truth. Without it accuracy is reported as n/a.
+
+Run from the backend folder:
+    python -m benchmarks.bench_preprocess --documents 40 --dpi 150,200,300
+    python -m benchmarks.bench_preprocess --documents 20 --live --model gpt-4o
+"""
+import argparse
+import asyncio
+import base64
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("DEBUG", "false")
+
+from PIL import Image
+
+from app.services.preprocess import prepare_image_file, vision_tokens
+from app.services.prompt_service import DEFAULT_PROMPTS
+from app.services.routing import parse_amount
+from benchmarks.corpus import generate_corpus
+
+
+def _leaves(value: Any, prefix: str = "") -> Dict[str, Any]:
+    """Flatten nested ground truth into dotted field names"""
+    if isinstance(value, dict):
+        fields = {}
+        for key, item in value.items():
+            fields.update(_leaves(item, f"{prefix}{key}."))
+        return fields
+    return {prefix.rstrip("."): value}
+
+
+def score_fields(truth: Dict, extracted: Dict) -> tuple:
+    """(correct, total) scalar fields of the ground truth found in the answer"""
+    expected = {name: value for name, value in _leaves(truth).items() if not isinstance(value, list)}
+    found = _leaves(extracted)
+    correct = 0
+    for name, value in expected.items():
+        answer = found.get(name)
+        if isinstance(value, (int, float)):
+            amount = parse_amount(answer)
+            correct += amount is not None and abs(amount - value) <= 0.01 * max(abs(value), 1)
+        else:
+            correct += str(answer or "").strip().lower() == str(value).strip().lower()
+    return correct, len(expected)
+
+
+async def extract_both(model: str, kind: str, images: List[tuple]) -> List[Dict]:
+    """Extract the same document from each (data URL, detail) image; one client per event loop"""
+    from openai import AsyncOpenAI
+    async with AsyncOpenAI() as client:
+        return list(await asyncio.gather(*(extract(client, model, kind, url, detail) for url, detail in images)))
+
+
+async def extract(client, model: str, kind: str, data_url: str, detail: str) -> Dict:
+    prompt = DEFAULT_PROMPTS[kind]
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": prompt.system_prompt},
+            {"role": "user", "content": [
+                {"type": "text", "text": prompt.prompt},
+                {"type": "image_url", "image_url": {"url": data_url, "detail": detail}}
+            ]}
+        ],
+        max_tokens=prompt.max_tokens,
+        temperature=0.1,
+        response_format={"type": "json_object"}
+    )
+    try:
+        return json.loads(response.choices[0].message.content)
+    except (TypeError, ValueError):
+        return {}
+
+
+def measure_corpus(folder: Path, manifest: Dict, model: Optional[str] = None) -> Dict:
+    """Before/after figures for every image; accuracy too when a model is given"""
+    rows: List[Dict] = []
+    for document in manifest["documents"]:
+        path = folder / document["file"]
+        with Image.open(path) as image:
+            width, height = image.size
+        start = time.perf_counter()
+        prepared = prepare_image_file(str(path))
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        row = {
+            "kind": document["kind"],
+            "before_bytes": path.stat().st_size,
+            "before_tokens": vision_tokens(width, height, "high"),
+            "after_bytes": len(base64.b64decode(prepared.data)),
+            "after_tokens": prepared.tokens,
+            "after_detail": prepared.detail,
+            "preprocess_ms": elapsed_ms
+        }
+        if model:
+            original = base64.b64encode(path.read_bytes()).decode("utf-8")
+            before, after = asyncio.run(extract_both(model, document["kind"], [
+                (f"data:image/jpeg;base64,{original}", "high"),
+                (prepared.data_url, prepared.detail)
+            ]))
+            row["before_score"] = score_fields(document["ground_truth"], before)
+            row["after_score"] = score_fields(document["ground_truth"], after)
+        rows.append(row)
+
+    def accuracy(key: str):
+        if not model:
+            return "n/a"
+        correct = sum(row[key][0] for row in rows)
+        total = sum(row[key][1] for row in rows)
+        return round(correct / max(total, 1), 4)
+
+    timings = sorted(row["preprocess_ms"] for row in rows)
+    return {
+        "images": len(rows),
+        "before": {
+            "mean_bytes": round(statistics.mean(row["before_bytes"] for row in rows)),
+            "mean_tokens": round(statistics.mean(row["before_tokens"] for row in rows), 1),
+            "accuracy": accuracy("before_score")
+        },
+        "after": {
+            "mean_bytes": round(statistics.mean(row["after_bytes"] for row in rows)),
+            "mean_tokens": round(statistics.mean(row["after_tokens"] for row in rows), 1),
+            "low_detail_share": round(sum(row["after_detail"] == "low" for row in rows) / len(rows), 3),
+            "accuracy": accuracy("after_score")
+        },
+        "preprocess_ms": {
+            "p50": round(timings[len(timings) // 2], 1),
+            "p95": round(timings[min(len(timings) - 1, math.ceil(len(timings) * 0.95) - 1)], 1)
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=40, help="Scanned JPEGs per resolution")
+    parser.add_argument("--dpi", default="150,300", help="Comma-separated scan resolutions")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--live", action="store_true", help="Score accuracy with a real model (costs tokens)")
+    parser.add_argument("--model", default="gpt-4o", help="Model used with --live")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    if args.live and not os.environ.get("OPENAI_API_KEY"):
+        parser.error("--live needs OPENAI_API_KEY")
+
+    results = {}
+    root = Path(tempfile.mkdtemp(prefix="taxease-preprocess-"))
+    for dpi in (int(value) for value in args.dpi.split(",") if value.strip()):
+        folder = root / f"dpi-{dpi}"
+        manifest = generate_corpus(folder, args.documents, args.seed, formats=("jpg",), dpi=dpi)
+        results[f"dpi_{dpi}"] = measure_corpus(folder, manifest, args.model if args.live else None)
+
+    print(json.dumps(results, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Serialization and compression benchmark for the API
+Compares the old setup (stdlib JSONResponse, no compression) with the current
+app (ORJSONResponse + Brotli/gzip middleware) on document list, analyze and
+admin listing responses.
+
+Run from the backend folder:
+    python -m benchmarks.bench_serialization --documents 200 --repeat 50
+"""
+import argparse
+import json
+import math
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# Use a throwaway SQLite database unless one is given explicitly
+_tmp_db = os.path.join(tempfile.mkdtemp(prefix="taxease-bench-"), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp_db}")
+os.environ.setdefault("DEBUG", "false")
+# The benchmark replays the same client many times; keep admission control out of the way
+os.environ.setdefault("MODEL_RATE_LIMIT_BURST", "1000000")
+
+from fastapi import FastAPI
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.testclient import TestClient
+
+from app.database import Base, engine, SessionLocal
+from app.models import Document, DocumentStatus, TaxSlab, TaxCategory
+from app.api import documents, admin, tax
+from app.main import app as optimized_app
+from benchmarks.fixtures import SAMPLE_EXTRACTION
+
+
+def seed(document_count: int):
+    """Create tables and insert documents and tax slabs"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        db.query(Document).delete()
+        db.query(TaxSlab).delete()
+        payload = json.dumps(SAMPLE_EXTRACTION)
+        for i in range(document_count):
+            db.add(Document(
+                filename=f"bench-{i}.pdf",
+                original_filename=f"salary_slip_{i}.pdf",
+                file_path=f"uploads/bench-{i}.pdf",
+                file_type="pdf",
+                file_size=250000 + i,
+                status=DocumentStatus.COMPLETED,
+                extracted_data=payload
+            ))
+        for i in range(60):
+            db.add(TaxSlab(
+                category=TaxCategory.SALARIED,
+                tax_year=f"20{10 + i // 6}-{11 + i // 6}",
+                min_income=i * 600000,
+                max_income=(i + 1) * 600000,
+                fixed_tax=i * 6000,
+                tax_rate=i % 35,
+                description=f"Rs. {i * 6000:,} + {i % 35}% of amount exceeding Rs. {i * 600000:,}"
+            ))
+        db.commit()
+        return db.query(Document.id).first()[0]
+    finally:
+        db.close()
+
+
+def build_baseline_app() -> FastAPI:
+    """The app as it was: stdlib JSON responses, no compression middleware"""
+    baseline = FastAPI(default_response_class=JSONResponse)
+    baseline.include_router(documents.router, prefix="/api/documents")
+    baseline.include_router(admin.router, prefix="/api/admin")
+    baseline.include_router(tax.router, prefix="/api/tax")
+    return baseline
+
+
+def measure(client: TestClient, method: str, url: str, repeat: int, headers: dict) -> dict:
+    """Time a request and report the bytes actually sent on the wire"""
+    timings = []
+    response = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.request(method, url, headers=headers)
+        timings.append((time.perf_counter() - start) * 1000)
+    response.raise_for_status()
+    wire_bytes = int(response.headers.get("content-length", len(response.content)))
+    return {
+        "mean_ms": round(statistics.mean(timings), 3),
+        "p95_ms": round(sorted(timings)[min(len(timings) - 1, math.ceil(len(timings) * 0.95) - 1)], 3),
+        "wire_bytes": wire_bytes,
+        "uncompressed_bytes": len(response.content),
+        "content_encoding": response.headers.get("content-encoding", "identity")
+    }
+
+
+def measure_render(payload, repeat: int) -> dict:
+    """Pure serialization cost of the response body, old vs new response class"""
+    def run(render):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            render()
+        return round((time.perf_counter() - start) * 1000 / repeat, 3)
+
+    return {
+        "json_response_ms": run(lambda: JSONResponse(jsonable_encoder(payload)).body),
+        "orjson_response_ms": run(lambda: ORJSONResponse(payload).body)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=200, help="Documents in the list response")
+    parser.add_argument("--repeat", type=int, default=30, help="Requests per measurement")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    document_id = seed(args.documents)
+    endpoints = {
+        "list": ("GET", f"/api/documents?limit={args.documents}"),
+        "analyze": ("POST", f"/api/documents/analyze/{document_id}"),
+        "admin": ("GET", "/api/admin?resource=tax-slabs")
+    }
+
+    before = TestClient(build_baseline_app())
+    after = TestClient(optimized_app)
+    results = {}
+    for name, (method, url) in endpoints.items():
+        results[name] = {
+            "before": measure(before, method, url, args.repeat, {"Accept-Encoding": "identity"}),
+            "after_gzip": measure(after, method, url, args.repeat, {"Accept-Encoding": "gzip"}),
+            "after_br": measure(after, method, url, args.repeat, {"Accept-Encoding": "br, gzip"}),
+            "render": measure_render(before.request(method, url).json(), args.repeat)
+        }
+
+    print(f"{'endpoint':<10}{'before ms':>11}{'after ms':>10}{'before B':>11}{'gzip B':>9}{'br B':>9}{'json ms':>9}{'orjson ms':>11}")
+    for name, r in results.items():
+        print(
+            f"{name:<10}{r['before']['mean_ms']:>11}{r['after_br']['mean_ms']:>10}"
+            f"{r['before']['wire_bytes']:>11}{r['after_gzip']['wire_bytes']:>9}{r['after_br']['wire_bytes']:>9}"
+            f"{r['render']['json_response_ms']:>9}{r['render']['orjson_response_ms']:>11}"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""
+Synthetic document corpus for benchmarks and accuracy experiments
+Generates salary slips and multi-page bank statements with known values:
+  - text PDFs (real text layer, so preflight.inspect_file(...).has_text is True)
+  - scanned PDFs (rasterized pages with skew, blur, speckle and JPEG
+    artifacts, no text layer, so they go through page triage and rendering)
+  - JPEG photos of a single page
+
+Every file is listed in manifest.json with its ground truth in the shape of
+the extraction JSON (see SALARY_EXTRACTION_PROMPT), so extraction results can
+be scored field by field. Output is deterministic for a given --seed.
+
+Run from the backend folder:
+    python -m benchmarks.corpus --out corpus --count 40
+    python -m benchmarks.corpus --out corpus --count 500 --statement-pages 2-20 --scanned-share 0.6 --formats pdf
+"""
+import argparse
+import io
+import json
+import random
+import sys
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+# A4 in PDF points
+PAGE_WIDTH = 595
+PAGE_HEIGHT = 842
+MARGIN = 50
+ROW_HEIGHT = 16
+ROWS_PER_PAGE = 40
+
+EMPLOYERS = ["Systems Limited", "Engro Corporation", "Packages Limited", "NetSol Technologies",
+             "Lucky Cement", "Jazz Pakistan", "Habib Metro Pharma", "Interloop Limited"]
+DESIGNATIONS = ["Software Engineer", "Senior Accountant", "Assistant Manager", "Sales Executive",
+                "HR Officer", "Project Manager", "Data Analyst", "Area Manager"]
+FIRST_NAMES = ["Ahmed", "Ayesha", "Bilal", "Fatima", "Hamza", "Hira", "Usman", "Sana", "Zain", "Maryam"]
+LAST_NAMES = ["Raza", "Khan", "Malik", "Qureshi", "Siddiqui", "Butt", "Sheikh", "Chaudhry"]
+BANKS = [("Meezan Bank", "MEZN"), ("Habib Bank Limited", "HABB"), ("United Bank Limited", "UNIL"),
+         ("MCB Bank", "MUCB"), ("Allied Bank", "ABPA"), ("Bank Alfalah", "ALFH")]
+UTILITIES = ["LESCO BILL", "SNGPL BILL", "PTCL BILL", "K-ELECTRIC BILL"]
+MERCHANTS = ["POS IMTIAZ SUPERMARKET", "POS SHELL PETROL", "POS DARAZ PK", "POS FOODPANDA",
+             "ATM CASH WITHDRAWAL", "IBFT TRANSFER", "MOBILE TOPUP JAZZ", "POS SAPPHIRE"]
+
+# Salaried income tax slabs, tax year 2025: (lower bound, fixed tax, rate above lower bound)
+TAX_SLABS = [(600000, 0, 0.05), (1200000, 30000, 0.15), (2200000, 180000, 0.25),
+             (3200000, 430000, 0.30), (4100000, 700000, 0.35)]
+
+
+def annual_income_tax(income: int) -> int:
+    tax = 0
+    for lower, fixed, rate in TAX_SLABS:
+        if income > lower:
+            tax = fixed + (income - lower) * rate
+    return int(tax)
+
+
+@dataclass
+class Page:
+    # (x, y from the top, text, font size, bold)
+    lines: List[Tuple[float, float, str, int, bool]] = field(default_factory=list)
+
+    def text(self, x: float, y: float, value: str, size: int = 9, bold: bool = False) -> None:
+        self.lines.append((x, y, value, size, bold))
+
+
+# ---------------------------------------------------------------------------
+# Document content
+# ---------------------------------------------------------------------------
+
+def money(value: int) -> str:
+    return f"{value:,}"
+
+
+def person(rng: random.Random) -> Dict:
+    return {
+        "name": f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+        "cnic": f"{rng.randint(35100, 35299)}-{rng.randint(1000000, 9999999)}-{rng.randint(1, 9)}",
+        "employer": rng.choice(EMPLOYERS),
+        "designation": rng.choice(DESIGNATIONS),
+        "gross": rng.randrange(60000, 900000, 500)
+    }
+
+
+def salary_structure(gross: int) -> Dict:
+    """Monthly salary breakdown using the usual Pakistani proportions"""
+    basic = int(gross * 0.55)
+    allowances = {
+        "house_rent": int(basic * 0.45),
+        "medical": int(basic * 0.10),
+        "conveyance": 8000,
+        "utility": int(basic * 0.10)
+    }
+    allowances["other"] = max(gross - basic - sum(allowances.values()), 0)
+    deductions = {
+        "income_tax": annual_income_tax(gross * 12) // 12,
+        "provident_fund": int(basic * 0.0833),
+        "eobi": 370,
+        "social_security": 0
+    }
+    return {"basic": basic, "allowances": allowances, "deductions": deductions,
+            "net": gross - sum(deductions.values())}
+
+
+def salary_slip(rng: random.Random) -> Tuple[List[Page], Dict]:
+    who = person(rng)
+    pay = salary_structure(who["gross"])
+    month = date(2025, rng.randint(1, 6), 1).strftime("%B %Y")
+
+    page = Page()
+    page.text(MARGIN, 60, who["employer"].upper(), 16, True)
+    page.text(MARGIN, 82, f"PAYSLIP FOR THE MONTH OF {month.upper()}", 11, True)
+    y = 120
+    for label, value in (("Employee Name", who["name"]), ("CNIC", who["cnic"]),
+                         ("Designation", who["designation"]),
+                         ("Employee ID", f"EMP-{rng.randint(1000, 9999)}")):
+        page.text(MARGIN, y, f"{label}:", 9, True)
+        page.text(MARGIN + 110, y, value)
+        y += ROW_HEIGHT
+
+    y += 20
+    page.text(MARGIN, y, "EARNINGS", 10, True)
+    page.text(320, y, "DEDUCTIONS", 10, True)
+    earnings = [("Basic Salary", pay["basic"])] + [
+        (name.replace("_", " ").title() + " Allowance", value) for name, value in pay["allowances"].items()
+    ]
+    deductions = [(name.replace("_", " ").title(), value) for name, value in pay["deductions"].items()]
+    for i in range(max(len(earnings), len(deductions))):
+        y += ROW_HEIGHT
+        if i < len(earnings):
+            page.text(MARGIN, y, earnings[i][0])
+            page.text(230, y, money(earnings[i][1]))
+        if i < len(deductions):
+            page.text(320, y, deductions[i][0])
+            page.text(490, y, money(deductions[i][1]))
+    y += ROW_HEIGHT * 2
+    page.text(MARGIN, y, "Gross Salary", 9, True)
+    page.text(230, y, money(who["gross"]), 9, True)
+    page.text(320, y, "Total Deductions", 9, True)
+    page.text(490, y, money(sum(pay["deductions"].values())), 9, True)
+    y += ROW_HEIGHT * 2
+    page.text(MARGIN, y, "NET PAY", 11, True)
+    page.text(230, y, money(pay["net"]), 11, True)
+    page.text(MARGIN, y + 60, "This is a computer generated payslip and does not require a signature.", 8)
+
+    truth = {
+        "employee_name": who["name"],
+        "cnic": who["cnic"],
+        "employer_name": who["employer"],
+        "designation": who["designation"],
+        "salary_details": {"basic_salary": pay["basic"], "gross_salary": who["gross"],
+                           "annual_gross_salary": who["gross"] * 12},
+        "allowances": pay["allowances"],
+        "deductions": pay["deductions"],
+        "period": month,
+        "document_type": "salary slip"
+    }
+    return [page], truth
+
+
+def bank_statement(rng: random.Random, pages: int) -> Tuple[List[Page], Dict]:
+    who = person(rng)
+    pay = salary_structure(who["gross"])
+    bank, code = rng.choice(BANKS)
+    account = f"PK{rng.randint(10, 99)}{code}{rng.randint(10 ** 15, 10 ** 16 - 1)}"
+    rent = rng.randrange(25000, 250000, 5000)
+
+    # Build rows month by month until the pages are full
+    rows = []
+    day = date(2024, 7, 1)
+    while len(rows) < pages * ROWS_PER_PAGE:
+        month_rows = [(day, f"SALARY {who['employer'].upper()}", pay["net"], 0),
+                      (day + timedelta(days=4), "RENT TRANSFER LANDLORD", 0, rent)]
+        for utility in rng.sample(UTILITIES, 2):
+            month_rows.append((day + timedelta(days=rng.randint(8, 20)), utility, 0, rng.randrange(2000, 30000, 10)))
+        for _ in range(rng.randint(6, 14)):
+            month_rows.append((day + timedelta(days=rng.randint(1, 27)), rng.choice(MERCHANTS), 0,
+                               rng.randrange(500, max(pay["net"] // 10, 1000), 10)))
+        if rng.random() < 0.3:
+            month_rows.append((day + timedelta(days=rng.randint(1, 27)), "IBFT RECEIVED", rng.randrange(5000, 80000, 100), 0))
+        rows.extend(sorted(month_rows))
+        day = (day + timedelta(days=32)).replace(day=1)
+    rows = rows[:pages * ROWS_PER_PAGE]
+
+    balance = rng.randrange(10000, 500000, 10)
+    opening = balance
+    doc_pages = []
+    for page_number in range(pages):
+        page = Page()
+        page.text(MARGIN, 50, bank.upper(), 15, True)
+        page.text(MARGIN, 70, "ACCOUNT STATEMENT", 10, True)
+        page.text(400, 50, f"Page {page_number + 1} of {pages}", 8)
+        page.text(MARGIN, 92, f"Account Title: {who['name']}", 9)
+        page.text(MARGIN, 106, f"IBAN: {account}", 9)
+        page.text(MARGIN, 120, f"Period: {rows[0][0]:%d-%b-%Y} to {rows[-1][0]:%d-%b-%Y}", 9)
+        y = 148
+        for x, header in ((MARGIN, "Date"), (115, "Description"), (335, "Debit"), (405, "Credit"), (475, "Balance")):
+            page.text(x, y, header, 9, True)
+        for when, description, credit, debit in rows[page_number * ROWS_PER_PAGE:(page_number + 1) * ROWS_PER_PAGE]:
+            y += ROW_HEIGHT
+            balance += credit - debit
+            page.text(MARGIN, y, f"{when:%d-%b-%y}", 8)
+            page.text(115, y, description[:34], 8)
+            page.text(335, y, money(debit) if debit else "", 8)
+            page.text(405, y, money(credit) if credit else "", 8)
+            page.text(475, y, money(balance), 8)
+        doc_pages.append(page)
+
+    first_month = [row for row in rows if row[0].month == rows[0][0].month]
+    truth = {
+        "employee_name": who["name"],
+        "employer_name": who["employer"],
+        "salary_details": {"gross_salary": pay["net"], "annual_gross_salary": pay["net"] * 12},
+        "bank_details": {
+            "account_number": account,
+            "bank_name": bank,
+            "monthly_salary_credit": pay["net"],
+            "total_credits": sum(row[2] for row in rows),
+            "total_debits": sum(row[3] for row in rows),
+            "opening_balance": opening,
+            "closing_balance": balance
+        },
+        "other_expenses": {
+            "rent_paid": rent,
+            "utilities_paid": sum(row[3] for row in first_month if row[1] in UTILITIES)
+        },
+        "period": f"{rows[0][0]:%B %Y} - {rows[-1][0]:%B %Y}",
+        "document_type": "bank statement",
+        "transactions": len(rows)
+    }
+    return doc_pages, truth
+
+
+# ---------------------------------------------------------------------------
+# Rendering
+# ---------------------------------------------------------------------------
+
+def _pdf_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)").encode("latin-1", "replace").decode("latin-1")
+
+
+def write_text_pdf(pages: List[Page], path: Path) -> None:
+    """Minimal PDF writer: one content stream per page using the standard Helvetica fonts"""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in below
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"
+    ]
+    page_ids = []
+    for page in pages:
+        ops = []
+        for x, y, value, size, bold in page.lines:
+            ops.append(f"BT /{'F2' if bold else 'F1'} {size} Tf {x:.1f} {PAGE_HEIGHT - y:.1f} Td ({_pdf_escape(value)}) Tj ET")
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append((
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents {content_id} 0 R >>"
+        ).encode())
+        page_ids.append(len(objects))
+    kids = " ".join(f"{page_id} 0 R" for page_id in page_ids)
+    objects[1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    path.write_bytes(out.getvalue())
+
+
+_fonts = {}
+
+
+def _font(size: int, bold: bool):
+    from PIL import ImageFont
+    key = (size, bold)
+    if key not in _fonts:
+        try:
+            _fonts[key] = ImageFont.truetype("DejaVuSans-Bold.ttf" if bold else "DejaVuSans.ttf", size)
+        except OSError:
+            _fonts[key] = ImageFont.load_default(size)
+    return _fonts[key]
+
+
+def render_page(page: Page, dpi: int):
+    """Rasterize a page to a grayscale PIL image"""
+    from PIL import Image, ImageDraw
+    scale = dpi / 72
+    image = Image.new("L", (int(PAGE_WIDTH * scale), int(PAGE_HEIGHT * scale)), 255)
+    draw = ImageDraw.Draw(image)
+    for x, y, value, size, bold in page.lines:
+        # y is the text baseline in PDF terms; PIL draws from the top of the text
+        draw.text((x * scale, (y - size) * scale), value, fill=20, font=_font(int(size * scale), bold))
+    return image
+
+
+def degrade(image, rng: random.Random):
+    """Make a clean render look like a scan or phone photo"""
+    from PIL import Image, ImageFilter
+    image = image.rotate(rng.uniform(-1.5, 1.5), resample=Image.BILINEAR, expand=False, fillcolor=255)
+    image = image.filter(ImageFilter.GaussianBlur(rng.uniform(0.3, 0.9)))
+    noise = Image.effect_noise(image.size, rng.uniform(20, 45))
+    image = Image.blend(image, noise, rng.uniform(0.05, 0.12))
+    tint = rng.randint(225, 245)
+    image = image.point(lambda value: value * tint // 255)
+    # Round-trip through a low-quality JPEG for compression artifacts
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=rng.randint(45, 75))
+    buffer.seek(0)
+    return Image.open(buffer).convert("L")
+
+
+def write_document(pages: List[Page], path: Path, fmt: str, scanned: bool, dpi: int, rng: random.Random) -> None:
+    if fmt == "pdf" and not scanned:
+        write_text_pdf(pages, path)
+        return
+    images = [render_page(page, dpi) for page in pages]
+    if scanned:
+        images = [degrade(image, rng) for image in images]
+    if fmt == "pdf":
+        images[0].save(path, format="PDF", resolution=dpi, save_all=True, append_images=images[1:])
+    else:
+        images[0].convert("RGB").save(path, format="JPEG", quality=85)
+
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+def parse_range(value: str) -> Tuple[int, int]:
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+def generate_corpus(out: Path, count: int, seed: int = 0, statement_share: float = 0.5,
+                    statement_pages: Tuple[int, int] = (1, 6), scanned_share: float = 0.5,
+                    formats: Tuple[str, ...] = ("pdf", "jpg"), dpi: int = 150) -> Dict:
+    """Write `count` documents plus manifest.json to `out` and return the manifest"""
+    out.mkdir(parents=True, exist_ok=True)
+    documents = []
+    for index in range(count):
+        rng = random.Random(f"{seed}:{index}")
+        fmt = rng.choice(formats)
+        is_statement = rng.random() < statement_share
+        # A photo only shows one page; JPEGs are always "scanned"
+        scanned = fmt == "jpg" or rng.random() < scanned_share
+        if is_statement:
+            pages = 1 if fmt == "jpg" else rng.randint(*statement_pages)
+            doc_pages, truth = bank_statement(rng, pages)
+            kind = "bank_statement"
+        else:
+            doc_pages, truth = salary_slip(rng)
+            kind = "salary_slip"
+
+        filename = f"{index:05d}_{kind}_{'scan' if scanned else 'text'}.{fmt}"
+        write_document(doc_pages, out / filename, fmt, scanned, dpi, rng)
+        documents.append({
+            "file": filename,
+            "kind": kind,
+            "format": fmt,
+            "scanned": scanned,
+            "pages": len(doc_pages),
+            "bytes": (out / filename).stat().st_size,
+            "ground_truth": truth
+        })
+
+    manifest = {
+        "seed": seed,
+        "dpi": dpi,
+        "count": count,
+        "documents": documents
+    }
+    (out / "manifest.json").write_text(json.dumps(manifest, indent=2))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, default=Path("corpus"), help="Output folder")
+    parser.add_argument("--count", type=int, default=40, help="Number of documents")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--statement-share", type=float, default=0.5, help="Share of bank statements")
+    parser.add_argument("--statement-pages", type=parse_range, default=(1, 6), help="Page range, e.g. 2-12")
+    parser.add_argument("--scanned-share", type=float, default=0.5, help="Share of PDFs that are scanned")
+    parser.add_argument("--formats", default="pdf,jpg", help="Comma-separated: pdf, jpg")
+    parser.add_argument("--dpi", type=int, default=150, help="Resolution of scanned pages and photos")
+    args = parser.parse_args()
+
+    formats = tuple(fmt.strip() for fmt in args.formats.split(",") if fmt.strip())
+    if not set(formats) <= {"pdf", "jpg"}:
+        parser.error("--formats must be pdf and/or jpg")
+
+    manifest = generate_corpus(args.out, args.count, args.seed, args.statement_share,
+                               args.statement_pages, args.scanned_share, formats, args.dpi)
+    total_pages = sum(doc["pages"] for doc in manifest["documents"])
+    total_mb = sum(doc["bytes"] for doc in manifest["documents"]) / 1e6
+    print(f"Wrote {args.count} documents ({total_pages} pages, {total_mb:.1f} MB) to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+"""
+Shared fixture data for benchmarks and the mock model server
+"""
+
+# A realistic extraction result (shape of SALARY_EXTRACTION_PROMPT's JSON)
+SAMPLE_EXTRACTION = {
+    "employee_name": "Ahmed Raza",
+    "cnic": "35202-1234567-1",
+    "employer_name": "Systems Limited",
+    "designation": "Senior Software Engineer",
+    "salary_details": {"basic_salary": 165000, "gross_salary": 300000, "annual_gross_salary": 3600000},
+    "allowances": {"house_rent": 74250, "medical": 16500, "conveyance": 8000, "utility": 16500, "other": 19750},
+    "deductions": {"income_tax": 38541, "provident_fund": 13750, "eobi": 370, "social_security": 0},
+    "bank_details": {
+        "account_number": "PK36MEZN0002010105678901",
+        "bank_name": "Meezan Bank",
+        "monthly_salary_credit": "247339 on 1st of each month",
+        "total_credits": 2968068,
+        "total_debits": 2710450
+    },
+    "other_expenses": {"rent_paid": 85000, "utilities_paid": 21450, "education": 0, "medical_expenses": 4500},
+    "period": "July 2024 - June 2025",
+    "document_type": "salary slip",
+    "confidence": "High"
+}
@@ -0,0 +1,93 @@
+"""
+Cold-start import benchmark for the backend
+Runs `python -X importtime -c "import app.main"` in fresh interpreters and
+fails (exit code 1) when startup regresses:
+  - the best cumulative import time of app.main is over the budget, or
+  - a module that must stay lazy (PDF/image libraries, OpenAI SDK) is
+    imported at startup.
+
+Run from the backend folder:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 600 --runs 5 --top 15
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+
+# Default budget in milliseconds, overridable with IMPORT_TIME_BUDGET_MS
+DEFAULT_BUDGET_MS = float(os.environ.get("IMPORT_TIME_BUDGET_MS", 1000))
+
+# Top-level packages that must only be imported when a document is processed
+LAZY_MODULES = ("PyPDF2", "pdf2image", "PIL", "openai")
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def run_importtime(target: str) -> list:
+    """Import target in a fresh interpreter and parse the -X importtime report"""
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"Importing {target} failed:\n{result.stderr}")
+
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", default="app.main", help="Module to import")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS, help="Maximum cumulative import time")
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters to try (best run is used)")
+    parser.add_argument("--top", type=int, default=10, help="Show the N slowest modules by self time")
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(args.runs):
+        modules = run_importtime(args.target)
+        total_us = next(cumulative for name, _, cumulative in modules if name == args.target)
+        if best is None or total_us < best[0]:
+            best = (total_us, modules)
+
+    total_us, modules = best
+    total_ms = total_us / 1000
+
+    print(f"Slowest modules importing {args.target} (self time):")
+    for name, self_us, cumulative_us in sorted(modules, key=lambda m: m[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:8.1f} ms  (cumulative {cumulative_us / 1000:8.1f} ms)  {name}")
+
+    failures = []
+    eager = sorted({name.split(".")[0] for name, _, _ in modules if name.split(".")[0] in LAZY_MODULES})
+    if eager:
+        failures.append(f"modules that must be lazy were imported at startup: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failures.append(f"import took {total_ms:.1f} ms, budget is {args.budget_ms:.0f} ms")
+
+    print(f"\n{args.target}: {total_ms:.1f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,297 @@
+"""
+Local OpenAI-compatible model server for offline tests and load tests
+
+Point the backend at it with OPENAI_BASE_URL=http://127.0.0.1:8100/v1 (any
+non-empty OPENAI_API_KEY works). Three modes:
+
+  mock    synthetic responses with a configurable latency distribution,
+          token counts and error rates (deterministic per request, attempt and seed)
+  record  forward requests to the real API and save each response as a
+          cassette keyed by a hash of the request
+  replay  serve saved cassettes; unknown requests fall back to mock or 404
+
+Examples (from the backend folder):
+    python -m benchmarks.mock_llm serve --latency-median-ms 2500 --latency-p95-ms 9000 --error-rate 0.02
+    python -m benchmarks.mock_llm serve --mode record --cassettes benchmarks/cassettes
+    python -m benchmarks.mock_llm serve --mode replay --cassettes benchmarks/cassettes --replay-miss error
+
+    # Record cassettes for fixture documents by running the real pipeline through the recorder
+    OPENAI_API_KEY=sk-... python -m benchmarks.mock_llm record-fixtures --cassettes benchmarks/cassettes corpus/*.pdf
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from benchmarks.fixtures import SAMPLE_EXTRACTION
+
+# Vision token cost per image (OpenAI tiling: 85 base + 170 per 512px tile)
+LOW_DETAIL_IMAGE_TOKENS = 85
+HIGH_DETAIL_IMAGE_TOKENS = 85 + 170 * 4
+
+
+@dataclass
+class MockConfig:
+    mode: str = "mock"  # mock, record, replay
+    cassette_dir: Optional[Path] = None
+    upstream: str = "https://api.openai.com/v1"
+    replay_miss: str = "mock"  # mock or error
+    replay_latency: bool = False  # sleep for the recorded upstream latency
+    latency_median_ms: float = 2000.0
+    latency_p95_ms: float = 6000.0
+    completion_tokens: int = 450
+    error_rate: float = 0.0
+    rate_limit_share: float = 0.5  # share of errors returned as 429 (rest are 500)
+    seed: int = 0
+    response_fixture: dict = field(default_factory=lambda: dict(SAMPLE_EXTRACTION))
+
+
+def request_key(body: dict) -> str:
+    """Stable cassette key: hash of the fields that determine the model output"""
+    relevant = {k: body.get(k) for k in ("model", "messages", "temperature", "response_format", "max_tokens")}
+    canonical = json.dumps(relevant, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def estimate_prompt_tokens(messages: list) -> int:
+    """Rough prompt size: 4 characters per token, fixed cost per image"""
+    tokens = 0
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, str):
+            tokens += len(content) // 4
+            continue
+        for part in content or []:
+            if part.get("type") == "text":
+                tokens += len(part.get("text", "")) // 4
+            elif part.get("type") == "image_url":
+                detail = part.get("image_url", {}).get("detail", "high")
+                tokens += LOW_DETAIL_IMAGE_TOKENS if detail == "low" else HIGH_DETAIL_IMAGE_TOKENS
+    return max(tokens, 1)
+
+
+def sample_latency(config: MockConfig, rng: random.Random) -> float:
+    """Log-normal latency in seconds matching the configured median and p95"""
+    sigma = max(math.log(config.latency_p95_ms / config.latency_median_ms) / 1.645, 0.0)
+    return rng.lognormvariate(math.log(config.latency_median_ms), sigma) / 1000
+
+
+def mock_completion(body: dict, config: MockConfig) -> dict:
+    """Synthetic chat completion shaped like the OpenAI response"""
+    wants_json = (body.get("response_format") or {}).get("type") == "json_object"
+    content = json.dumps(config.response_fixture) if wants_json else (
+        "Based on the documents, your monthly gross salary is Rs. 300,000 "
+        "and income tax of Rs. 38,541 is deducted each month."
+    )
+    prompt_tokens = estimate_prompt_tokens(body.get("messages", []))
+    return {
+        "id": f"chatcmpl-mock-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": config.completion_tokens,
+            "total_tokens": prompt_tokens + config.completion_tokens
+        }
+    }
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    """Build the mock server app"""
+    app = FastAPI(title="TaxEase mock model server")
+    app.state.config = config
+    app.state.stats = {"requests": 0, "errors": 0, "replayed": 0, "recorded": 0}
+    seen = {}  # request key -> times seen, so a retry is a new draw
+    if config.cassette_dir:
+        config.cassette_dir.mkdir(parents=True, exist_ok=True)
+
+    async def synthetic(body: dict, key: str):
+        # Seed per request and attempt: runs are reproducible, retries are independent draws
+        seen[key] = seen.get(key, 0) + 1
+        rng = random.Random(f"{config.seed}:{key}:{seen[key]}")
+        await asyncio.sleep(sample_latency(config, rng))
+        if rng.random() < config.error_rate:
+            app.state.stats["errors"] += 1
+            if rng.random() < config.rate_limit_share:
+                return JSONResponse(
+                    {"error": {"message": "Rate limit reached (mock)", "type": "rate_limit_error"}},
+                    status_code=429,
+                    headers={"Retry-After": "1"}
+                )
+            return JSONResponse({"error": {"message": "Internal error (mock)", "type": "server_error"}}, status_code=500)
+        return JSONResponse(mock_completion(body, config))
+
+    async def record(body: dict, key: str, request: Request):
+        import httpx
+        started = time.perf_counter()
+        async with httpx.AsyncClient(timeout=300) as client:
+            upstream = await client.post(
+                f"{config.upstream.rstrip('/')}/chat/completions",
+                json=body,
+                headers={"Authorization": request.headers.get("authorization", "")}
+            )
+        latency_ms = int((time.perf_counter() - started) * 1000)
+        if upstream.status_code == 200:
+            cassette = {
+                "key": key,
+                "model": body.get("model"),
+                "latency_ms": latency_ms,
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "response": upstream.json()
+            }
+            (config.cassette_dir / f"{key}.json").write_text(json.dumps(cassette, indent=2))
+            app.state.stats["recorded"] += 1
+        return JSONResponse(upstream.json(), status_code=upstream.status_code)
+
+    async def replay(body: dict, key: str):
+        path = config.cassette_dir / f"{key}.json"
+        if not path.exists():
+            if config.replay_miss == "mock":
+                return await synthetic(body, key)
+            return JSONResponse(
+                {"error": {"message": f"No cassette for request {key}", "type": "cassette_miss"}},
+                status_code=404
+            )
+        cassette = json.loads(path.read_text())
+        if config.replay_latency:
+            await asyncio.sleep(cassette.get("latency_ms", 0) / 1000)
+        app.state.stats["replayed"] += 1
+        return JSONResponse(cassette["response"])
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        key = request_key(body)
+        app.state.stats["requests"] += 1
+        if config.mode == "record":
+            return await record(body, key, request)
+        if config.mode == "replay":
+            return await replay(body, key)
+        return await synthetic(body, key)
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+class MockServer:
+    """Run the mock server in a background thread (for benchmarks)"""
+
+    def __init__(self, config: MockConfig, host: str = "127.0.0.1", port: int = 8100):
+        import uvicorn
+        self.url = f"http://{host}:{port}/v1"
+        self.server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+def record_fixtures(config: MockConfig, paths: list, port: int) -> None:
+    """Run the real extraction pipeline on fixture documents through the recorder"""
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+    from app.config import settings
+    from app.services.ai_service import extract_salary_data_from_document
+
+    if not settings.OPENAI_API_KEY:
+        raise SystemExit("OPENAI_API_KEY is required to record cassettes")
+
+    with MockServer(config, port=port) as server:
+        settings.OPENAI_BASE_URL = server.url
+        for path in paths:
+            file_type = Path(path).suffix.lstrip(".").lower()
+            result = asyncio.run(extract_salary_data_from_document(path, file_type))
+            status = "ok" if result["success"] else f"failed: {result.get('error')}"
+            print(f"{path}: {status}")
+    print(f"Cassettes saved to {config.cassette_dir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_common(p):
+        p.add_argument("--host", default="127.0.0.1")
+        p.add_argument("--port", type=int, default=8100)
+        p.add_argument("--cassettes", type=Path, help="Cassette directory (record/replay)")
+        p.add_argument("--upstream", default="https://api.openai.com/v1")
+
+    serve = sub.add_parser("serve", help="Run the server")
+    add_common(serve)
+    serve.add_argument("--mode", choices=["mock", "record", "replay"], default="mock")
+    serve.add_argument("--replay-miss", choices=["mock", "error"], default="mock")
+    serve.add_argument("--replay-latency", action="store_true", help="Replay the recorded upstream latency")
+    serve.add_argument("--latency-median-ms", type=float, default=2000.0)
+    serve.add_argument("--latency-p95-ms", type=float, default=6000.0)
+    serve.add_argument("--completion-tokens", type=int, default=450)
+    serve.add_argument("--error-rate", type=float, default=0.0)
+    serve.add_argument("--rate-limit-share", type=float, default=0.5)
+    serve.add_argument("--seed", type=int, default=0)
+    serve.add_argument("--response-fixture", type=Path, help="JSON file returned for extraction requests")
+
+    rec = sub.add_parser("record-fixtures", help="Record cassettes for fixture documents")
+    add_common(rec)
+    rec.add_argument("documents", nargs="+")
+
+    args = parser.parse_args()
+    if args.command == "record-fixtures" or getattr(args, "mode", "mock") != "mock":
+        if not args.cassettes:
+            parser.error("--cassettes is required for record and replay")
+
+    if args.command == "record-fixtures":
+        record_fixtures(MockConfig(mode="record", cassette_dir=args.cassettes, upstream=args.upstream),
+                        args.documents, args.port)
+        return
+
+    config = MockConfig(
+        mode=args.mode,
+        cassette_dir=args.cassettes,
+        upstream=args.upstream,
+        replay_miss=args.replay_miss,
+        replay_latency=args.replay_latency,
+        latency_median_ms=args.latency_median_ms,
+        latency_p95_ms=args.latency_p95_ms,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        rate_limit_share=args.rate_limit_share,
+        seed=args.seed
+    )
+    if args.response_fixture:
+        config.response_fixture = json.loads(args.response_fixture.read_text())
+
+    import uvicorn
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+End-to-end benchmark and load-test suite for the backend
+
+Micro-benchmarks time each endpoint on its own: upload, tax slab lookup,
+calculate_and_save_tax, document listing, get, search and full analysis.
+The load test runs concurrent virtual users that replay the extension's call
+pattern (popup.js): health -> upload -> analyze -> get -> slab (annual gross)
+-> slab (taxable income).
+
+Model calls go to the local mock server (benchmarks/mock_llm.py), uploads come
+from the synthetic corpus (benchmarks/corpus.py), and the database is a
+throwaway SQLite file unless DATABASE_URL is set. Results are written as JSON;
+pass --baseline to compare with an earlier run (exit code 1 on regression).
+
+Run from the backend folder:
+    python -m benchmarks.suite --output results.json
+    python -m benchmarks.suite --users 20 --sessions 10 --model-median-ms 3000 --model-p95-ms 9000
+    python -m benchmarks.suite --skip-micro --base-url http://127.0.0.1:8000   # against gunicorn
+    python -m benchmarks.suite --baseline results.json --tolerance 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(BACKEND_DIR))
+
+# Isolated database and uploads unless given explicitly; must be set before app imports
+_tmp_dir = tempfile.mkdtemp(prefix="taxease-suite-")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{_tmp_dir}/suite.db")
+os.environ.setdefault("UPLOAD_FOLDER", f"{_tmp_dir}/uploads")
+os.environ.setdefault("DEBUG", "false")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+# Every virtual user is the same client here; keep per-client rate limiting out of the way
+os.environ.setdefault("MODEL_RATE_LIMIT_BURST", "1000000")
+
+from benchmarks.corpus import generate_corpus
+from benchmarks.mock_llm import MockConfig, MockServer
+
+# Metrics compared against the baseline (higher is worse unless listed in HIGHER_IS_BETTER)
+COMPARED_METRICS = ("p50_ms", "p95_ms", "throughput_rps", "error_rate")
+HIGHER_IS_BETTER = {"throughput_rps"}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def summarize(timings: list, errors: int, elapsed: float) -> dict:
+    """Latency percentiles (ms), throughput and error rate for one measurement"""
+    total = len(timings) + errors
+    if not timings:
+        return {"count": 0, "errors": errors, "error_rate": 1.0 if errors else 0.0}
+    ordered = sorted(timings)
+
+    def pct(p):
+        return round(ordered[min(int(len(ordered) * p), len(ordered) - 1)], 2)
+
+    return {
+        "count": total,
+        "errors": errors,
+        "error_rate": round(errors / total, 4),
+        "mean_ms": round(statistics.mean(ordered), 2),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1], 2),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None
+    }
+
+
+def seed_database() -> None:
+    """Create tables and the 2025-26 tax slabs (no budgets, so analysis always runs in full mode)"""
+    from app.database import Base, engine, SessionLocal
+    from app.models import TaxSlab
+    from seed_data import seed_tax_slabs
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        has_slabs = db.query(TaxSlab).first() is not None
+    finally:
+        db.close()
+    if not has_slabs:
+        seed_tax_slabs()
+
+
+def upload_payloads(corpus_dir: Path) -> list:
+    """(filename, bytes, content type) for every corpus document"""
+    manifest = json.loads((corpus_dir / "manifest.json").read_text())
+    payloads = []
+    for doc in manifest["documents"]:
+        content_type = "application/pdf" if doc["format"] == "pdf" else "image/jpeg"
+        payloads.append((doc["file"], (corpus_dir / doc["file"]).read_bytes(), content_type))
+    return payloads
+
+
+# ---------------------------------------------------------------------------
+# Micro-benchmarks (in-process, sequential)
+# ---------------------------------------------------------------------------
+
+def run_micro(payloads: list, repeat: int) -> dict:
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    results = {}
+    with TestClient(app) as client:
+        _run_micro(client, payloads, repeat, results)
+    return results
+
+
+def _run_micro(client, payloads: list, repeat: int, results: dict) -> None:
+    def measure(name, call, count=repeat):
+        timings, errors = [], 0
+        started = time.perf_counter()
+        for i in range(count):
+            t0 = time.perf_counter()
+            response = call(i)
+            if response.status_code < 400:
+                timings.append((time.perf_counter() - t0) * 1000)
+            else:
+                errors += 1
+        results[name] = summarize(timings, errors, time.perf_counter() - started)
+
+    uploaded = []
+
+    def upload(i):
+        filename, content, content_type = payloads[i % len(payloads)]
+        response = client.post("/api/documents/upload", files={"file": (filename, content, content_type)})
+        if response.status_code < 400:
+            uploaded.append(response.json()["id"])
+        return response
+
+    measure("upload", upload)
+    # Each analysis needs a fresh (not yet analyzed) document
+    measure("analyze", lambda i: client.post(f"/api/documents/analyze/{uploaded[i]}"), count=len(uploaded))
+    analyzed = uploaded or [0]
+    measure("tax_slab", lambda i: client.get(f"/api/tax/slab?income={600000 + i * 97531}&category=SALARIED&tax_year=2025-26"))
+    measure("calculate_tax", lambda i: client.post(f"/api/tax/calculate/{analyzed[i % len(analyzed)]}"))
+    measure("list_documents", lambda i: client.get("/api/documents"))
+    measure("get_document", lambda i: client.get(f"/api/documents/{analyzed[i % len(analyzed)]}"))
+    measure("search", lambda i: client.post("/api/documents/search", params={"query": "What is my monthly gross salary?"}),
+            count=max(repeat // 5, 1))
+
+
+# ---------------------------------------------------------------------------
+# Load test (concurrent virtual users over HTTP)
+# ---------------------------------------------------------------------------
+
+class AppServer:
+    """Run the app under uvicorn in a background thread"""
+
+    def __init__(self, port: int):
+        import uvicorn
+        from app.main import app
+        self.url = f"http://127.0.0.1:{port}"
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self.server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+async def popup_session(client, payload, record) -> bool:
+    """One pass through the extension flow; returns True when every step succeeded"""
+    filename, content, content_type = payload
+
+    async def step(name, method, url, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except Exception:
+            record(name, None, "exception")
+            return None
+        record(name, (time.perf_counter() - t0) * 1000, response.status_code)
+        return response if response.status_code < 400 else None
+
+    if not await step("health", "GET", "/health"):
+        return False
+    response = await step("upload", "POST", "/api/documents/upload", files={"file": (filename, content, content_type)})
+    if not response:
+        return False
+    document_id = response.json()["id"]
+    response = await step("analyze", "POST", f"/api/documents/analyze/{document_id}")
+    if not response:
+        return False
+    if not await step("get", "GET", f"/api/documents/{document_id}"):
+        return False
+
+    data = response.json().get("extracted_data") or {}
+    try:
+        annual_gross = float((data.get("salary_details") or {}).get("annual_gross_salary") or 0)
+        allowances = sum(float(v or 0) for v in (data.get("allowances") or {}).values())
+    except (TypeError, ValueError):
+        annual_gross, allowances = 0.0, 0.0
+    ok = True
+    for income in (annual_gross, max(annual_gross - allowances, 0)):
+        params = {"income": income, "category": "SALARIED", "tax_year": "2025-26"}
+        ok = bool(await step("slab", "GET", "/api/tax/slab", params=params)) and ok
+    return ok
+
+
+async def run_load(base_url: str, payloads: list, users: int, sessions: int) -> dict:
+    import httpx
+
+    timings = {}
+    statuses = {}
+    session_timings = []
+    failed_sessions = 0
+
+    def record(name, elapsed_ms, status_code):
+        statuses.setdefault(name, {}).setdefault(str(status_code), 0)
+        statuses[name][str(status_code)] += 1
+        bucket = timings.setdefault(name, {"ok": [], "errors": 0})
+        if elapsed_ms is not None and isinstance(status_code, int) and status_code < 400:
+            bucket["ok"].append(elapsed_ms)
+        else:
+            bucket["errors"] += 1
+
+    async def user(user_index, client):
+        nonlocal failed_sessions
+        for i in range(sessions):
+            t0 = time.perf_counter()
+            ok = await popup_session(client, payloads[(user_index * sessions + i) % len(payloads)], record)
+            if ok:
+                session_timings.append((time.perf_counter() - t0) * 1000)
+            else:
+                failed_sessions += 1
+
+    limits = httpx.Limits(max_connections=users, max_keepalive_connections=users)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(user(i, client) for i in range(users)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "users": users,
+        "sessions_per_user": sessions,
+        "duration_s": round(elapsed, 2),
+        "session": summarize(session_timings, failed_sessions, elapsed),
+        "steps": {name: summarize(t["ok"], t["errors"], elapsed) for name, t in timings.items()},
+        "status_codes": statuses
+    }
+
+
+# ---------------------------------------------------------------------------
+# Results
+# ---------------------------------------------------------------------------
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR,
+                              capture_output=True, text=True).stdout.strip() or "unknown"
+    except OSError:
+        return "unknown"
+
+
+def flatten(results: dict, prefix: str = "") -> dict:
+    """{'load.steps.analyze': {...summary...}, ...} for every measurement in the results"""
+    flat = {}
+    for key, value in results.items():
+        if not isinstance(value, dict):
+            continue
+        name = f"{prefix}{key}"
+        if "count" in value and "errors" in value:
+            flat[name] = value
+        else:
+            flat.update(flatten(value, f"{name}."))
+    return flat
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_delta_ms: float = 2.0) -> list:
+    """
+    Measurements that got worse than the baseline by more than `tolerance`
+    (latency changes under min_delta_ms are treated as noise; throughput is
+    only compared for the load test, where it is not just 1 / latency)
+    """
+    regressions = []
+    base = flatten({"micro": baseline.get("micro", {}), "load": baseline.get("load", {})})
+    for name, summary in flatten({"micro": current.get("micro", {}), "load": current.get("load", {})}).items():
+        if name not in base:
+            continue
+        for metric in COMPARED_METRICS:
+            before, after = base[name].get(metric), summary.get(metric)
+            if before is None or after is None:
+                continue
+            if metric == "error_rate":
+                worse = after - before > tolerance / 10
+            elif metric in HIGHER_IS_BETTER:
+                worse = name.startswith("load.") and before > 0 and after < before * (1 - tolerance)
+            else:
+                worse = after > before * (1 + tolerance) and after - before > min_delta_ms
+            if worse:
+                regressions.append(f"{name} {metric}: {before} -> {after}")
+    return regressions
+
+
+def print_table(title: str, rows: dict) -> None:
+    print(f"\n{title}")
+    print(f"{'':<18}{'count':>7}{'err':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for name, r in rows.items():
+        print(f"{name:<18}{r['count']:>7}{r['errors']:>6}{r.get('p50_ms', '-'):>10}"
+              f"{r.get('p95_ms', '-'):>10}{r.get('p99_ms', '-'):>10}{r.get('throughput_rps') or '-':>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=30, help="Requests per micro-benchmark")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent virtual users in the load test")
+    parser.add_argument("--sessions", type=int, default=5, help="popup.js sessions per virtual user")
+    parser.add_argument("--documents", type=int, default=20, help="Corpus documents to upload")
+    parser.add_argument("--scanned-share", type=float, default=0.0,
+                        help="Share of scanned PDFs (needs poppler for pdf2image)")
+    parser.add_argument("--model-median-ms", type=float, default=200.0, help="Mock model median latency")
+    parser.add_argument("--model-p95-ms", type=float, default=600.0, help="Mock model p95 latency")
+    parser.add_argument("--model-error-rate", type=float, default=0.0)
+    parser.add_argument("--base-url", help="Load-test an already running server instead of an in-process one")
+    parser.add_argument("--skip-micro", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--baseline", help="Earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before failing")
+    parser.add_argument("--min-delta-ms", type=float, default=2.0, help="Ignore latency changes smaller than this")
+    args = parser.parse_args()
+
+    corpus_dir = Path(_tmp_dir) / "corpus"
+    generate_corpus(corpus_dir, args.documents, seed=1, statement_pages=(1, 4),
+                    scanned_share=args.scanned_share, formats=("pdf", "jpg"))
+    payloads = upload_payloads(corpus_dir)
+
+    mock_config = MockConfig(latency_median_ms=args.model_median_ms, latency_p95_ms=args.model_p95_ms,
+                             error_rate=args.model_error_rate, seed=1)
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": os.environ["DATABASE_URL"].split("://")[0],
+            "args": vars(args)
+        }
+    }
+
+    with MockServer(mock_config, port=free_port()) as mock:
+        if not args.base_url:
+            from app.config import settings
+            settings.OPENAI_BASE_URL = mock.url
+            seed_database()
+        else:
+            print(f"Load-testing {args.base_url}; point its OPENAI_BASE_URL at {mock.url}")
+
+        if not args.skip_micro and not args.base_url:
+            results["micro"] = run_micro(payloads, args.repeat)
+            print_table("Micro-benchmarks (sequential, in-process)", results["micro"])
+
+        if not args.skip_load:
+            if args.base_url:
+                results["load"] = asyncio.run(run_load(args.base_url, payloads, args.users, args.sessions))
+            else:
+                # The cached model client belongs to the micro-benchmark's event loop
+                from app.services.ai_service import get_client
+                get_client.cache_clear()
+                with AppServer(free_port()) as server:
+                    results["load"] = asyncio.run(run_load(server.url, payloads, args.users, args.sessions))
+            print_table(f"Load test ({args.users} users x {args.sessions} sessions, "
+                        f"{results['load']['duration_s']}s)",
+                        {"session": results["load"]["session"], **results["load"]["steps"]})
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2, default=str))
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\nRegressions against {args.baseline} (tolerance {args.tolerance:.0%}):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
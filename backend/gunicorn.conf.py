@@ -0,0 +1,70 @@
+"""
+Production server configuration
+Runs the API as several uvicorn workers under gunicorn:
+
+    gunicorn -c gunicorn.conf.py app.main:app
+
+- One worker per CPU core by default (WORKERS setting to override)
+- The app, PDF/image libraries and tax reference data are loaded once in
+  the master and shared with the forked workers
+- Workers are recycled after WORKER_MAX_REQUESTS requests (with jitter so they
+  do not all restart together) to contain memory growth from PDF rendering
+- On SIGTERM workers stop accepting connections and get GRACEFUL_TIMEOUT
+  seconds to finish in-flight analyses
+"""
+import multiprocessing
+
+from app.config import settings
+
+bind = f"{settings.HOST}:{settings.PORT}"
+workers = settings.WORKERS or multiprocessing.cpu_count()
+worker_class = "uvicorn_worker.UvicornWorker"
+
+preload_app = True
+
+max_requests = settings.WORKER_MAX_REQUESTS
+max_requests_jitter = settings.WORKER_MAX_REQUESTS_JITTER
+
+graceful_timeout = settings.GRACEFUL_TIMEOUT
+timeout = settings.WORKER_TIMEOUT
+keepalive = 5
+
+
+def when_ready(server):
+    """Warm shared caches in the master before the first fork"""
+    from app.database import SessionLocal, engine, replica_engine
+    from app.services.ai_service import preload_modules
+    from app.services.tax_service import load_reference_data
+
+    preload_modules()
+
+    db = SessionLocal()
+    try:
+        slab_count = load_reference_data(db)
+        server.log.info(f"Preloaded {slab_count} tax slabs")
+    except Exception as e:
+        server.log.warning(f"Could not preload reference data: {e}")
+    finally:
+        db.close()
+
+    # Connections must not be shared with the children
+    engine.dispose()
+    if replica_engine is not engine:
+        replica_engine.dispose()
+
+
+def post_fork(server, worker):
+    """Drop pooled connections inherited from the master without closing them"""
+    from app.database import engine, replica_engine
+
+    engine.dispose(close=False)
+    if replica_engine is not engine:
+        replica_engine.dispose(close=False)
+
+
+def child_exit(server, worker):
+    """Clean up a dead worker's metric files (multi-process Prometheus mode)"""
+    import os
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
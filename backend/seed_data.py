@@ -190,6 +190,24 @@ def seed_system_settings():
             "setting_value": "pdf,png,jpg,jpeg,xlsx,csv",
             "setting_type": "string",
             "description": "Allowed file extensions for upload"
+        },
+        {
+            "setting_key": "daily_token_budget",
+            "setting_value": "0",
+            "setting_type": "number",
+            "description": "Maximum model tokens per day (0 = unlimited)"
+        },
+        {
+            "setting_key": "monthly_token_budget",
+            "setting_value": "0",
+            "setting_type": "number",
+            "description": "Maximum model tokens per month (0 = unlimited)"
+        },
+        {
+            "setting_key": "budget_degrade_threshold",
+            "setting_value": "0.8",
+            "setting_type": "number",
+            "description": "Fraction of a budget after which extraction switches to cheaper modes"
         }
     ]
     
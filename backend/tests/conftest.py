@@ -0,0 +1,4 @@
+import os
+
+# Settings require a database URL; the tests here never open it
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
@@ -0,0 +1,56 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+
+from app.config import settings
+from app.services import resilience
+from app.services.resilience import CircuitBreaker, ModelUnavailable, RateScheduler
+
+
+@pytest.fixture
+def half_open(monkeypatch):
+    """An open breaker whose cool-down is over: the next call is the probe"""
+    breaker = CircuitBreaker(failure_threshold=3, reset_seconds=30)
+    breaker.opened_at = time.monotonic() - 31
+    monkeypatch.setattr(resilience, "breaker", breaker)
+    monkeypatch.setattr(resilience, "scheduler", RateScheduler(0, 0))
+    monkeypatch.setattr(settings, "MODEL_HEDGING", False)
+    monkeypatch.setattr(settings, "MODEL_MAX_RETRIES", 0)
+    return breaker
+
+
+def _rate_limited() -> openai.RateLimitError:
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return openai.RateLimitError("Rate limit reached", response=httpx.Response(429, request=request), body=None)
+
+
+def test_rate_limited_probe_is_released(half_open):
+    async def make_call():
+        raise _rate_limited()
+
+    with pytest.raises(ModelUnavailable):
+        asyncio.run(resilience.call_model(make_call, 100))
+
+    assert not half_open._probing
+    assert half_open.before_call()  # The next call probes again instead of seeing "circuit open"
+
+
+def test_cancelled_probe_is_released(half_open):
+    async def make_call():
+        await asyncio.sleep(60)
+
+    async def cancel_probe():
+        task = asyncio.create_task(resilience.call_model(make_call, 100))
+        await asyncio.sleep(0.01)
+        assert half_open._probing
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(cancel_probe())
+
+    assert not half_open._probing
+    assert half_open.before_call()
@@ -0,0 +1,34 @@
+import pytest
+
+from app.services.routing import parse_amount, review_extraction
+
+
+@pytest.mark.parametrize("value, expected", [
+    (85000, 85000.0),
+    ("85,000", 85000.0),
+    ("Rs. 85,000", 85000.0),
+    ("Rs 85,000", 85000.0),
+    ("rs.85000", 85000.0),
+    ("PKR 85,000", 85000.0),
+    ("85,000/-", 85000.0),
+    ("Rs. 85,000/-", 85000.0),
+    ("85000 PKR", 85000.0),
+    ("Not found", None),
+    ("", None),
+    (None, None),
+    (True, None)
+])
+def test_parse_amount(value, expected):
+    assert parse_amount(value) == expected
+
+
+def test_rupee_amounts_pass_review():
+    data = {
+        "document_type": "bank statement",
+        "confidence": "High",
+        "salary_details": {"basic_salary": "Rs 46,750", "gross_salary": "Rs 85,000", "annual_gross_salary": "1,020,000/-"},
+        "allowances": {},
+        "deductions": {"income_tax": "Rs 2,500/-"}
+    }
+
+    assert review_extraction(data) == []
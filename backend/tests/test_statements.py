@@ -0,0 +1,97 @@
+from datetime import date
+
+from app.services.statements import merge_chunks, merge_transactions, salary_credits
+
+
+def _row(day, description, credit=0, debit=0, balance=None):
+    return {"date": day, "description": description, "credit": credit, "debit": debit, "balance": balance}
+
+
+def test_duplicate_row_with_balance_is_dropped_in_one_chunk_and_across_chunks():
+    row = _row("2024-01-25", "SALARY ACME LTD", credit="150,000", balance="160,000")
+    chunks = [{"transactions": [row, dict(row)]}, {"transactions": [dict(row)]}]
+
+    assert len(merge_transactions(chunks)) == 1
+
+
+def test_row_without_balance_is_kept_in_one_chunk_but_dropped_across_chunks():
+    row = _row("2024-01-05", "POS PURCHASE", debit=500)
+    # Two identical purchases on one page are two purchases
+    assert len(merge_transactions([{"transactions": [row, dict(row)]}])) == 2
+    # The same row read again on the next chunk is the same row
+    assert len(merge_transactions([{"transactions": [row]}, {"transactions": [dict(row)]}])) == 1
+
+
+def test_forward_rows_are_dropped():
+    chunks = [{"transactions": [
+        _row("2024-01-01", "Balance B/F", credit=10000, balance=10000),
+        _row("2024-01-25", "SALARY ACME", credit=150000, balance=160000),
+        _row("2024-01-31", "Closing balance C/F", debit=160000, balance=160000)
+    ]}]
+
+    transactions = merge_transactions(chunks)
+    assert [t["description"] for t in transactions] == ["SALARY ACME"]
+    assert transactions[0]["date"] == date(2024, 1, 25)
+    assert transactions[0]["credit"] == 150000.0
+
+
+def test_recurring_credit_is_salary_when_none_is_named():
+    rows = [_row(f"2024-0{month}-01", "IBFT INWARD ACME", credit=120000) for month in (1, 2, 3)]
+    rows.append(_row("2024-02-14", "IBFT INWARD FRIEND", credit=5000))
+    rows.append(_row("2024-03-14", "CASH DEPOSIT", credit=250000))
+    transactions = merge_transactions([{"transactions": rows}])
+    months = sorted({(t["date"].year, t["date"].month) for t in transactions})
+
+    salary = salary_credits(transactions, months)
+    assert [t["credit"] for t in salary] == [120000.0] * 3
+
+    merged = merge_chunks([{"transactions": rows}])
+    assert merged["salary_details"]["gross_salary"] == 120000.0
+    assert merged["confidence"] == "Medium"
+
+
+def test_merge_chunks_monthly_median_and_opening_balance():
+    chunks = [
+        {"account_holder": "ALI KHAN", "transactions": [
+            _row("2024-01-25", "SALARY ACME LTD", credit=150000, balance=160000),
+            _row("2024-02-25", "SALARY ACME LTD", credit=150000, balance=300000)
+        ]},
+        {"account_holder": "ALI KHAN", "transactions": [
+            _row("2024-02-25", "SALARY ACME LTD", credit=150000, balance=300000),
+            _row("2024-03-05", "HOUSE RENT", debit=40000, balance=260000),
+            _row("2024-03-25", "SALARY ACME LTD", credit=180000, balance=440000)
+        ]}
+    ]
+
+    merged = merge_chunks(chunks)
+    assert merged["employee_name"] == "ALI KHAN"
+    assert merged["employer_name"] == "ACME LTD"
+    assert merged["salary_details"]["gross_salary"] == 150000.0
+    assert merged["annual_totals"]["salary_received"] == 480000.0
+    assert merged["bank_details"]["opening_balance"] == 10000.0
+    assert merged["bank_details"]["closing_balance"] == 440000.0
+    assert merged["bank_details"]["transactions"] == 4
+    assert merged["other_expenses"]["rent_paid"] == 40000.0
+    assert merged["confidence"] == "High"
+
+
+def test_failed_chunk_lowers_confidence():
+    rows = [_row(f"2024-0{month}-25", "SALARY ACME", credit=100000) for month in (1, 2)]
+
+    merged = merge_chunks([{"transactions": rows}], failed_chunks=1)
+    assert merged["failed_chunks"] == 1
+    assert merged["chunks"] == 2
+    assert merged["confidence"] == "Low"
+
+
+def test_empty_statement():
+    merged = merge_chunks([{"period": "January 2024", "transactions": []}, {}])
+
+    assert merged["salary_details"]["gross_salary"] == "Not found"
+    assert merged["salary_details"]["annual_gross_salary"] == 0
+    assert merged["bank_details"]["transactions"] == 0
+    assert merged["bank_details"]["opening_balance"] is None
+    assert merged["bank_details"]["closing_balance"] is None
+    assert merged["annual_totals"]["months"] == 0
+    assert merged["period"] == "January 2024"
+    assert merged["confidence"] == "Low"
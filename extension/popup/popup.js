@@ -19,6 +19,18 @@ const analysisResults = document.getElementById('analysisResults');
 let selectedFile = null;
 let currentExtractedData = null;
 
+// Idempotency keys: a retry of the same upload/analysis reuses its key, so the
+// backend returns the first result instead of doing the work (and billing) twice
+const uploadKeys = new WeakMap(); // File -> key
+const analyzeKeys = new Map(); // documentId -> key
+
+function idempotencyKey(store, item) {
+    if (!store.has(item)) {
+        store.set(item, crypto.randomUUID());
+    }
+    return store.get(item);
+}
+
 // ===== CHROME STORAGE UTILITIES =====
 
 // Utility: Strip currency prefix for clean copying
@@ -295,6 +307,7 @@ async function uploadDocument() {
 
         const response = await fetch(`${API_BASE_URL}/api/documents/upload`, {
             method: 'POST',
+            headers: { 'Idempotency-Key': idempotencyKey(uploadKeys, selectedFile) },
             body: formData
         });
 
@@ -363,7 +376,7 @@ function displayDocuments(documents) {
             <div class="document-info">
                 <div class="document-name">${escapeHtml(doc.original_filename)}</div>
                 <div class="document-meta">
-                    ${new Date(doc.uploaded_at).toLocaleDateString()} • ${doc.file_type} • ${getStatusBadge(doc.status)}
+                    ${new Date(doc.uploaded_at).toLocaleDateString()} • ${doc.file_type}${doc.page_count ? ` (${doc.page_count} ${doc.page_count === 1 ? 'page' : 'pages'})` : ''} • ${getStatusBadge(doc.status)}
                 </div>
             </div>
             <div class="document-actions">
@@ -451,7 +464,8 @@ async function handleAnalyzeClick(event, documentId) {
 
     try {
         const response = await fetch(`${API_BASE_URL}/api/documents/analyze/${documentId}`, {
-            method: 'POST'
+            method: 'POST',
+            headers: { 'Idempotency-Key': idempotencyKey(analyzeKeys, documentId) }
         });
 
         if (!response.ok) {